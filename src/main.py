@@ -20,7 +20,16 @@ from tools.scraping import main as scraping
 from tools.downloading import main as downloading
 from tools.training import main as training
 from tools.querying import main as querying
-from tools.shared.path_constants import LINKS_DIR_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH
+from tools.tuning import main as tuning
+from tools.exporting import main as exporting
+from tools.indexing import main as indexing
+from tools.comparing import main as comparing
+from tools.shared.path_constants import (
+    EVALUATION_DIR_PATH,
+    LINKS_DIR_PATH,
+    MODELS_DIR_PATH,
+    TEMP_DIR_PATH,
+)
 from tools.shared.misc import default_logging, check_dirs, error_crash
 
 # Metadata variables:
@@ -52,7 +61,17 @@ def tools_menu() -> None:
 
     # Menu variables.
     title = "HunCor2Vec Toolset\nSelect a task: "
-    options = ["1. Scraping", "2. Downloading", "3. Training", "4. Querying", "5. Exit"]
+    options = [
+        "1. Scraping",
+        "2. Downloading",
+        "3. Training",
+        "4. Querying",
+        "5. Hyperparameter sweep",
+        "6. Model export",
+        "7. Neighbour index",
+        "8. Model comparison",
+        "9. Exit",
+    ]
 
     # Menu loop.
     while True:
@@ -66,7 +85,15 @@ def tools_menu() -> None:
                 training()
             case 3:  # Launch query script.
                 querying()
-            case 4:  # Break loop, exit app.
+            case 4:  # Launch hyperparameter sweep script.
+                tuning()
+            case 5:  # Launch model export script.
+                exporting()
+            case 6:  # Launch neighbour index script.
+                indexing()
+            case 7:  # Launch model comparison script.
+                comparing()
+            case 8:  # Break loop, exit app.
                 break
             case _:  # Incorrect selection (should not happen).
                 error_crash("Selection error!")
@@ -76,7 +103,7 @@ def main() -> None:
     """Main function."""
     logging.info("Launching the HunCor2Vec toolset.")
     # Check if necessary dirs exist.
-    check_dirs([LINKS_DIR_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH])
+    check_dirs([EVALUATION_DIR_PATH, LINKS_DIR_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH])
     # Launch main menu.
     tools_menu()
 
@@ -0,0 +1,234 @@
+"""
+
+comparing.py
+
+Script to compare trained word2vec models or the epoch checkpoints of a
+training run: neighbour overlap and vector drift on the shared
+vocabulary, optionally analogy accuracy, and the epoch after which
+the model stopped improving.
+
+Part of the HunCor2Vec project.
+
+"""
+
+# Imports:
+import logging
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from gensim.models import KeyedVectors, Word2Vec
+from gensim.test.utils import datapath
+from pick import pick
+
+# Conditional imports (to be runnable as a stand-alone script):
+if __name__ == "__main__":
+    from shared.misc import (
+        CHECKPOINT_DIR_SUFFIX,
+        check_dirs,
+        checkpoint_epoch,
+        default_logging,
+        file_select_menu,
+        load_config_file,
+        yes_no_menu,
+    )
+    from shared.neighbours import block_neighbours
+    from shared.path_constants import CONFIG_FILE_PATH, EVALUATION_DIR_PATH, MODELS_DIR_PATH
+else:
+    from tools.shared.misc import (
+        CHECKPOINT_DIR_SUFFIX,
+        check_dirs,
+        checkpoint_epoch,
+        default_logging,
+        file_select_menu,
+        load_config_file,
+        yes_no_menu,
+    )
+    from tools.shared.neighbours import block_neighbours
+    from tools.shared.path_constants import CONFIG_FILE_PATH, EVALUATION_DIR_PATH, MODELS_DIR_PATH
+
+
+def natural_key(name: str) -> list:
+    """Sort key ordering numbers in names numerically (model2 < model10)."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+
+def model_order_key(path: Path) -> tuple:
+    """Sort key of models and checkpoints: models by name, the kept
+    checkpoints of a model by epoch number, followed by the final model."""
+    epoch = checkpoint_epoch(path)
+    if epoch is not None and path.parent.name.endswith(CHECKPOINT_DIR_SUFFIX):
+        return (natural_key(path.parent.name[: -len(CHECKPOINT_DIR_SUFFIX)]), 0, epoch)
+    return (natural_key(path.stem), 1, 0)
+
+
+def select_models() -> list[Path]:
+    """Multi-select menu of the models and kept checkpoints in models/.
+    Returns the selected paths in training order (see model_order_key)."""
+    paths = sorted(
+        [
+            *MODELS_DIR_PATH.glob("*.mdl"),
+            *MODELS_DIR_PATH.glob(f"*{CHECKPOINT_DIR_SUFFIX}/*.mdl"),
+        ],
+        key=model_order_key,
+    )
+    if len(paths) < 2:
+        logging.error("At least two models or checkpoints are needed in %s", MODELS_DIR_PATH)
+        input("Press Enter to continue...")
+        return []
+    options = [str(path.relative_to(MODELS_DIR_PATH)) for path in paths]
+    title = "Model Comparison\nSelect models or checkpoints (SPACE to mark, ENTER to confirm): "
+    selected = pick(options, title, indicator="=>", multiselect=True, min_selection_count=2)
+    return sorted((paths[index] for _, index in selected), key=model_order_key)
+
+
+def shared_vocabulary(wvs: list[KeyedVectors], size: int) -> list[str]:
+    """The most frequent words of the first model present in all models."""
+    shared = []
+    for word in wvs[0].index_to_key:
+        if all(word in wv.key_to_index for wv in wvs[1:]):
+            shared.append(word)
+            if len(shared) == size:
+                break
+    return shared
+
+
+def unit_rows(wv: KeyedVectors, words: list[str]) -> np.ndarray:
+    """Unit-normalized vectors of the given words (in the given order)."""
+    rows = np.asarray(wv.vectors[[wv.key_to_index[word] for word in words]], dtype=np.float32)
+    return rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+
+
+def vector_drift(previous: np.ndarray, current: np.ndarray) -> np.ndarray:
+    """Cosine distance of every word between two models, after rotating
+    the previous space onto the current one (orthogonal Procrustes).
+    Independently trained models have arbitrarily rotated spaces."""
+    u, _, vt = np.linalg.svd(previous.T @ current)
+    aligned = previous @ (u @ vt)
+    return 1 - np.sum(aligned * current, axis=1)
+
+
+def neighbour_ids(units: np.ndarray, topn: int, block_rows: int) -> np.ndarray:
+    """Top-n neighbour ids of every row among all rows (blocked)."""
+    count = len(units)
+    return np.vstack(
+        [
+            block_neighbours(start, min(start + block_rows, count), count, topn, count, units)[1]
+            for start in range(0, count, block_rows)
+        ]
+    )
+
+
+def neighbour_overlap(ids_a: np.ndarray, ids_b: np.ndarray) -> np.ndarray:
+    """Share of common neighbours of every word in two neighbour lists."""
+    return (ids_a[:, :, None] == ids_b[:, None, :]).any(axis=2).mean(axis=1)
+
+
+def compare_models(
+    paths: list[Path], compare_config: dict, eval_path: Optional[Path]
+) -> list[dict]:
+    """Compare every model with the previous one. Returns one report row
+    per model."""
+
+    # Load the vectors memory-mapped, align on the shared vocabulary.
+    wvs = [Word2Vec.load(datapath(path), mmap="r").wv for path in paths]
+    words = shared_vocabulary(wvs, compare_config["words"])
+    topn = min(compare_config["topn"], len(words) - 1)
+    logging.info("Comparing %d models on %d shared words.", len(paths), len(words))
+
+    rows = []
+    previous_units, previous_ids = None, None
+    for path, wv in zip(paths, wvs):
+        units = unit_rows(wv, words)
+        ids = neighbour_ids(units, topn, compare_config["block-rows"])
+        row = {"model": str(path.relative_to(MODELS_DIR_PATH))}
+        if previous_units is not None:
+            drift = vector_drift(previous_units, units)
+            row[f"overlap@{topn}"] = float(neighbour_overlap(previous_ids, ids).mean())
+            row["mean_drift"] = float(drift.mean())
+            row["median_drift"] = float(np.median(drift))
+        if eval_path:
+            row["accuracy"] = wv.evaluate_word_analogies(datapath(eval_path))[0]
+        rows.append(row)
+        previous_units, previous_ids = units, ids
+    return rows
+
+
+def stopped_improving(rows: list[dict], compare_config: dict) -> Optional[int]:
+    """Position of the model after which training stopped improving: the
+    last accuracy gain of at least min-gain, or (without evaluation) the
+    first model whose neighbours barely changed since the previous one.
+    None if it was still improving at the last model."""
+    if "accuracy" in rows[0]:
+        gains = [
+            position
+            for position in range(1, len(rows))
+            if rows[position]["accuracy"] - rows[position - 1]["accuracy"]
+            >= compare_config["min-gain"]
+        ]
+        last_gain = gains[-1] if gains else 0
+        return last_gain if last_gain < len(rows) - 1 else None
+    overlap_key = next(key for key in rows[-1] if key.startswith("overlap@"))
+    for position in range(1, len(rows)):
+        if rows[position][overlap_key] >= compare_config["stable-overlap"]:
+            return position - 1
+    return None
+
+
+def write_report(rows: list[dict], stop_position: Optional[int]) -> Path:
+    """Print the report and save it as a .tsv file in models/."""
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    report_path = MODELS_DIR_PATH.joinpath(f"compare_{datetime.now():%Y%m%d_%H%M%S}.tsv")
+    with open(report_path, mode="w", encoding="utf-8") as f:
+        f.write("\t".join(columns) + "\n")
+        for row in rows:
+            values = [
+                f"{row[key]:.4f}" if isinstance(row.get(key), float) else str(row.get(key, ""))
+                for key in columns
+            ]
+            f.write("\t".join(values) + "\n")
+            print("  ".join(f"{key}={value}" for key, value in zip(columns, values) if value))
+
+    if stop_position is None:
+        print("\nStill improving at the last model: more epochs may help.")
+    else:
+        print(f"\nStopped improving after: {rows[stop_position]['model']}")
+    return report_path
+
+
+def main() -> None:
+    """Main function."""
+
+    logging.info("Launching the Word2Vec model comparison tool.")
+
+    # Select models/checkpoints and an optional evaluation set.
+    paths = select_models()
+    if not paths:
+        return
+    eval_path = None
+    if yes_no_menu("Evaluate with an analogy set from the evaluation folder?"):
+        eval_path = file_select_menu(
+            "Model Comparison\nSelect evaluation file: ", EVALUATION_DIR_PATH, ".txt"
+        )
+
+    # Compare and report.
+    compare_config = load_config_file(CONFIG_FILE_PATH)["Comparison"]
+    rows = compare_models(paths, compare_config, eval_path)
+    report_path = write_report(rows, stopped_improving(rows, compare_config))
+
+    # Operation end prompt.
+    logging.info("Comparison report saved to %s", report_path)
+    input("Press Enter to return...")
+
+
+# Run when launched as standalone script.
+if __name__ == "__main__":
+    # Set default logging settings.
+    default_logging()
+    # Check if necessary dirs exist.
+    check_dirs([EVALUATION_DIR_PATH, MODELS_DIR_PATH])
+    # Launch main function.
+    main()
+    # Ending message.
+    logging.info("Exiting...")
@@ -11,33 +11,44 @@ Part of the HunCor2Vec project.
 
 # Imports:
 import logging
+import os
 from pathlib import Path
 from os.path import basename
-from urllib.error import URLError
-from urllib.request import urlretrieve
+from typing import Callable
+from urllib.error import ContentTooShortError, URLError
+from urllib.request import urlopen
 from pick import pick
 
 # Conditional imports (to be runnable as a stand-alone script):
 if __name__ == "__main__":
-    from shared.path_constants import LINKS_DIR_PATH, DOWNLOADS_DIR_PATH
+    from shared.path_constants import CONFIG_FILE_PATH, LINKS_DIR_PATH, DOWNLOADS_DIR_PATH
     from shared.misc import (
         check_dirs,
         dir_cleanup,
         error_crash,
         default_logging,
         file_select_menu,
+        load_config_file,
         yes_no_menu,
     )
+    from shared.progress import ProgressTracker
+    from shared.tempspace import DiskBudget, PARTIAL_SUFFIX, mark_used
 else:
-    from tools.shared.path_constants import LINKS_DIR_PATH, DOWNLOADS_DIR_PATH
+    from tools.shared.path_constants import CONFIG_FILE_PATH, LINKS_DIR_PATH, DOWNLOADS_DIR_PATH
     from tools.shared.misc import (
         check_dirs,
         dir_cleanup,
         error_crash,
         default_logging,
         file_select_menu,
+        load_config_file,
         yes_no_menu,
     )
+    from tools.shared.progress import ProgressTracker
+    from tools.shared.tempspace import DiskBudget, PARTIAL_SUFFIX, mark_used
+
+# Bytes read at once while downloading.
+DOWNLOAD_BLOCK_SIZE = 2**16
 
 def download_menu() -> None:
     """Download task select menu: download corpus files from link list
@@ -63,36 +74,144 @@ def download_menu() -> None:
                 confirm = yes_no_menu("Delete all files in the downloads folder?")
                 # Positive confirmation: delete all .gz files from downloads/ dir.
                 if confirm:
-                    dir_cleanup(DOWNLOADS_DIR_PATH, (".gz", ".mdl", ".npy", ".tsv", ".txt"))
+                    dir_cleanup(
+                        DOWNLOADS_DIR_PATH,
+                        (".gz", ".mdl", ".npy", ".tsv", ".txt"),
+                        workers=load_config_file(CONFIG_FILE_PATH)["TempSpace"]["cleanup-workers"],
+                    )
             case 2: # Exit (break loop).
                 break
             case _:  # Incorrect selection (should not happen).
                 error_crash("Selection error!")
 
 
+def progress_hook(
+    progress: ProgressTracker, file_name: str, files_left: int
+) -> Callable[[int, int, int], None]:
+    """Report hook of a download (urlretrieve style): counts the received bytes of a file.
+    The total of the run is estimated from the size of the files so far."""
+    received = 0
+
+    def hook(block_count: int, block_size: int, file_size: int) -> None:
+        nonlocal received
+        # First call: size of the file (-1 if the server does not tell).
+        if block_count == 0:
+            file_size = file_size if file_size > 0 else None
+            progress.begin_item("file", file_name, "bytes", file_size)
+            done_bytes = progress.counts.get("bytes", 0)
+            done_files = progress.counts.get("files", 0)
+            if file_size:
+                mean_size = (done_bytes + file_size) / (done_files + 1)
+                progress.set_total("bytes", round(done_bytes + file_size + files_left * mean_size))
+            return
+        position = block_count * block_size
+        if file_size > 0:
+            position = min(position, file_size)
+        progress.add(bytes=position - received)
+        received = position
+
+    return hook
+
+
+def download_file(
+    link: str,
+    out_file_path: Path,
+    budget: DiskBudget,
+    keep: list[Path],
+    hook: Callable[[int, int, int], None],
+) -> bool:
+    """Download a file within the disk budget of its folder. Its size
+    (Content-Length) is reserved first: room is made for it and the
+    partial file is extended to full size under the budget lock, so runs
+    sharing the folder count it too. Returns False, without writing
+    anything, if there is no room for the file."""
+    partial_path = out_file_path.with_name(f"{out_file_path.name}{PARTIAL_SUFFIX}")
+    with urlopen(link) as response:
+        size = int(response.headers.get("Content-Length") or 0)
+        with budget.locked():
+            if not budget.make_room(size, keep=keep):
+                return False
+            with open(partial_path, mode="wb") as partial_file:
+                partial_file.truncate(size)
+
+        try:
+            with open(partial_path, mode="r+b") as partial_file:
+                hook(0, DOWNLOAD_BLOCK_SIZE, size or -1)
+                received, block_count = 0, 0
+                while block := response.read(DOWNLOAD_BLOCK_SIZE):
+                    partial_file.write(block)
+                    received += len(block)
+                    block_count += 1
+                    hook(block_count, DOWNLOAD_BLOCK_SIZE, size or -1)
+                partial_file.truncate()
+            if size and received < size:
+                raise ContentTooShortError(
+                    f"retrieval incomplete: got only {received} out of {size} bytes", None
+                )
+        except Exception:
+            partial_path.unlink(missing_ok=True)
+            raise
+    os.replace(partial_path, out_file_path)
+    return True
+
+
 def download_all(list_file: Path, out_folder: Path) -> None:
-    """Download all files from the URLs listed in the link list file."""
+    """Download all files from the URLs listed in the link list file.
+    Within the disk budget of the downloads folder, earlier downloads are
+    evicted least recently used first; the files of this list are kept.
+    The progress is written to tmp/status/download_<list>.json."""
+
+    # Disk budget of the downloads folder.
+    config_file = load_config_file(CONFIG_FILE_PATH)
+    space_config = config_file["TempSpace"]
+    budget = DiskBudget(out_folder, space_config["downloads-limit"], space_config["headroom"])
+    downloaded: list[Path] = []
+
+    # Links to download and the progress of the run.
+    with open(list_file, mode="r", encoding="utf-8") as link_list:
+        links = link_list.read().splitlines()
+    progress = ProgressTracker("download", list_file.stem, config_file["Progress"])
+    progress.stage("download", "bytes", files=len(links))
 
     # File downloading loop.
-    with open(list_file, mode="r", encoding="utf-8") as link_list:
-        for line_index, link in enumerate(link_list):
-            # Strip newline.
+    state = "failed"
+    try:
+        for line_index, link in enumerate(links):
+            # Strip whitespace.
             link = link.rstrip()
             # Set variables
             file_name = basename(link)
             if not file_name:
                 file_name = f"unknown_{line_index}.unk"
             out_file_path = out_folder.joinpath(file_name)
-            # Retrieve with error handling:
+            # Retrieve with error handling, stop before the disk fills up:
             logging.info("Downloading %s...", file_name)
             try:
-                urlretrieve(link, out_file_path)
+                if not download_file(
+                    link,
+                    out_file_path,
+                    budget,
+                    downloaded,
+                    progress_hook(progress, file_name, len(links) - line_index - 1),
+                ):
+                    logging.error(
+                        "Disk budget reached, downloading stopped at line %d.", line_index
+                    )
+                    state = "stopped"
+                    break
             except ValueError as err_unk_type:
                 logging.error("Download failed! Error on line %d: %s", line_index, err_unk_type)
             except URLError as err_url:
                 logging.error("Error downloading %s: %s", file_name, err_url)
             else:
+                mark_used(out_file_path)
+                downloaded.append(out_file_path)
                 logging.info("Completed.")
+            progress.add(files=1)
+        else:
+            state = "finished"
+    finally:
+        progress.finish(state)
 
     # Operation end prompt.
     logging.info("Files have been downloaded to %s", DOWNLOADS_DIR_PATH)
@@ -0,0 +1,225 @@
+"""
+
+exporting.py
+
+Script to export a trained word2vec model to a compact, memory-mappable
+format: float16 or int8 (per-row scale) vectors with a vocabulary pruned
+to the most frequent words.
+
+Part of the HunCor2Vec project.
+
+"""
+
+# Imports:
+import json
+import logging
+from os.path import getsize
+from pathlib import Path
+from typing import Literal, Optional
+import numpy as np
+from gensim.models import KeyedVectors, Word2Vec
+from gensim.test.utils import datapath
+from pick import pick
+
+# Conditional imports (to be runnable as a stand-alone script):
+if __name__ == "__main__":
+    from shared.classes import QuantizedVectors
+    from shared.misc import (
+        check_dirs,
+        default_logging,
+        error_crash,
+        file_select_menu,
+        load_config_file,
+    )
+    from shared.path_constants import CONFIG_FILE_PATH, MODELS_DIR_PATH
+else:
+    from tools.shared.classes import QuantizedVectors
+    from tools.shared.misc import (
+        check_dirs,
+        default_logging,
+        error_crash,
+        file_select_menu,
+        load_config_file,
+    )
+    from tools.shared.path_constants import CONFIG_FILE_PATH, MODELS_DIR_PATH
+
+# Rows quantized at once.
+EXPORT_CHUNK_ROWS = 65536
+
+
+def export_format_menu() -> Optional[Literal["float16", "int8"]]:
+    """Ask user for the export format."""
+
+    # Menu variables.
+    title = "Model Export\nSelect format: "
+    options = ["1. float16 (half size)", "2. int8 (quarter size)", "3. Exit"]
+    _, index = pick(options, title, indicator="=>", default_index=0)
+
+    # Menu switch.
+    match index:
+        case 0:
+            export_format = "float16"
+        case 1:
+            export_format = "int8"
+        case 2:  # Pass value to exit or return to main menu.
+            return None
+        case _:  # Incorrect selection (should not happen).
+            error_crash("Selection error!")
+
+    return export_format
+
+
+def quantize_rows(
+    rows: np.ndarray, export_format: Literal["float16", "int8"]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Quantize a block of vectors. Returns the quantized rows and the
+    per-row scales that turn them back into unit vectors."""
+
+    # Normalize rows to unit length (zero rows stay zero).
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    units = rows / np.where(norms == 0, 1, norms)
+
+    # Convert.
+    if export_format == "float16":
+        quantized = units.astype(np.float16)
+    else:
+        max_abs = np.abs(units).max(axis=1, keepdims=True)
+        quantized = np.round(units * 127 / np.where(max_abs == 0, 1, max_abs)).astype(np.int8)
+
+    # Scale factor: inverse length of the quantized row.
+    q_norms = np.linalg.norm(quantized.astype(np.float32), axis=1)
+    scales = (1 / np.where(q_norms == 0, 1, q_norms)).astype(np.float32)
+    return quantized, scales
+
+
+def export_vectors(
+    wv: KeyedVectors,
+    source_name: str,
+    out_stem: Path,
+    export_format: Literal["float16", "int8"],
+    top_n: int,
+) -> Path:
+    """Write the quantized matrix, the scales, the vocabulary and a manifest
+    file (which also records the name of the source model). Returns the
+    path of the manifest (.qvec)."""
+
+    count = min(top_n, len(wv.index_to_key))
+    dtype = np.float16 if export_format == "float16" else np.int8
+    name = out_stem.name
+    files = {
+        "vectors": f"{name}.qvec.npy",
+        "scales": f"{name}.scale.npy",
+        "vocab": f"{name}.vocab.txt",
+    }
+
+    # Quantize chunk by chunk straight into a memory-mapped .npy file.
+    matrix = np.lib.format.open_memmap(
+        out_stem.with_name(files["vectors"]), mode="w+", dtype=dtype, shape=(count, wv.vector_size)
+    )
+    scales = np.empty(count, dtype=np.float32)
+    for start in range(0, count, EXPORT_CHUNK_ROWS):
+        end = min(start + EXPORT_CHUNK_ROWS, count)
+        matrix[start:end], scales[start:end] = quantize_rows(
+            np.asarray(wv.vectors[start:end], dtype=np.float32), export_format
+        )
+    matrix.flush()
+    del matrix
+    np.save(out_stem.with_name(files["scales"]), scales)
+
+    # Vocabulary (gensim keeps it sorted by frequency).
+    with open(out_stem.with_name(files["vocab"]), mode="w", encoding="utf-8") as vocab_file:
+        vocab_file.write("\n".join(wv.index_to_key[:count]) + "\n")
+
+    # Manifest.
+    manifest_path = out_stem.with_name(f"{name}.qvec")
+    manifest = {
+        "format": export_format,
+        "count": count,
+        "dim": wv.vector_size,
+        "source": source_name,
+        **files,
+    }
+    with open(manifest_path, mode="w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest_path
+
+
+def quality_report(
+    wv: KeyedVectors, quantized: QuantizedVectors, sample_size: int, topn: int = 10
+) -> dict[str, float]:
+    """Compare the export with the float32 model on a random sample of
+    words: mean absolute cosine error and top-n neighbour overlap."""
+
+    rng = np.random.default_rng(0)
+    count = len(quantized.index_to_key)
+    sample = rng.choice(count, size=min(sample_size, count), replace=False)
+    partners = rng.choice(count, size=len(sample))
+
+    cosine_errors, overlaps = [], []
+    for index, partner in zip(sample, partners):
+        word, other = quantized.index_to_key[index], quantized.index_to_key[partner]
+        cosine_errors.append(abs(wv.similarity(word, other) - quantized.similarity(word, other)))
+        original = {w for w, _ in wv.most_similar(word, topn=topn, restrict_vocab=count)}
+        exported = {w for w, _ in quantized.most_similar(word, topn=topn)}
+        overlaps.append(len(original & exported) / topn)
+
+    return {
+        "mean_cosine_error": float(np.mean(cosine_errors)),
+        f"neighbour_overlap@{topn}": float(np.mean(overlaps)),
+    }
+
+
+def files_size(paths: list[Path]) -> int:
+    """Summed size of existing files in bytes."""
+    return sum(getsize(path) for path in paths if path.is_file())
+
+
+def main() -> None:
+    """Main function."""
+
+    logging.info("Launching the Word2Vec model export tool.")
+
+    # Select model and format.
+    model_path = file_select_menu("Model Export\nSelect model file: ", MODELS_DIR_PATH, ".mdl")
+    if not model_path:
+        return
+    export_format = export_format_menu()
+    if not export_format:
+        return
+
+    # Load settings from config.yml file.
+    export_config = load_config_file(CONFIG_FILE_PATH)["Export"]
+
+    # Load the model memory-mapped and export.
+    logging.info("Exporting %s (%s)...", model_path.name, export_format)
+    wv = Word2Vec.load(datapath(model_path), mmap="r").wv
+    out_stem = model_path.with_name(f"{model_path.stem}_{export_format}")
+    manifest_path = export_vectors(
+        wv, model_path.stem, out_stem, export_format, export_config["top-n"]
+    )
+
+    # Report size and quality loss.
+    quantized = QuantizedVectors(manifest_path)
+    original_files = [model_path, *model_path.parent.glob(f"{model_path.name}.*.npy")]
+    export_files = [manifest_path] + [
+        manifest_path.with_name(quantized.manifest[key]) for key in ("vectors", "scales", "vocab")
+    ]
+    original_size, export_size = files_size(original_files), files_size(export_files)
+    report = quality_report(wv, quantized, export_config["quality-sample"])
+    print(f"\nExported {len(quantized.index_to_key)} words to {manifest_path}")
+    print(f"Size: {original_size / 2**20:.1f} MiB -> {export_size / 2**20:.1f} MiB")
+    for metric, value in report.items():
+        print(f"{metric}: {value:.4f}")
+    input("\nPress Enter to return...")
+
+
+# Run when launched as standalone script.
+if __name__ == "__main__":
+    # Set default logging settings.
+    default_logging()
+    # Check if necessary dirs exist.
+    check_dirs([MODELS_DIR_PATH])
+    # Launch main function.
+    main()
+    # Ending message.
+    logging.info("Exiting...")
@@ -0,0 +1,77 @@
+"""
+
+indexing.py
+
+Script to precompute the nearest neighbour index of a trained word2vec
+model: the top-k neighbour lists of the most frequent words, used by
+the query tool to answer these words without scanning the vocabulary.
+
+Part of the HunCor2Vec project.
+
+"""
+
+# Imports:
+import logging
+from time import perf_counter
+from gensim.models import Word2Vec
+from gensim.test.utils import datapath
+
+# Conditional imports (to be runnable as a stand-alone script):
+if __name__ == "__main__":
+    from shared.autotune import available_cpus
+    from shared.misc import check_dirs, default_logging, file_select_menu, load_config_file
+    from shared.neighbours import build_neighbour_index
+    from shared.path_constants import CONFIG_FILE_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH
+    from shared.tempspace import RunTempDir
+else:
+    from tools.shared.autotune import available_cpus
+    from tools.shared.misc import check_dirs, default_logging, file_select_menu, load_config_file
+    from tools.shared.neighbours import build_neighbour_index
+    from tools.shared.path_constants import CONFIG_FILE_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH
+    from tools.shared.tempspace import RunTempDir
+
+
+def main() -> None:
+    """Main function."""
+
+    logging.info("Launching the Word2Vec neighbour index tool.")
+
+    # Select model.
+    model_path = file_select_menu(
+        "Neighbour Index\nSelect model file: ", MODELS_DIR_PATH, ".mdl"
+    )
+    if not model_path:
+        return
+
+    # Load settings from config.yml file.
+    config_file = load_config_file(CONFIG_FILE_PATH)
+    neighbour_config = config_file["Neighbours"]
+    processes = neighbour_config["processes"] or available_cpus()
+
+    # Load the model memory-mapped and build the index.
+    logging.info("Building the neighbour index of %s...", model_path.name)
+    wv = Word2Vec.load(datapath(model_path), mmap="r").wv
+    run_temp = RunTempDir(cleanup_workers=config_file["TempSpace"]["cleanup-workers"])
+    start = perf_counter()
+    try:
+        manifest_path = build_neighbour_index(
+            wv, model_path.stem, neighbour_config, processes, run_temp.path
+        )
+    finally:
+        run_temp.cleanup()
+
+    # Operation end prompt.
+    print(f"\nNeighbour index saved to {manifest_path} in {perf_counter() - start:.1f} s")
+    input("\nPress Enter to return...")
+
+
+# Run when launched as standalone script.
+if __name__ == "__main__":
+    # Set default logging settings.
+    default_logging()
+    # Check if necessary dirs exist.
+    check_dirs([MODELS_DIR_PATH, TEMP_DIR_PATH])
+    # Launch main function.
+    main()
+    # Ending message.
+    logging.info("Exiting...")
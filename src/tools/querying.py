@@ -11,20 +11,40 @@ Part of the HunCor2Vec project.
 # Imports:
 import logging
 from pprint import pprint
-from gensim.models import Word2Vec
+from gensim.models import KeyedVectors, Word2Vec
 from gensim.test.utils import datapath
 from pick import pick
 
 # Conditional imports (to be runnable as a stand-alone script):
 if __name__ == "__main__":
-    from shared.misc import check_dirs, default_logging, error_crash, file_select_menu
-    from shared.path_constants import MODELS_DIR_PATH
+    from shared.classes import QuantizedVectors
+    from shared.misc import (
+        check_dirs,
+        default_logging,
+        error_crash,
+        file_select_menu,
+        load_config_file,
+    )
+    from shared.neighbours import NeighbourVectors
+    from shared.oov import FallbackVectors
+    from shared.path_constants import CONFIG_FILE_PATH, MODELS_DIR_PATH
 else:
-    from tools.shared.misc import check_dirs, default_logging, error_crash, file_select_menu
-    from tools.shared.path_constants import MODELS_DIR_PATH
+    from tools.shared.classes import QuantizedVectors
+    from tools.shared.misc import (
+        check_dirs,
+        default_logging,
+        error_crash,
+        file_select_menu,
+        load_config_file,
+    )
+    from tools.shared.neighbours import NeighbourVectors
+    from tools.shared.oov import FallbackVectors
+    from tools.shared.path_constants import CONFIG_FILE_PATH, MODELS_DIR_PATH
 
+# Word vector types the query functions accept.
+WordVectors = KeyedVectors | QuantizedVectors | NeighbourVectors | FallbackVectors
 
-def query_task_menu(model: Word2Vec) -> None:
+def query_task_menu(vectors: WordVectors) -> None:
     """Menu to select appropriate query task."""
 
     # Menu variables.
@@ -33,7 +53,8 @@ def query_task_menu(model: Word2Vec) -> None:
         "1. Similarity between two words",
         "2. List the five most similar words",
         "3. Find the word that does not belong in the sequence",
-        "4. Exit",
+        "4. Complete an analogy (a is to b as c is to ?)",
+        "5. Exit",
     ]
 
     # Menu loop.
@@ -41,51 +62,72 @@ def query_task_menu(model: Word2Vec) -> None:
         _, index = pick(options, title, indicator="=>", default_index=0)
         match index:
             case 0:
-                two_words_similarity(model)
+                two_words_similarity(vectors)
             case 1:
-                five_most_similar(model)
+                five_most_similar(vectors)
             case 2:
-                does_not_match(model)
-            case 3:  # Break loop: exit script or return to main menu.
+                does_not_match(vectors)
+            case 3:
+                analogy(vectors)
+            case 4:  # Break loop: exit script or return to main menu.
                 break
             case _:  # Incorrect selection (should not happen).
                 error_crash("Selection error!")
 
 
-def two_words_similarity(model: Word2Vec) -> None:
+def two_words_similarity(vectors: WordVectors) -> None:
     """Calculate the similarity between two words."""
     word1 = input("\nEnter word #1: ")
     word2 = input("Enter word #2: ")
     try:
-        similarity = model.wv.similarity(word1, word2)
+        similarity = vectors.similarity(word1, word2)
         print(f"\nSimilarity: {similarity}")
     except KeyError as err_two_sim:
         logging.error("Word not in vocabulary: %s", err_two_sim)
     input("Press Enter to return...")
 
 
-def five_most_similar(model: Word2Vec) -> None:
+def five_most_similar(vectors: WordVectors) -> None:
     """List five most similar words to input."""
     word = input("\nEnter word: ")
     try:
-        similar_words = model.wv.most_similar(word, topn=5)
+        similar_words = vectors.most_similar(word, topn=5)
         pprint(similar_words)
     except KeyError as err_five_sim:
         logging.error("Word not in vocabulary: %s", err_five_sim)
+    except ValueError as err_five_value:
+        logging.error("No result: %s", err_five_value)
     input("Press Enter to return...")
 
 
-def does_not_match(model: Word2Vec) -> None:
+def does_not_match(vectors: WordVectors) -> None:
     """Find the word that does not match the rest."""
     words = input("\nEnter words (separated by space): ").split()
     try:
-        mismatch = model.wv.doesnt_match(words)
+        mismatch = vectors.doesnt_match(words)
         print(f"Mismatch: {mismatch}")
     except KeyError as err_match:
         logging.error("One or more words not in vocabulary: %s", err_match)
+    except ValueError as err_match_value:
+        logging.error("No result: %s", err_match_value)
     input("\nPress Enter to return...")
 
 
+def analogy(vectors: WordVectors) -> None:
+    """Complete an analogy: a is to b as c is to ?"""
+    word_a = input("\nEnter word a: ")
+    word_b = input("Enter word b: ")
+    word_c = input("Enter word c: ")
+    try:
+        answers = vectors.most_similar(positive=[word_b, word_c], negative=[word_a], topn=5)
+        pprint(answers)
+    except KeyError as err_analogy:
+        logging.error("One or more words not in vocabulary: %s", err_analogy)
+    except ValueError as err_analogy_value:
+        logging.error("No result: %s", err_analogy_value)
+    input("Press Enter to return...")
+
+
 def main() -> None:
     """Main function."""
 
@@ -95,15 +137,29 @@ def main() -> None:
     model_path = file_select_menu(
         "Word2Vec Query\nSelect model file: ",
         MODELS_DIR_PATH,
-        ".mdl",
+        (".mdl", ".qvec"),
     )
 
     # Only continue operations if a legitimate file was selected.
     if model_path:
-        # Create model instance
-        model = Word2Vec.load(datapath(model_path))
+        # Load word vectors: exported (quantized) or full model.
+        if model_path.suffix == ".qvec":
+            vectors = QuantizedVectors(model_path)
+            model_name = vectors.manifest.get("source", model_path.stem)
+        else:
+            vectors = Word2Vec.load(datapath(model_path)).wv
+            model_name = model_path.stem
+        # Serve frequent words from the precomputed neighbour index (if built).
+        config_file = load_config_file(CONFIG_FILE_PATH)
+        vectors = NeighbourVectors(
+            vectors, model_name, config_file["Neighbours"]["index-analogies"]
+        )
+        # Answer out-of-vocabulary words through lemma or n-gram fallback.
+        oov_config = config_file["OOV"]
+        if oov_config["query-fallback"]:
+            vectors = FallbackVectors(vectors, model_name, oov_config)
         # Launch menu.
-        query_task_menu(model)
+        query_task_menu(vectors)
 
 
 # Run when launched as standalone script.
@@ -0,0 +1,193 @@
+"""
+
+autotune.py
+
+Resource-aware autotuning of the training parameters of the HunCor2Vec
+project. A short calibration run measures the throughput of the corpus
+producer and of the Word2Vec workers, then picks the worker count,
+batch size and queue depth within the CPU and memory limits of the
+(possibly containerized) host.
+
+"""
+
+# Imports:
+import logging
+import os
+from itertools import islice
+from math import ceil
+from pathlib import Path
+from time import perf_counter
+from typing import Iterable, Optional
+from gensim.models import Word2Vec
+
+# cgroup limit files (v2 first, then v1).
+CGROUP_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+CGROUP_MEMORY_MAX = Path("/sys/fs/cgroup/memory.max")
+CGROUP_V1_MEMORY_LIMIT = Path("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+
+# Gensim truncates jobs above this many words, larger batches are pointless.
+MAX_BATCH_WORDS = 10000
+
+
+def _read_limit_file(path: Path) -> Optional[str]:
+    """Read a cgroup limit file, return None if it is missing or unreadable."""
+    try:
+        return path.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+
+def available_cpus() -> int:
+    """Number of CPU cores the process may use: the affinity mask,
+    further limited by the cgroup CPU quota."""
+
+    # Cores the process is allowed to run on.
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on Windows and macOS.
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 quota ("max 100000" or "<quota> <period>").
+    quota, period = None, None
+    cpu_max = _read_limit_file(CGROUP_CPU_MAX)
+    if cpu_max and not cpu_max.startswith("max"):
+        quota, period = (int(value) for value in cpu_max.split()[:2])
+    # cgroup v1 quota (-1 means unlimited).
+    else:
+        v1_quota = _read_limit_file(CGROUP_V1_CPU_QUOTA)
+        v1_period = _read_limit_file(CGROUP_V1_CPU_PERIOD)
+        if v1_quota and v1_period and int(v1_quota) > 0:
+            quota, period = int(v1_quota), int(v1_period)
+
+    if quota and period:
+        cpus = min(cpus, max(1, ceil(quota / period)))
+    return cpus
+
+
+def memory_limit() -> Optional[int]:
+    """Memory available to the process in bytes: the cgroup memory limit
+    or the physical memory of the host. None if it can not be determined."""
+
+    # cgroup v2, then v1 (v1 reports a huge number when unlimited).
+    for path in (CGROUP_MEMORY_MAX, CGROUP_V1_MEMORY_LIMIT):
+        limit = _read_limit_file(path)
+        if limit and limit.isdigit() and int(limit) < 2**60:
+            return int(limit)
+
+    # Physical memory.
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def measure_producer(corpus: Iterable[list[str]], sentence_limit: int) -> tuple[list, float]:
+    """Read the first sentences of the corpus. Returns the sentences and the
+    producer throughput in words/sec. The timer starts after the first
+    sentence, so opening the first shard (download, format detection,
+    archive setup) is not counted as tokenization time."""
+    stream = iter(corpus)
+    first = next(stream, None)
+    start = perf_counter()
+    sentences = [sentence for sentence in islice(stream, sentence_limit - 1) if sentence]
+    elapsed = perf_counter() - start
+    word_count = sum(len(sentence) for sentence in sentences)
+    if first:
+        sentences.insert(0, first)
+    return sentences, word_count / elapsed if elapsed else float("inf")
+
+
+def measure_consumer(
+    sentences: list[list[str]], word2vec_config: dict, workers: int, batch_words: int
+) -> float:
+    """Train one epoch on the in-memory sample. Returns the consumer
+    throughput in words/sec."""
+    settings = {**word2vec_config, "min_count": 1, "epochs": 1}
+    model = Word2Vec(workers=workers, batch_words=batch_words, **settings)
+    model.build_vocab(sentences)
+    start = perf_counter()
+    _, raw_words = model.train(sentences, total_examples=model.corpus_count, epochs=1)
+    elapsed = perf_counter() - start
+    return raw_words / elapsed if elapsed else float("inf")
+
+
+def calibrate(
+    corpus: Iterable[list[str]], word2vec_config: dict, autotune_config: dict
+) -> dict:
+    """Short calibration run. Returns the chosen training parameters
+    together with the measurements they are based on."""
+
+    cpus = available_cpus()
+    memory = memory_limit()
+    producer_cores = autotune_config["producer-cores"]
+    max_workers = max(1, cpus - producer_cores)
+    logging.info(
+        "Autotune: %d usable CPU cores (%d reserved for the producer), memory limit: %s.",
+        cpus, producer_cores, memory,
+    )
+
+    # Producer throughput (download, decompression and tokenization).
+    sentences, producer_rate = measure_producer(corpus, autotune_config["sample-sentences"])
+    if not sentences:
+        logging.warning("Autotune: empty calibration sample, using defaults.")
+        return {"workers": max_workers, "batch_words": MAX_BATCH_WORDS, "queue_factor": 2}
+    logging.info("Autotune: producer throughput %.0f words/sec.", producer_rate)
+
+    # Consumer throughput with growing worker counts. Stop when the workers
+    # already outrun the producer: more workers would only wait for data.
+    worker_rates: dict[int, float] = {}
+    workers = 1
+    while workers <= max_workers:
+        worker_rates[workers] = measure_consumer(
+            sentences, word2vec_config, workers, MAX_BATCH_WORDS
+        )
+        logging.info("Autotune: %d workers, %.0f words/sec.", workers, worker_rates[workers])
+        if worker_rates[workers] >= producer_rate or workers == max_workers:
+            break
+        workers = min(workers * 2, max_workers)
+    best_workers = min(
+        (count for count, rate in worker_rates.items() if rate >= producer_rate),
+        default=max(worker_rates, key=worker_rates.get),
+    )
+
+    # Batch size: smaller batches spread short corpora better over the
+    # workers, larger ones have less overhead. Keep the fastest.
+    batch_rates = {
+        batch: measure_consumer(sentences, word2vec_config, best_workers, batch)
+        for batch in autotune_config["batch-candidates"]
+        if batch <= MAX_BATCH_WORDS
+    }
+    best_batch = max(batch_rates, key=batch_rates.get, default=MAX_BATCH_WORDS)
+
+    # Queue depth: a deeper queue smooths the pauses between shards if the
+    # producer keeps up, but every queued job holds a batch of sentences.
+    avg_word_bytes = sum(len(word) for sentence in sentences for word in sentence) / sum(
+        len(sentence) for sentence in sentences
+    )
+    job_bytes = best_batch * (avg_word_bytes + 64)
+    queue_factor = 4 if producer_rate >= worker_rates[best_workers] else 2
+    if memory:
+        queue_factor = max(1, min(queue_factor, int(0.01 * memory / (job_bytes * best_workers))))
+
+    chosen = {
+        "cpus": cpus,
+        "memory_limit": memory,
+        "producer_words_per_sec": round(producer_rate),
+        "consumer_words_per_sec": {count: round(rate) for count, rate in worker_rates.items()},
+        "batch_words_per_sec": {batch: round(rate) for batch, rate in batch_rates.items()},
+        "workers": best_workers,
+        "batch_words": best_batch,
+        "queue_factor": queue_factor,
+    }
+    logging.info(
+        "Autotune: chosen workers=%d, batch_words=%d, queue_factor=%d.",
+        best_workers, best_batch, queue_factor,
+    )
+    return chosen
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
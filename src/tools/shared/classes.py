@@ -7,183 +7,336 @@ Python classes of the HunCor2Vec project.
 """
 
 # Imports:
-import gzip
+import json
 import logging
-from os import scandir
 from os.path import basename
 from pathlib import Path
-from shutil import copyfileobj
-from typing import Iterator, Literal
-from urllib.request import urlretrieve
+from typing import Iterator, Literal, Optional
+import numpy as np
 from gensim.models import Word2Vec
 from gensim.models.callbacks import CallbackAny2Vec
 from gensim.test.utils import datapath
 from gensim.utils import simple_preprocess
-from pandas import read_csv
-from .misc import dir_cleanup, load_config_file
-from .path_constants import (
-    CONFIG_FILE_PATH,
-    TEMP_DIR_PATH,
-    TEMP_GZ_PATH,
-    TEMP_TEXT_PATH,
-    TEMP_TSV_PATH,
-)
+from .filtering import LineFilter
+from .memory import MIB, MemoryMonitor
+from .phrasing import apply_phrasers
+from .misc import checkpoint_dir, checkpoint_epoch, in_sample, load_config_file
+from .path_constants import CONFIG_FILE_PATH, SHARD_CACHE_DIR_PATH, TEMP_DIR_PATH
+from .sources import Shard, ShardCache, SourceType, open_source, shard_lines
+from .tempspace import DiskBudget
 
 # Load config file.
 config_file = load_config_file(CONFIG_FILE_PATH)
 
+# Rows of a quantized matrix converted to float32 at once while scoring.
+QUERY_CHUNK_ROWS = 65536
+
+# Sentences read between two updates of the progress counters.
+PROGRESS_BATCH = 1000
+
+# Shared memory instrumentation (no-op unless enabled in the config file).
+memory_monitor = MemoryMonitor(config_file["Memory"])
+
 
 class MyCorpus:
     """Represents a multi-file text corpus."""
 
-    def __init__(self, source_type: Literal["list", "dir"], source_path: Path) -> None:
-        """Initialize object base attributes."""
+    def __init__(
+        self,
+        source_type: SourceType,
+        source_path: Optional[Path],
+        sample_config: Optional[dict] = None,
+        temp_dir: Optional[Path] = None,
+    ) -> None:
+        """Initialize object base attributes. If sample_config is given (or
+        enabled in the config file), only a deterministic sample is used.
+        Standard input is spooled to temp_dir (the temp directory of the run)."""
 
-        # Source file properties.
+        # Source properties.
         self.source_type = source_type
         self.source_path = source_path
 
-        # Temp file paths.
-        self.temp_text_file = datapath(TEMP_TEXT_PATH)
-        self.temp_tsv_file = datapath(TEMP_TSV_PATH)
-        self.temp_gz_file = datapath(TEMP_GZ_PATH)
+        # Optional cache of downloaded shards (reused by later epochs and
+        # runs), within the disk budget of tmp/, which evicts cached shards.
+        space_config = config_file["TempSpace"]
+        shard_cache = None
+        if space_config["shard-cache"]:
+            shard_cache = ShardCache(
+                DiskBudget(
+                    TEMP_DIR_PATH,
+                    space_config["tmp-limit"],
+                    space_config["headroom"],
+                    evict_dir=SHARD_CACHE_DIR_PATH,
+                )
+            )
 
-    def __iter__(self) -> Iterator[list[str]]:
-        """Multi-file corpus iterator. Used to feed (yield) tokenized data
-        line by line to the Word2Vec training method."""
+        # Source backend streaming the shards.
+        self.source = open_source(
+            source_type, source_path, Path(temp_dir or TEMP_DIR_PATH), shard_cache
+        )
 
-        # If source is a list .txt of scraped URLs:
-        if self.source_type == "list":
-            yield from self._process_link_list()
-        # If source is a directory with downloaded files.
-        elif self.source_type == "dir":
-            yield from self._process_directory()
-        # Else: error.
-        else:
-            logging.error("Unknown source type: %s", self.source_type)
+        # Optional deduplication and filtering stage.
+        filter_config = config_file["Filtering"]
+        self.line_filter = LineFilter(filter_config) if filter_config["enabled"] else None
 
-    def _process_link_list(self) -> Iterator[list[str]]:
-        """Process a list of links to .gz files."""
-        try:
-            with open(self.source_path, mode="r", encoding="utf-8") as link_list:
-                for link in link_list:
-                    link = link.rstrip()  # Strip newline character.
-                    self.download_gz(link, self.temp_gz_file)
-                    self.file_type_handling(self.temp_gz_file)
-                    yield from self._iterate_temp_text_file()
-        except Exception as err_link_list:
-            logging.exception("Error processing link list: %s", err_link_list)
-            raise
+        # Optional frozen phrase models (set by the trainer).
+        self.phrasers: list = []
 
-    def _process_directory(self) -> Iterator[list[str]]:
-        """Process a directory of .gz files."""
-        try:
-            for file in scandir(self.source_path):
-                if file.name.lower().endswith(".gz"):
-                    self.file_type_handling(file.path)
-                    yield from self._iterate_temp_text_file()
-        except Exception as err_files:
-            logging.exception("Error processing directory: %s", err_files)
-            raise
+        # Optional form -> lemma pair collector (set by the trainer).
+        self.lemma_collector = None
 
-    def _iterate_temp_text_file(self) -> Iterator[list[str]]:
-        """Iterate through the temporary text file and yield tokenized sentences."""
-        try:
-            with open(self.temp_text_file, mode="r", encoding="utf-8") as file:
-                for line in file:
-                    sentence = simple_preprocess(
-                        line, min_len=config_file["Tokenizer"]["min-length"]
-                    )
-                    yield sentence
-        except Exception as err_temp:
-            logging.exception("Error while iterating temp text file: %s", err_temp)
-            raise
+        # Optional progress tracker counting sentences and words (set by the trainer).
+        self.progress = None
 
-    def file_type_handling(self, file: str) -> None:
-        """Call appropriate functions based on corpus file type."""
+        # Shards to leave out (e.g. already trained on, see the model ledger)
+        # and sentence/word totals of the shards read in the last pass.
+        self.skip_shards: set[str] = set()
+        self.shard_stats: dict[str, dict[str, int]] = {}
 
-        # Document is a preprepared .tsv with a "lemma" column.
-        if ".tsv." in file:
-            self.extract_gz(file, self.temp_tsv_file)
-            self.convert_tsv(self.temp_tsv_file, self.temp_text_file)
+        # Optional deterministic sampling (shard or line level).
+        if sample_config is None and config_file["Sampling"]["enabled"]:
+            sample_config = config_file["Sampling"]
+        self.sample_config = sample_config
 
-        # File is a plain text file.
-        else:
-            self.extract_gz(file, self.temp_text_file)
+    def __iter__(self) -> Iterator[list[str]]:
+        """Multi-file corpus iterator. Used to feed (yield) tokenized data
+        line by line to the Word2Vec training method."""
 
-    def download_gz(self, url: str, out_file: str) -> None:
-        """Download a .gz file."""
-        filename = basename(url)
-        logging.info("Downloading %s", filename)
-        try:
-            urlretrieve(url, out_file)
-        except Exception as err_download:
-            logging.exception("Error downloading %s: %s", url, err_download)
-            raise
+        # Start every pass with an empty deduplication state.
+        if self.line_filter:
+            self.line_filter.reset()
 
-    def extract_gz(self, gz_file: str, out_file: str) -> None:
-        """Extract and save the content of a .gz file."""
-        filename = basename(gz_file)
-        logging.info("Uncompressing %s", filename)
-        try:
-            with gzip.open(gz_file, "r") as f_in, open(out_file, "wb") as f_out:
-                copyfileobj(f_in, f_out)
-        except Exception as err_extract:
-            logging.exception("Error extracting %s: %s", gz_file, err_extract)
-            raise
+        # Stream the shards of the source.
+        for shard in self.source.shards():
+            if self._use_shard(shard.name):
+                yield from self._iterate_shard(shard)
+
+        # Lemma pairs are collected during the first full pass only.
+        if self.lemma_collector:
+            self.lemma_collector.frozen = True
 
-    def convert_tsv(self, tsv_file: str, out_file: str) -> None:
-        """Create a .txt file with continuous text from the .tsv lemma column.
-        One line = one sentence."""
+    def _iterate_shard(self, shard: Shard) -> Iterator[list[str]]:
+        """Iterate through the text lines of a shard and yield tokenized
+        sentences. Lines are passed through the filtering stage first, if
+        enabled."""
+        logging.info("Reading %s", shard.name)
+        collector = self.lemma_collector
+        if collector and collector.frozen:
+            collector = None
+        progress = self.progress
+        if progress:
+            progress.begin_item("shard", shard.name, "words")
+        sentence_count, word_count = 0, 0
+        reported_sentences, reported_words = 0, 0
         try:
-            # Read .tsv file's lemma column to a pandas DataFrame.
-            df = read_csv(
-                tsv_file,
-                engine="c",
-                on_bad_lines="warn",
-                sep="\t",
-                quoting=3,
-                usecols=["lemma"],
-            )
-            # Remove NaN rows.
-            df.dropna(how="all", inplace=True)
-            # Convert to Python list.
-            df_list = list(df["lemma"])
-            # Write words to out_file (min_length 3), add newline in place of sentence
-            # closing punctuations.
-            with open(out_file, mode="w+", encoding="utf-8") as f:
-                for word in df_list:
-                    if len(word) > 2:
-                        f.write(f"{word} ")
-                    elif word in [".", ";", "?", "!"]:
-                        f.write("\n")
-        except Exception as err_tsv:
-            logging.exception("Error converting TSV %s: %s", tsv_file, err_tsv)
+            for line_index, line in enumerate(shard_lines(shard, collector)):
+                if not self._sampled("line", f"{shard.name}:{line_index}"):
+                    continue
+                if self.line_filter and not self.line_filter.keep(line):
+                    continue
+                sentence = simple_preprocess(line, min_len=config_file["Tokenizer"]["min-length"])
+                if self.phrasers:
+                    sentence = apply_phrasers(self.phrasers, sentence)
+                sentence_count += 1
+                word_count += len(sentence)
+                # Progress counters are updated in batches (hot path).
+                if progress and sentence_count - reported_sentences >= PROGRESS_BATCH:
+                    progress.add(
+                        sentences=sentence_count - reported_sentences,
+                        words=word_count - reported_words,
+                    )
+                    reported_sentences, reported_words = sentence_count, word_count
+                yield sentence
+            if progress:
+                progress.add(
+                    sentences=sentence_count - reported_sentences,
+                    words=word_count - reported_words,
+                )
+            if self.line_filter:
+                self.line_filter.log_shard(shard.name)
+            self.shard_stats[shard.name] = {"sentences": sentence_count, "words": word_count}
+        except Exception as err_shard:
+            logging.exception("Error while reading %s: %s", shard.name, err_shard)
             raise
 
+    def _use_shard(self, shard_name: str) -> bool:
+        """Check if a shard is read: not skipped and part of the sample."""
+        return shard_name not in self.skip_shards and self._sampled("shard", shard_name)
+
+    def _sampled(self, unit: Literal["shard", "line"], key: str) -> bool:
+        """Check if a shard or line belongs to the sample. Always True
+        if sampling is off or set to the other unit."""
+        if not self.sample_config or self.sample_config["unit"] != unit:
+            return True
+        return in_sample(key, self.sample_config["fraction"], self.sample_config["seed"])
+
 
 class AutoSaver(CallbackAny2Vec):
     """Callback class to save the trained model after each epoch and
     at the end of all training operations."""
 
-    def __init__(self, model_path: Path) -> None:
-        """Initialize object with base attributes."""
+    def __init__(self, model_path: Path, temp_dir: Optional[Path] = None) -> None:
+        """Initialize object with base attributes. Epoch autosaves are
+        written to temp_dir (the temp directory of the run), or kept in
+        models/<model>_checkpoints/ for the comparison tool. Kept checkpoints
+        continue the epoch numbering of earlier runs (continued training)."""
         self.model_path = datapath(model_path)
         self.model_file_name = basename(model_path)
+        self.temp_dir = Path(temp_dir or TEMP_DIR_PATH)
         self.epoch = 0
+        self.epoch_offset = 0
+        if config_file["Comparison"]["keep-checkpoints"]:
+            self.temp_dir = checkpoint_dir(model_path)
+            self.temp_dir.mkdir(parents=True, exist_ok=True)
+            kept_epochs = [checkpoint_epoch(path) for path in self.temp_dir.glob("*.mdl")]
+            self.epoch_offset = max((e for e in kept_epochs if e is not None), default=-1) + 1
+
+        # Optional progress tracker reporting the epoch ETA (set by the trainer).
+        self.progress = None
+
+    def on_epoch_begin(self, model: Word2Vec) -> None:
+        """Called at the start of each epoch. Starts measuring its memory
+        use and its progress (words read of the corpus total)."""
+        memory_monitor.begin("epoch")
+        if self.progress:
+            self.progress.begin_item(
+                "epoch", f"epoch {self.epoch + 1}/{model.epochs}", "words", model.corpus_total_words
+            )
 
     def on_epoch_end(self, model: Word2Vec) -> None:
         """Called at the end of each epoch.
         Autosave temporary model files."""
-        file_name = f"AUTOSAVE_epoch{self.epoch}_{self.model_file_name}"
-        output_path = datapath(TEMP_DIR_PATH.joinpath(file_name))
-        model.save(output_path)
-        logging.info("Autosaved model at end of epoch %d.", self.epoch)
+        epoch_peak = memory_monitor.end("epoch")
+        # Numbered on from the kept checkpoints of earlier runs.
+        epoch_number = self.epoch_offset + self.epoch
+        file_name = f"AUTOSAVE_epoch{epoch_number}_{self.model_file_name}"
+        output_path = datapath(self.temp_dir.joinpath(file_name))
+        self._save(model, output_path)
+        if memory_monitor.enabled:
+            logging.info(
+                "Autosaved model at end of epoch %d (epoch peak RSS: %.0f MiB).",
+                epoch_number, epoch_peak / MIB,
+            )
+        else:
+            logging.info("Autosaved model at end of epoch %d.", epoch_number)
         self.epoch += 1
 
     def on_train_end(self, model: Word2Vec) -> None:
         """Called at the end of all training operations. Saves
-        model and removes temporary files."""
-        model.save(self.model_path)
-        logging.info("Removing temporary files.")
-        dir_cleanup(TEMP_DIR_PATH, (".gz", ".mdl", ".npy", ".tsv", ".txt"))
+        model (the epoch autosaves go with the run's temp directory)."""
+        self._save(model, self.model_path)
+
+    @staticmethod
+    def _save(model: Word2Vec, output_path: str) -> None:
+        """Save the model as a measured "checkpoint" stage. Over the memory
+        budget, every array is written to its own .npy file next to the
+        model (sep_limit=0) instead of being copied into the pickle."""
+        with memory_monitor.stage("checkpoint"):
+            if memory_monitor.over_budget("checkpoint"):
+                logging.info("Checkpoint memory budget exceeded, saving all arrays separately.")
+                model.save(output_path, sep_limit=0)
+            else:
+                model.save(output_path)
+
+
+class QuantizedVectors:
+    """Read-only, memory-mapped word vectors exported in float16 or int8
+    format (see exporting.py). Rows are stored unit-normalized, so only
+    cosine based queries are supported. Provides the query methods of
+    gensim's KeyedVectors used by the query tool."""
+
+    def __init__(self, manifest_path: Path) -> None:
+        """Load the manifest, memory-map the matrix and read the vocabulary."""
+        manifest_path = Path(manifest_path)
+        with open(manifest_path, mode="r", encoding="utf-8") as manifest_file:
+            self.manifest = json.load(manifest_file)
+        model_dir = manifest_path.parent
+
+        # Quantized matrix (memory-mapped) and per-row scale factors:
+        # the unit vector of row i is scales[i] * vectors[i].
+        self.vectors = np.load(model_dir.joinpath(self.manifest["vectors"]), mmap_mode="r")
+        self.scales = np.load(model_dir.joinpath(self.manifest["scales"]))
+
+        # Vocabulary in frequency order.
+        with open(model_dir.joinpath(self.manifest["vocab"]), mode="r", encoding="utf-8") as f:
+            self.index_to_key = f.read().splitlines()
+        self.key_to_index = {word: index for index, word in enumerate(self.index_to_key)}
+
+    def __contains__(self, word: str) -> bool:
+        """Check if a word is in the vocabulary."""
+        return word in self.key_to_index
+
+    def get_vector(self, word: str, norm: bool = True) -> np.ndarray:
+        """Dequantize a single row (always unit length, the norm argument
+        is only kept for KeyedVectors compatibility). Raises KeyError for
+        unknown words."""
+        del norm  # Rows are stored unit-normalized.
+        if word not in self.key_to_index:
+            raise KeyError(f"Key '{word}' not present")
+        index = self.key_to_index[word]
+        return self.scales[index] * self.vectors[index].astype(np.float32)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a unit vector against every row. The matrix
+        is converted to float32 chunk by chunk, never as a whole."""
+        result = np.empty(len(self.index_to_key), dtype=np.float32)
+        for start in range(0, len(result), QUERY_CHUNK_ROWS):
+            chunk = self.vectors[start : start + QUERY_CHUNK_ROWS].astype(np.float32)
+            result[start : start + len(chunk)] = chunk @ query
+        return result * self.scales
+
+    def similarity(self, word1: str, word2: str) -> float:
+        """Cosine similarity between two words."""
+        return float(np.dot(self.get_vector(word1), self.get_vector(word2)))
+
+    @staticmethod
+    def _unit_mean(mean: np.ndarray) -> np.ndarray:
+        """Normalize a mean vector. Raises ValueError if it is zero (no
+        input, cancelling positive and negative words, all-zero rows)."""
+        norm = np.linalg.norm(mean)
+        if not norm:
+            raise ValueError("Cannot compute similarity with a zero mean vector.")
+        return mean / norm
+
+    def _as_vector(self, item: str | np.ndarray) -> np.ndarray:
+        """Unit vector of a word, or a given vector as is."""
+        return item if isinstance(item, np.ndarray) else self.get_vector(item)
+
+    def most_similar(
+        self,
+        positive: str | list[str | np.ndarray],
+        negative: Optional[list[str | np.ndarray]] = None,
+        topn: int = 10,
+    ) -> list[tuple[str, float]]:
+        """Words most similar to the mean of the positive and the negated
+        negative words (or vectors), like KeyedVectors.most_similar."""
+        if isinstance(positive, str):
+            positive = [positive]
+        negative = negative or []
+        if not positive + negative:
+            raise ValueError("Cannot compute similarity with no input.")
+        mean = np.sum([self._as_vector(item) for item in positive], axis=0)
+        if negative:
+            mean -= np.sum([self._as_vector(item) for item in negative], axis=0)
+        mean = self._unit_mean(mean)
+
+        # Top results, skipping the query words themselves.
+        scores = self.scores(mean)
+        exclude = {
+            self.key_to_index[item] for item in positive + negative if isinstance(item, str)
+        }
+        count = min(topn + len(exclude), len(scores))
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best])]
+        return [
+            (self.index_to_key[index], float(scores[index]))
+            for index in best
+            if index not in exclude
+        ][:topn]
+
+    def doesnt_match(self, words: list[str]) -> str:
+        """The word furthest away from the mean of all words."""
+        unit_vectors = np.array([self.get_vector(word) for word in words])
+        mean = unit_vectors.mean(axis=0)
+        mean = self._unit_mean(mean)
+        return words[int(np.argmin(unit_vectors @ mean))]
@@ -0,0 +1,237 @@
+"""
+
+filtering.py
+
+Optional deduplication and line filtering stage of the HunCor2Vec project.
+Sits between the decoding of a corpus file and the tokenization of its lines.
+
+"""
+
+# Imports:
+import logging
+from hashlib import blake2b
+from math import ceil, log
+from re import compile as re_compile
+from zlib import crc32
+import numpy as np
+
+# Whitespace normalization pattern.
+WHITESPACE_RE = re_compile(r"\s+")
+
+# Mersenne prime used for the MinHash permutations. Shingle hashes and
+# coefficients are below it, so a * x + b fits 64 bits and wraps the
+# modulus many times (a permutation, not a near-monotonic map).
+MINHASH_PRIME = (1 << 31) - 1
+
+
+class BloomFilter:
+    """Fixed size Bloom filter. Memory use is bounded by the expected
+    number of items and the accepted false positive rate."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        """Initialize object base attributes. Calculates the optimal
+        bit array size and number of hash functions."""
+        self.bit_count = max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * log(2)))
+        self.bits = bytearray(ceil(self.bit_count / 8))
+
+    def _positions(self, key: bytes) -> list[int]:
+        """Derive the bit positions of a key with double hashing."""
+        digest = blake2b(key, digest_size=16).digest()
+        hash_a = int.from_bytes(digest[:8], "little")
+        hash_b = int.from_bytes(digest[8:], "little") | 1
+        return [(hash_a + i * hash_b) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, key: bytes) -> bool:
+        """Add a key to the filter. Returns True if the key was
+        (probably) already present."""
+        present = True
+        for pos in self._positions(key):
+            byte_index, bit_mask = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte_index] & bit_mask:
+                present = False
+                self.bits[byte_index] |= bit_mask
+        return present
+
+    def clear(self) -> None:
+        """Reset all bits of the filter."""
+        self.bits = bytearray(len(self.bits))
+
+
+class MinHashDeduplicator:
+    """Near-duplicate detection with MinHash signatures and LSH banding.
+    The keys of every band are stored in a Bloom filter of their own to
+    keep memory bounded. A line is looked up in every band, so each filter
+    gets error_rate / bands: a unique line is then dropped with about
+    error_rate probability."""
+
+    def __init__(
+        self,
+        permutations: int,
+        bands: int,
+        shingle_size: int,
+        capacity: int,
+        error_rate: float,
+        seed: int = 1,
+    ) -> None:
+        """Initialize object base attributes and the random permutations."""
+        if permutations % bands:
+            raise ValueError("MinHash permutations must be divisible by bands.")
+        self.bands = bands
+        self.rows = permutations // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.perm_a = rng.integers(1, MINHASH_PRIME, size=permutations, dtype=np.uint64)
+        self.perm_b = rng.integers(0, MINHASH_PRIME, size=permutations, dtype=np.uint64)
+        self.seen_bands = [BloomFilter(capacity, error_rate / bands) for _ in range(bands)]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory use of the band filters in bytes."""
+        return sum(len(band_filter.bits) for band_filter in self.seen_bands)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """Hash the character shingles of a text to integers below the prime."""
+        size = self.shingle_size
+        if len(text) <= size:
+            return np.array([crc32(text.encode("utf-8"))], dtype=np.uint64) % MINHASH_PRIME
+        return np.fromiter(
+            (crc32(text[i : i + size].encode("utf-8")) for i in range(len(text) - size + 1)),
+            dtype=np.uint64,
+        ) % np.uint64(MINHASH_PRIME)
+
+    def signature(self, text: str) -> np.ndarray:
+        """Calculate the MinHash signature of a text."""
+        shingles = self._shingles(text)
+        # (a * x + b) mod p for every permutation/shingle pair. Shingles and
+        # coefficients are below 2^31, so the sum can not overflow 64 bits.
+        hashes = (
+            self.perm_a[:, None] * shingles[None, :] + self.perm_b[:, None]
+        ) % np.uint64(MINHASH_PRIME)
+        return hashes.min(axis=1)
+
+    def is_duplicate(self, text: str) -> bool:
+        """Register a text, return True if a similar text was seen before."""
+        signature = self.signature(text)
+        duplicate = False
+        for band_index, band_filter in enumerate(self.seen_bands):
+            band = signature[band_index * self.rows : (band_index + 1) * self.rows]
+            if band_filter.add(band.tobytes()):
+                duplicate = True
+        return duplicate
+
+    def clear(self) -> None:
+        """Forget all registered texts."""
+        for band_filter in self.seen_bands:
+            band_filter.clear()
+
+
+class LineFilter:
+    """Corpus line filter: drops too short or too long lines, lines with
+    a low ratio of letters, exact duplicates and (optionally) near-duplicates.
+    Keeps removal statistics per shard."""
+
+    def __init__(self, filter_config: dict) -> None:
+        """Initialize object base attributes from the "Filtering"
+        section of the config file."""
+
+        # Length and character class limits.
+        self.min_chars = filter_config["min-chars"]
+        self.max_chars = filter_config["max-chars"]
+        self.min_alpha_ratio = filter_config["min-alpha-ratio"]
+
+        # Deduplication helpers.
+        capacity = filter_config["expected-lines"]
+        error_rate = filter_config["error-rate"]
+        self.exact = BloomFilter(capacity, error_rate) if filter_config["dedup-exact"] else None
+        self.near = (
+            MinHashDeduplicator(
+                filter_config["minhash-permutations"],
+                filter_config["minhash-bands"],
+                filter_config["shingle-size"],
+                capacity,
+                error_rate,
+            )
+            if filter_config["dedup-near"]
+            else None
+        )
+
+        # The filters are allocated up front: check that they fit.
+        filter_bytes = (len(self.exact.bits) if self.exact else 0) + (
+            self.near.nbytes if self.near else 0
+        )
+        if filter_bytes > filter_config["max-filter-mib"] * 2**20:
+            raise ValueError(
+                f"Deduplication filters need {filter_bytes / 2**20:.0f} MiB, more than "
+                f"max-filter-mib: lower expected-lines or raise error-rate."
+            )
+        logging.info("Deduplication filters: %.0f MiB.", filter_bytes / 2**20)
+
+        # Per-shard statistics.
+        self.stats = self._empty_stats()
+
+    @staticmethod
+    def _empty_stats() -> dict[str, int]:
+        """Return a zeroed statistics dictionary."""
+        return {"total": 0, "length": 0, "charset": 0, "exact": 0, "near": 0}
+
+    def reset(self) -> None:
+        """Clear the deduplication state. Called at the start of each
+        corpus pass, so that every epoch sees the same filtered corpus."""
+        if self.exact:
+            self.exact.clear()
+        if self.near:
+            self.near.clear()
+        self.stats = self._empty_stats()
+
+    def keep(self, line: str) -> bool:
+        """Decide whether a line is kept. Updates statistics."""
+        self.stats["total"] += 1
+        text = WHITESPACE_RE.sub(" ", line).strip().lower()
+
+        # Length filter.
+        if not self.min_chars <= len(text) <= self.max_chars:
+            self.stats["length"] += 1
+            return False
+
+        # Character class filter (letters over non-space characters).
+        non_space = len(text) - text.count(" ")
+        alpha = sum(1 for char in text if char.isalpha())
+        if not non_space or alpha / non_space < self.min_alpha_ratio:
+            self.stats["charset"] += 1
+            return False
+
+        # Exact duplicate filter.
+        if self.exact and self.exact.add(text.encode("utf-8")):
+            self.stats["exact"] += 1
+            return False
+
+        # Near-duplicate filter.
+        if self.near and self.near.is_duplicate(text):
+            self.stats["near"] += 1
+            return False
+
+        return True
+
+    def log_shard(self, shard_name: str) -> None:
+        """Log removal statistics of a shard, then reset the counters."""
+        total = self.stats["total"]
+        removed = sum(count for key, count in self.stats.items() if key != "total")
+        logging.info(
+            "Filtered %s: removed %d of %d lines (%.1f%%) "
+            "[length: %d, charset: %d, exact dup: %d, near dup: %d]",
+            shard_name,
+            removed,
+            total,
+            100 * removed / total if total else 0.0,
+            self.stats["length"],
+            self.stats["charset"],
+            self.stats["exact"],
+            self.stats["near"],
+        )
+        self.stats = self._empty_stats()
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,171 @@
+"""
+
+memory.py
+
+Opt-in memory instrumentation of the HunCor2Vec project: per-stage peak
+RSS (sampled by a background thread) and Python allocation peaks
+(tracemalloc), with configurable per-stage memory budgets.
+
+"""
+
+# Imports:
+import logging
+import os
+import tracemalloc
+from contextlib import contextmanager
+from threading import Event, Lock, Thread
+from typing import Iterator, Optional
+
+# Bytes in a MiB.
+MIB = 2**20
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of the process in bytes (Linux /proc).
+    None where it is not available."""
+    try:
+        with open("/proc/self/statm", mode="r", encoding="utf-8") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class MemoryMonitor:
+    """Tracks the peak memory use of named stages (build_vocab, train,
+    epoch, checkpoint, ...). Does nothing unless enabled in the "Memory"
+    section of the config file."""
+
+    def __init__(self, memory_config: dict) -> None:
+        """Initialize object base attributes."""
+        self.enabled = memory_config["enabled"]
+        self.use_tracemalloc = memory_config["tracemalloc"]
+        self.interval = memory_config["sample-interval"]
+        self.budgets = {
+            stage: limit * MIB for stage, limit in memory_config["budgets"].items() if limit
+        }
+
+        # Active stages and their peaks (bytes): RSS and Python allocations.
+        self.active: dict[str, int] = {}
+        self.traced: dict[str, int] = {}
+        self.peaks: dict[str, int] = {}
+        self.warned: set[str] = set()
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.sampler: Optional[Thread] = None
+
+    def _start(self) -> None:
+        """Start the RSS sampling thread (and tracemalloc) on first use."""
+        if self.sampler or not self.enabled:
+            return
+        if current_rss() is None:
+            logging.warning("RSS is not available on this platform, only tracemalloc is used.")
+        else:
+            self.sampler = Thread(target=self._sample_loop, name="rss-sampler", daemon=True)
+            self.sampler.start()
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _sample_loop(self) -> None:
+        """Background thread: update the peak of every active stage and
+        warn once per stage when its budget is exceeded."""
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> Optional[int]:
+        """Take one RSS sample. Returns the current RSS."""
+        rss = current_rss()
+        if rss is None:
+            return None
+        with self.lock:
+            for stage, peak in self.active.items():
+                self.active[stage] = max(peak, rss)
+                budget = self.budgets.get(stage)
+                if budget and rss > budget and stage not in self.warned:
+                    self.warned.add(stage)
+                    logging.warning(
+                        "Memory budget of stage '%s' exceeded: %.0f MiB > %.0f MiB.",
+                        stage, rss / MIB, budget / MIB,
+                    )
+        return rss
+
+    def over_budget(self, stage: str) -> bool:
+        """Check if the current RSS is above the budget of a stage."""
+        budget = self.budgets.get(stage)
+        if not self.enabled or not budget:
+            return False
+        rss = self.sample()
+        return rss is not None and rss > budget
+
+    def budget(self, stage: str) -> Optional[int]:
+        """Budget of a stage in bytes, None if unlimited or disabled."""
+        return self.budgets.get(stage) if self.enabled else None
+
+    def _fold_traced_peak(self) -> None:
+        """Fold the tracemalloc peak since the last call into the peaks of
+        the active stages, then restart it. Every stage keeps its own peak,
+        nested stages (e.g. epoch inside train) do not wipe the outer one."""
+        if not self.use_tracemalloc:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for stage, stage_peak in self.traced.items():
+            self.traced[stage] = max(stage_peak, peak)
+        tracemalloc.reset_peak()
+
+    def begin(self, name: str) -> None:
+        """Start measuring a stage."""
+        if not self.enabled:
+            return
+        self._start()
+        with self.lock:
+            self.active[name] = current_rss() or 0
+            if self.use_tracemalloc:
+                self._fold_traced_peak()
+                self.traced[name] = tracemalloc.get_traced_memory()[0]
+
+    def end(self, name: str) -> int:
+        """Stop measuring a stage, log and return its peak RSS in bytes."""
+        if not self.enabled or name not in self.active:
+            return 0
+        self.sample()
+        with self.lock:
+            peak = self.active.pop(name)
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+            if self.use_tracemalloc:
+                self._fold_traced_peak()
+                traced_peak = self.traced.pop(name)
+        if self.use_tracemalloc:
+            logging.info(
+                "Stage '%s' peak RSS: %.0f MiB, Python allocations: %.0f MiB.",
+                name, peak / MIB, traced_peak / MIB,
+            )
+        else:
+            logging.info("Stage '%s' peak RSS: %.0f MiB.", name, peak / MIB)
+        return peak
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager measuring the peak memory of a stage."""
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def report(self) -> dict[str, float]:
+        """Peak RSS of every finished stage in MiB (for the run metrics)."""
+        return {stage: round(peak / MIB, 1) for stage, peak in self.peaks.items()}
+
+    def stop(self) -> None:
+        """Stop the sampling thread and tracemalloc."""
+        self.stop_event.set()
+        if self.sampler:
+            self.sampler.join()
+            self.sampler = None
+        self.stop_event.clear()
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
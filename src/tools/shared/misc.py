@@ -7,14 +7,27 @@ Miscellaneous auxiliary functions of the HunCor2Vec project.
 """
 
 # Imports.
+import json
 import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
 from os import remove, scandir
 from os.path import isfile
 from pathlib import Path
+from shutil import rmtree
 from sys import exit as sys_exit
-from typing import Optional
+from threading import Thread
+from typing import Iterable, Literal, Optional
 from pick import pick
 from yaml import safe_load
+from .path_constants import DOWNLOADS_DIR_PATH, LINKS_DIR_PATH, MODELS_DIR_PATH
+
+# Suffix of the directories of kept epoch checkpoints in models/.
+CHECKPOINT_DIR_SUFFIX = "_checkpoints"
+
+# Epoch number in the file name of an autosaved checkpoint.
+CHECKPOINT_EPOCH_PATTERN = re.compile(r"^AUTOSAVE_epoch(\d+)_")
 
 
 def yes_no_menu(prompt_text: str) -> bool:
@@ -52,9 +65,11 @@ def file_select_loop(prompt_text: str, dir_path: Path) -> Path:
     return file_path
 
 
-def file_select_menu(prompt_text: str, dir_path: Path, file_ext: str) -> Optional[Path]:
+def file_select_menu(
+    prompt_text: str, dir_path: Path, file_ext: str | tuple[str, ...]
+) -> Optional[Path]:
     """Create a pick menu to select a file from a given directory.
-    Filters based on file extension. Returns selected file path."""
+    Filters based on file extension(s). Returns selected file path."""
 
     # Set title and options.
     title = prompt_text
@@ -75,6 +90,37 @@ def file_select_menu(prompt_text: str, dir_path: Path, file_ext: str) -> Optiona
     return selected_file
 
 
+def get_training_source() -> tuple[Literal["list", "dir", "archive"], Optional[Path]]:
+    """Ask user for the type and location of the training sources. Returns the
+    type of the source (list of file urls, a directory of downloaded
+    files or an archive) and its path."""
+
+    # Menu variables.
+    title = "Select the type of training material: "
+    options = ["1. Link list file", "2. Downloaded packages", "3. Archive file (tar/zip)"]
+    _, index = pick(options, title, indicator="=>", default_index=0)
+
+    # Menu switch.
+    match index:
+        case 0:  # Link list
+            source_type = "list"
+            source_path = file_select_menu("Select list file: ", LINKS_DIR_PATH, ".txt")
+        case 1:  # Downloaded files.
+            source_type = "dir"
+            source_path = DOWNLOADS_DIR_PATH
+        case 2:  # Archive in the downloads folder.
+            source_type = "archive"
+            source_path = file_select_menu(
+                "Select archive file: ",
+                DOWNLOADS_DIR_PATH,
+                (".tar", ".tgz", ".tar.gz", ".tar.bz2", ".tar.xz", ".zip"),
+            )
+        case _:  # Incorrect selection (should not happen).
+            error_crash("Selection error!")
+
+    return source_type, source_path
+
+
 def check_dirs(dirs: list[Path]) -> None:
     """Check if required directories exist,
     if not, create them."""
@@ -82,22 +128,54 @@ def check_dirs(dirs: list[Path]) -> None:
         path.mkdir(parents=True, exist_ok=True)
 
 
-def dir_cleanup(dir_path: Path, file_ext: str | tuple[str, ...]) -> None:
+def remove_path(path: Path) -> bool:
+    """Remove a file or a directory tree with error handling.
+    Returns True if removed."""
+    try:
+        if Path(path).is_dir():
+            rmtree(path)
+        else:
+            remove(path)
+        logging.info("%s removed.", path)
+        return True
+    except (FileNotFoundError, OSError) as err_remove:
+        logging.error("Error removing %s: %s", path, err_remove)
+        return False
+
+
+def remove_paths(paths: Iterable[Path], workers: int = 4) -> int:
+    """Remove files and directory trees with a limited number of threads
+    (removal is I/O bound). Returns the number of removed paths."""
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return sum(executor.map(remove_path, paths))
+
+
+def cleanup_in_background(paths: Iterable[Path], workers: int = 4) -> Thread:
+    """Remove files and directory trees without blocking the caller.
+    The thread is not a daemon: the interpreter waits for it at exit."""
+    thread = Thread(target=remove_paths, args=(list(paths), workers), name="cleanup")
+    thread.start()
+    return thread
+
+
+def dir_cleanup(
+    dir_path: Path, file_ext: str | tuple[str, ...], prompt: bool = True, workers: int = 4
+) -> None:
     """Remove all files from a directory with a certain
     file extension"""
 
-    # File removal loop with error handling.
-    for file in scandir(dir_path):
-        if file.name.lower().endswith(file_ext):
-            try:
-                remove(file.path)
-                logging.info("%s removed.", file.path)
-            except (FileNotFoundError, OSError) as err_remove:
-                logging.error("Error removing file %s: %s", file.path, err_remove)
+    # Parallel file removal.
+    files = [
+        Path(file.path)
+        for file in scandir(dir_path)
+        if file.is_file() and file.name.lower().endswith(file_ext)
+    ]
+    removed = remove_paths(files, workers)
 
     # Operation end prompt.
-    logging.info("Process completed.")
-    input("Press Enter to continue...")
+    logging.info("Process completed, %d files removed.", removed)
+    if prompt:
+        input("Press Enter to continue...")
 
 
 def load_config_file(file_path: Path) -> dict:
@@ -115,6 +193,58 @@ def load_config_file(file_path: Path) -> dict:
     return config_dict
 
 
+def update_run_metrics(model_path: Path, section: str, values: dict) -> None:
+    """Store values under a section of the run metrics file belonging
+    to a model (models/<model>_metrics.json)."""
+    metrics_path = Path(model_path).with_name(f"{Path(model_path).stem}_metrics.json")
+    metrics = {}
+    if isfile(metrics_path):
+        with open(metrics_path, mode="r", encoding="utf-8") as metrics_file:
+            metrics = json.load(metrics_file)
+    metrics[section] = values
+    with open(metrics_path, mode="w", encoding="utf-8") as metrics_file:
+        json.dump(metrics, metrics_file, indent=2, default=str)
+
+
+def load_ledger(model_path: Path) -> dict[str, dict[str, int]]:
+    """Load the shard ledger of a model (models/<model>_ledger.json):
+    the corpus files the model was trained on, with their sentence and
+    word totals. Empty if the model has no ledger yet."""
+    ledger_path = Path(model_path).with_name(f"{Path(model_path).stem}_ledger.json")
+    if not isfile(ledger_path):
+        return {}
+    with open(ledger_path, mode="r", encoding="utf-8") as ledger_file:
+        return json.load(ledger_file)
+
+
+def update_ledger(model_path: Path, shard_stats: dict[str, dict[str, int]]) -> None:
+    """Add trained shards to the shard ledger of a model."""
+    ledger = load_ledger(model_path)
+    ledger.update(shard_stats)
+    ledger_path = Path(model_path).with_name(f"{Path(model_path).stem}_ledger.json")
+    with open(ledger_path, mode="w", encoding="utf-8") as ledger_file:
+        json.dump(ledger, ledger_file, indent=2)
+
+
+def checkpoint_dir(model_path: Path) -> Path:
+    """Directory of the kept epoch checkpoints of a model
+    (models/<model>_checkpoints/)."""
+    return MODELS_DIR_PATH.joinpath(f"{Path(model_path).stem}{CHECKPOINT_DIR_SUFFIX}")
+
+
+def checkpoint_epoch(path: Path) -> Optional[int]:
+    """Epoch number of an autosaved checkpoint, None for other files."""
+    match = CHECKPOINT_EPOCH_PATTERN.match(Path(path).name)
+    return int(match.group(1)) if match else None
+
+
+def in_sample(key: str, fraction: float, seed: int) -> bool:
+    """Deterministic hash-based sampling. Returns True if the key
+    falls into the given fraction for the given seed."""
+    digest = blake2b(f"{seed}:{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2**64 < fraction
+
+
 def default_logging() -> None:
     """Set default logging settings."""
     logging.basicConfig(
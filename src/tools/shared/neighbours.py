@@ -0,0 +1,294 @@
+"""
+
+neighbours.py
+
+Precomputed nearest neighbour index of the HunCor2Vec query layer. The
+top-k neighbour lists of the most frequent words are computed offline
+with blocked matrix multiplication in worker processes and stored
+memory-mapped next to the model in models/.
+
+"""
+
+# Imports:
+import json
+import logging
+from hashlib import blake2b
+from multiprocessing import Pool
+from os.path import isfile
+from pathlib import Path
+from typing import Optional
+import numpy as np
+from .path_constants import MODELS_DIR_PATH
+
+# Per-process state of the workers: the unit-normalized matrix ("units",
+# memory-mapped once per process).
+_WORKER_STATE: dict[str, np.ndarray] = {}
+
+
+def neighbour_index_paths(model_name: str) -> tuple[Path, Path, Path]:
+    """Paths of the neighbour index of a model: manifest, neighbour ids
+    and neighbour scores."""
+    return (
+        MODELS_DIR_PATH.joinpath(f"{model_name}_neighbours.json"),
+        MODELS_DIR_PATH.joinpath(f"{model_name}_neighbours.npy"),
+        MODELS_DIR_PATH.joinpath(f"{model_name}_neighbour_scores.npy"),
+    )
+
+
+def keys_fingerprint(keys: list[str]) -> str:
+    """Fingerprint of a vocabulary slice: an index is only valid for the
+    vocabulary (and word order) it was built on."""
+    return blake2b("\n".join(keys).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def remove_neighbour_index(model_name: str) -> None:
+    """Remove the (outdated) neighbour index of a model, if any."""
+    paths = neighbour_index_paths(model_name)
+    if not isfile(paths[0]):
+        return
+    for path in paths:
+        path.unlink(missing_ok=True)
+    logging.info(
+        "Outdated neighbour index of %s removed, rebuild it with the neighbour index tool.",
+        model_name,
+    )
+
+
+def write_unit_matrix(wv, out_path: Path, block_rows: int) -> None:
+    """Write the unit-normalized vectors to a .npy file block by block
+    (without a normalized copy of the whole matrix in memory)."""
+    units = np.lib.format.open_memmap(
+        out_path, mode="w+", dtype=np.float32, shape=wv.vectors.shape
+    )
+    for start in range(0, len(wv.vectors), block_rows):
+        block = np.array(wv.vectors[start : start + block_rows], dtype=np.float32)
+        block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        units[start : start + block_rows] = block
+    units.flush()
+    del units
+
+
+def _init_worker(units_path: str) -> None:
+    """Pool initializer: memory-map the unit matrix once per process."""
+    _WORKER_STATE["units"] = np.load(units_path, mmap_mode="r")
+
+
+def block_neighbours(
+    start: int,
+    end: int,
+    candidates: int,
+    topn: int,
+    block_cols: int,
+    units: Optional[np.ndarray] = None,
+) -> tuple[int, np.ndarray, np.ndarray]:
+    """Top-n neighbours of the query rows start:end of a unit matrix
+    among its first candidates rows (the query word itself excluded).
+    The candidates are scanned in column blocks, so memory stays at
+    rows x block_cols floats. Uses the matrix of the worker process if
+    units is not given."""
+    units = _WORKER_STATE["units"] if units is None else units
+    queries = np.asarray(units[start:end])
+    rows = np.arange(end - start)
+    best_ids = np.empty((end - start, 0), dtype=np.int64)
+    best_scores = np.empty((end - start, 0), dtype=np.float32)
+
+    for col_start in range(0, candidates, block_cols):
+        col_end = min(col_start + block_cols, candidates)
+        scores = queries @ np.asarray(units[col_start:col_end]).T
+        # Exclude the query words themselves.
+        self_rows = rows[(rows + start >= col_start) & (rows + start < col_end)]
+        scores[self_rows, self_rows + start - col_start] = -np.inf
+
+        # Best of this block, merged with the best so far.
+        k = min(topn, col_end - col_start)
+        block_ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.concatenate(
+            [best_scores, np.take_along_axis(scores, block_ids, axis=1)], axis=1
+        )
+        best_ids = np.concatenate([best_ids, block_ids + col_start], axis=1)
+        if best_ids.shape[1] > topn:
+            keep = np.argpartition(-best_scores, topn - 1, axis=1)[:, :topn]
+            best_ids = np.take_along_axis(best_ids, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+    # Sort every list by decreasing score.
+    order = np.argsort(-best_scores, axis=1)
+    return (
+        start,
+        np.take_along_axis(best_ids, order, axis=1).astype(np.int32),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+def build_neighbour_index(
+    wv, model_name: str, neighbour_config: dict, processes: int, temp_dir: Path
+) -> Path:
+    """Precompute the neighbour lists of the most frequent words in
+    parallel processes and save them memory-mappable. Returns the path
+    of the manifest."""
+
+    vocab_size = len(wv.index_to_key)
+    count = min(neighbour_config["count"], vocab_size)
+    candidates = min(neighbour_config["candidates"] or vocab_size, vocab_size)
+    topn = min(neighbour_config["topn"], candidates - 1)
+    block_rows = neighbour_config["block-rows"]
+    manifest_path, ids_path, scores_path = neighbour_index_paths(model_name)
+
+    # Shared unit matrix, memory-mapped by every worker.
+    units_path = temp_dir.joinpath(f"{model_name}_units.npy")
+    write_unit_matrix(wv, units_path, block_rows)
+
+    # Output arrays, filled block by block as the results arrive.
+    ids = np.lib.format.open_memmap(ids_path, mode="w+", dtype=np.int32, shape=(count, topn))
+    scores = np.lib.format.open_memmap(
+        scores_path, mode="w+", dtype=np.float32, shape=(count, topn)
+    )
+    tasks = [
+        (start, min(start + block_rows, count), candidates, topn, neighbour_config["block-cols"])
+        for start in range(0, count, block_rows)
+    ]
+    with Pool(processes, initializer=_init_worker, initargs=(str(units_path),)) as pool:
+        for done, (start, block_ids, block_scores) in enumerate(
+            pool.imap_unordered(_block_neighbours_task, tasks), start=1
+        ):
+            ids[start : start + len(block_ids)] = block_ids
+            scores[start : start + len(block_ids)] = block_scores
+            if done % 10 == 0 or done == len(tasks):
+                logging.info("Neighbour index: %d/%d blocks done.", done, len(tasks))
+    ids.flush()
+    scores.flush()
+    del ids, scores
+    units_path.unlink()
+
+    # Manifest.
+    manifest = {
+        "count": count,
+        "topn": topn,
+        "candidates": candidates,
+        "fingerprint": keys_fingerprint(wv.index_to_key[:count]),
+    }
+    with open(manifest_path, mode="w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    logging.info("Neighbour index of %d words saved to %s", count, ids_path)
+    return manifest_path
+
+
+def _block_neighbours_task(task: tuple) -> tuple[int, np.ndarray, np.ndarray]:
+    """Unpack a task tuple for Pool.imap_unordered."""
+    return block_neighbours(*task)
+
+
+class NeighbourVectors:
+    """Query wrapper serving the neighbours of indexed words (and, if
+    index_analogies is set, approximate analogies) from the precomputed
+    index. Everything else is passed on to the wrapped KeyedVectors or
+    QuantizedVectors."""
+
+    def __init__(self, vectors, model_name: str, index_analogies: bool = False) -> None:
+        """Wrap word vectors, memory-map the neighbour index of the model.
+        An index built on a different vocabulary is ignored."""
+        self.vectors = vectors
+        self.index_analogies = index_analogies
+        self.count, self.topn = 0, 0
+        manifest_path, ids_path, scores_path = neighbour_index_paths(model_name)
+        if not isfile(manifest_path):
+            return
+        with open(manifest_path, mode="r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        keys = vectors.index_to_key[: manifest["count"]]
+        if len(keys) < manifest["count"] or keys_fingerprint(keys) != manifest["fingerprint"]:
+            logging.warning(
+                "Neighbour index of %s does not match the vocabulary, ignored.", model_name
+            )
+            return
+        self.ids = np.load(ids_path, mmap_mode="r")
+        self.scores = np.load(scores_path, mmap_mode="r")
+        self.count, self.topn = manifest["count"], manifest["topn"]
+        logging.info("Neighbour index loaded (%d words, top %d).", self.count, self.topn)
+
+    def __contains__(self, word: str) -> bool:
+        """Check if a word is in the vocabulary."""
+        return word in self.vectors
+
+    def __getattr__(self, name: str):
+        """Pass everything else on to the wrapped vectors."""
+        return getattr(self.vectors, name)
+
+    def _indexed(self, word) -> Optional[int]:
+        """Row of a word in the index, None if it has no neighbour list."""
+        if not isinstance(word, str):
+            return None
+        row = self.vectors.key_to_index.get(word)
+        return row if row is not None and row < self.count else None
+
+    def _neighbours(self, row: int, topn: int) -> Optional[list[tuple[str, float]]]:
+        """Stored neighbours of an index row (words missing from the
+        wrapped vocabulary, e.g. pruned by an export, are skipped). None
+        if fewer than topn are left."""
+        vocab = self.vectors.index_to_key
+        neighbours = [
+            (vocab[word_id], float(score))
+            for word_id, score in zip(self.ids[row], self.scores[row])
+            if word_id < len(vocab)
+        ]
+        return neighbours[:topn] if len(neighbours) >= topn else None
+
+    def _analogy(
+        self, positive: list[str], negative: list[str], topn: int
+    ) -> Optional[list[tuple[str, float]]]:
+        """Analogy answered from the neighbours of the input words: the
+        candidates (k per word) are ranked by the cosine with the mean
+        vector, as in most_similar. Approximate: answers outside every
+        neighbour list are not found. None if a word is not indexed or the
+        mean vector is zero (left to the wrapped vectors)."""
+        rows = [self._indexed(word) for word in positive + negative]
+        if not positive or None in rows:
+            return None
+        vocab = self.vectors.index_to_key
+        candidates = {
+            vocab[word_id] for row in rows for word_id in self.ids[row] if word_id < len(vocab)
+        } - set(positive + negative)
+        if len(candidates) < topn:
+            return None
+
+        # Mean of the unit vectors (negative words subtracted), normalized.
+        mean = np.sum([self.vectors.get_vector(word, norm=True) for word in positive], axis=0)
+        mean = mean - np.sum(
+            [self.vectors.get_vector(word, norm=True) for word in negative], axis=0
+        )
+        norm = np.linalg.norm(mean)
+        if not norm:
+            return None
+        mean /= norm
+        words = list(candidates)
+        scores = np.array([self.vectors.get_vector(word, norm=True) for word in words]) @ mean
+        best = np.argsort(-scores)[:topn]
+        return [(words[index], float(scores[index])) for index in best]
+
+    def most_similar(self, positive, negative=None, topn: int = 10) -> list[tuple[str, float]]:
+        """Words most similar to a word (or an analogy with positive and
+        negative words). Indexed words (and, if enabled, analogies of
+        indexed words) are served from the index, other queries fall back
+        to the wrapped vectors."""
+        positive_list = [positive] if isinstance(positive, (str, np.ndarray)) else list(positive)
+        negative_list = list(negative or [])
+        result = None
+        if topn <= self.topn:
+            if len(positive_list) == 1 and not negative_list:
+                row = self._indexed(positive_list[0])
+                result = self._neighbours(row, topn) if row is not None else None
+            elif self.index_analogies:
+                result = self._analogy(positive_list, negative_list, topn)
+                if result is not None:
+                    logging.info(
+                        "Analogy answered from the neighbour index (approximate, "
+                        "answers outside the neighbour lists of the words are missed)."
+                    )
+        if result is not None:
+            return result
+        return self.vectors.most_similar(positive=positive_list, negative=negative_list, topn=topn)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,336 @@
+"""
+
+oov.py
+
+Out-of-vocabulary fallback of the HunCor2Vec query layer. Inflected
+Hungarian word forms missing from the model are mapped to their lemma
+(with a memory-mapped form -> lemma index collected from "ana" corpora)
+or to a vector composed from character n-gram vectors.
+
+"""
+
+# Imports:
+import heapq
+import logging
+import mmap
+import os
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from os.path import isfile
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+from zlib import crc32
+import numpy as np
+from .path_constants import MODELS_DIR_PATH
+
+# n-gram table size: hash buckets per word used to build it, and the
+# smallest table (small vocabularies do not get the full bucket count).
+NGRAM_BUCKETS_PER_WORD = 2
+MIN_NGRAM_BUCKETS = 1024
+
+
+def lemma_index_paths(model_name: str) -> tuple[Path, Path]:
+    """Paths of the form -> lemma index of a model: sorted "form<TAB>lemma"
+    lines and the line offsets."""
+    return (
+        MODELS_DIR_PATH.joinpath(f"{model_name}_lemmas.txt"),
+        MODELS_DIR_PATH.joinpath(f"{model_name}_lemmas.npy"),
+    )
+
+
+def ngram_table_path(model_name: str) -> Path:
+    """Path of the character n-gram vector table of a model."""
+    return MODELS_DIR_PATH.joinpath(f"{model_name}_ngrams.npy")
+
+
+def char_ngrams(word: str, min_n: int, max_n: int) -> list[str]:
+    """Character n-grams of a word with boundary markers (fastText style)."""
+    marked = f"<{word}>"
+    return [
+        marked[i : i + n]
+        for n in range(min_n, max_n + 1)
+        for i in range(len(marked) - n + 1)
+    ]
+
+
+def ngram_buckets(word: str, oov_config: dict, buckets: int) -> list[int]:
+    """Hash bucket numbers of the character n-grams of a word in a table
+    of the given number of buckets."""
+    return [
+        crc32(ngram.encode("utf-8")) % buckets
+        for ngram in char_ngrams(word, oov_config["ngram-min"], oov_config["ngram-max"])
+    ]
+
+
+class LemmaCollector:
+    """Collects form -> lemma pairs while .tsv ("ana") corpus files are
+    converted, then writes them as a sorted, memory-mappable index. Pair
+    counts are kept in memory up to batch_pairs pairs, then written to
+    the spool directory as a sorted batch; the batches are merged when
+    the index is written."""
+
+    def __init__(self, batch_pairs: int, spool_dir: Path) -> None:
+        """Initialize object base attributes."""
+        self.batch_pairs = batch_pairs
+        self.spool_dir = Path(spool_dir)
+        # "form<TAB>lemma" -> count (a flat map, far smaller than nested dicts).
+        self.pairs: dict[str, int] = {}
+        self.batch_paths: list[Path] = []
+        # Set after the first full corpus pass, later passes add nothing new.
+        self.frozen = False
+
+    def has_pairs(self) -> bool:
+        """Check if any pairs were collected."""
+        return bool(self.pairs or self.batch_paths)
+
+    def add_pairs(self, forms: Iterable, lemmas: Iterable) -> None:
+        """Count form -> lemma pairs (lowercased, identical pairs skipped)."""
+        pairs = self.pairs
+        for form, lemma in zip(forms, lemmas):
+            if not isinstance(form, str) or not isinstance(lemma, str):
+                continue
+            form, lemma = form.lower(), lemma.lower()
+            if form == lemma or "\t" in form or "\n" in form:
+                continue
+            key = f"{form}\t{lemma}"
+            pairs[key] = pairs.get(key, 0) + 1
+        if len(pairs) >= self.batch_pairs:
+            self._write_batch()
+
+    def _write_batch(self) -> None:
+        """Write the pairs in memory to a sorted batch file and clear them."""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        batch_path = self.spool_dir.joinpath(f"lemma_pairs_{len(self.batch_paths)}.tsv")
+        with open(batch_path, mode="w", encoding="utf-8") as batch_file:
+            for key in sorted(self.pairs):
+                batch_file.write(f"{key}\t{self.pairs[key]}\n")
+        self.batch_paths.append(batch_path)
+        self.pairs = {}
+
+    def _merged_pairs(self) -> Iterator[tuple[str, str, int]]:
+        """All (form, lemma, count) pairs in form order: the sorted batches
+        and the pairs in memory, merged, counts of equal pairs summed."""
+
+        def read_batch(batch_path: Path) -> Iterator[tuple[str, int]]:
+            with open(batch_path, mode="r", encoding="utf-8") as batch_file:
+                for line in batch_file:
+                    key, count = line.rstrip("\n").rsplit("\t", 1)
+                    yield key, int(count)
+
+        runs = [read_batch(batch_path) for batch_path in self.batch_paths]
+        runs.append((key, self.pairs[key]) for key in sorted(self.pairs))
+        for key, group in groupby(heapq.merge(*runs), key=itemgetter(0)):
+            form, lemma = key.split("\t", 1)
+            yield form, lemma, sum(count for _, count in group)
+
+    def _lemmas(self) -> Iterator[tuple[str, str]]:
+        """The most frequent lemma of every form, in form order."""
+        for form, group in groupby(self._merged_pairs(), key=itemgetter(0)):
+            yield form, max(group, key=itemgetter(2))[1]
+
+    def write_index(self, model_name: str) -> None:
+        """Write the index, keeping the most frequent lemma of every form.
+        Entries of an existing index of the model are kept for forms not
+        seen in this run."""
+        text_path, offsets_path = lemma_index_paths(model_name)
+        old_index = (
+            LemmaIndex(model_name) if isfile(text_path) and isfile(offsets_path) else None
+        )
+
+        # Merge with the old index (sorted as well), new entries first.
+        # UTF-8 byte order equals code point order, so sorted lines stay
+        # searchable on the bytes.
+        streams = [((form, 0, lemma) for form, lemma in self._lemmas())]
+        if old_index:
+            streams.append((form, 1, lemma) for form, lemma in old_index.items())
+        partial_text_path = text_path.with_name(f"{text_path.name}.part")
+        offsets = array("Q", [0])
+        with open(partial_text_path, mode="wb") as index_file:
+            for form, group in groupby(heapq.merge(*streams), key=itemgetter(0)):
+                line = f"{form}\t{next(group)[2]}\n".encode("utf-8")
+                index_file.write(line)
+                offsets.append(offsets[-1] + len(line))
+        if old_index:
+            old_index.close()
+        os.replace(partial_text_path, text_path)
+        np.save(offsets_path, np.frombuffer(offsets, dtype=np.uint64))
+
+        for batch_path in self.batch_paths:
+            batch_path.unlink(missing_ok=True)
+        logging.info("Lemma index with %d forms saved to %s", len(offsets) - 1, text_path)
+
+
+class LemmaIndex:
+    """Read-only form -> lemma index. Lookups are binary searches over
+    the memory-mapped index file."""
+
+    def __init__(self, model_name: str) -> None:
+        """Memory-map the index and its line offsets."""
+        text_path, offsets_path = lemma_index_paths(model_name)
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        with open(text_path, mode="rb") as index_file:
+            self.data = (
+                mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(self.offsets) > 1
+                else b""
+            )
+
+    def _line(self, position: int) -> tuple[bytes, bytes]:
+        """Return the form and the lemma of a line."""
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        form, lemma = self.data[start : end - 1].split(b"\t", 1)
+        return form, lemma
+
+    def lookup(self, form: str) -> Optional[str]:
+        """Return the lemma of a word form, or None."""
+        key = form.lower().encode("utf-8")
+        low, high = 0, len(self.offsets) - 1
+        while low < high:
+            mid = (low + high) // 2
+            mid_form, lemma = self._line(mid)
+            if mid_form == key:
+                return lemma.decode("utf-8")
+            if mid_form < key:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def close(self) -> None:
+        """Release the memory-mapped files."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data, self.offsets = b"", np.zeros(1, dtype=np.uint64)
+
+    def items(self) -> Iterable[tuple[str, str]]:
+        """Iterate over all (form, lemma) pairs."""
+        for position in range(len(self.offsets) - 1):
+            form, lemma = self._line(position)
+            yield form.decode("utf-8"), lemma.decode("utf-8")
+
+
+def build_ngram_table(wv, model_name: str, oov_config: dict) -> None:
+    """Build and save the character n-gram vector table: every hash bucket
+    holds the mean unit vector of the frequent words containing its n-grams.
+    The table is scaled to the vocabulary, up to ngram-buckets buckets."""
+
+    dim = wv.vector_size
+    word_count = min(oov_config["ngram-vocab"], len(wv.index_to_key))
+    buckets = min(
+        oov_config["ngram-buckets"], max(MIN_NGRAM_BUCKETS, word_count * NGRAM_BUCKETS_PER_WORD)
+    )
+    sums = np.zeros((buckets, dim), dtype=np.float32)
+    counts = np.zeros(buckets, dtype=np.float32)
+
+    # Accumulate in blocks of words.
+    block_size = 10000
+    for start in range(0, word_count, block_size):
+        end = min(start + block_size, word_count)
+        units = np.array(wv.vectors[start:end], dtype=np.float32)
+        units /= np.maximum(np.linalg.norm(units, axis=1, keepdims=True), 1e-12)
+        rows, word_rows = [], []
+        for offset, word in enumerate(wv.index_to_key[start:end]):
+            word_buckets = ngram_buckets(word, oov_config, buckets)
+            rows.extend(word_buckets)
+            word_rows.extend([offset] * len(word_buckets))
+        np.add.at(sums, rows, units[word_rows])
+        np.add.at(counts, rows, 1)
+
+    # Means (empty buckets stay zero).
+    sums /= np.maximum(counts, 1)[:, None]
+    path = ngram_table_path(model_name)
+    np.save(path, sums)
+    logging.info("Character n-gram table (%d buckets) saved to %s", buckets, path)
+
+
+def build_oov_indexes(
+    wv, model_name: str, collector: Optional[LemmaCollector], oov_config: dict
+) -> None:
+    """Write the OOV fallback indexes of a freshly trained model."""
+    if collector and collector.has_pairs():
+        collector.write_index(model_name)
+    if oov_config["ngram-fallback"]:
+        build_ngram_table(wv, model_name, oov_config)
+
+
+class FallbackVectors:
+    """Query wrapper that answers out-of-vocabulary words through their
+    lemma or through composed character n-gram vectors. Works with both
+    gensim KeyedVectors and QuantizedVectors."""
+
+    def __init__(self, vectors, model_name: str, oov_config: dict) -> None:
+        """Wrap word vectors, load the fallback indexes of the model if present."""
+        self.vectors = vectors
+        self.oov_config = oov_config
+        text_path, offsets_path = lemma_index_paths(model_name)
+        self.lemma_index = (
+            LemmaIndex(model_name) if isfile(text_path) and isfile(offsets_path) else None
+        )
+        table_path = ngram_table_path(model_name)
+        self.ngram_table = np.load(table_path, mmap_mode="r") if isfile(table_path) else None
+
+    def resolve(self, word: str) -> str | np.ndarray:
+        """Return the word itself if known, else its lemma if known, else a
+        unit vector composed from n-gram vectors. Raises KeyError if none works."""
+        if word in self.vectors:
+            return word
+        if word.lower() in self.vectors:
+            return word.lower()
+
+        # Lemma fallback.
+        if self.lemma_index:
+            lemma = self.lemma_index.lookup(word)
+            if lemma and lemma in self.vectors:
+                logging.info("'%s' not in vocabulary, using lemma '%s'.", word, lemma)
+                return lemma
+
+        # Character n-gram fallback (the table size is its bucket count).
+        if self.ngram_table is not None:
+            word_buckets = ngram_buckets(word.lower(), self.oov_config, len(self.ngram_table))
+            composed = np.asarray(self.ngram_table[sorted(set(word_buckets))]).sum(axis=0)
+            norm = np.linalg.norm(composed)
+            if norm > 0:
+                logging.info("'%s' not in vocabulary, using character n-grams.", word)
+                return composed / norm
+
+        raise KeyError(f"Key '{word}' not present")
+
+    def unit_vector(self, word: str) -> np.ndarray:
+        """Unit vector of a (possibly out-of-vocabulary) word."""
+        resolved = self.resolve(word)
+        if isinstance(resolved, str):
+            return self.vectors.get_vector(resolved, norm=True)
+        return resolved
+
+    def similarity(self, word1: str, word2: str) -> float:
+        """Cosine similarity between two words."""
+        return float(np.dot(self.unit_vector(word1), self.unit_vector(word2)))
+
+    def most_similar(
+        self, positive: str | list[str], negative: Optional[list[str]] = None, topn: int = 10
+    ) -> list[tuple[str, float]]:
+        """Words most similar to a word, or to the mean of the positive and
+        the negated negative words (analogies)."""
+        if isinstance(positive, str):
+            positive = [positive]
+        return self.vectors.most_similar(
+            positive=[self.resolve(word) for word in positive],
+            negative=[self.resolve(word) for word in negative or []],
+            topn=topn,
+        )
+
+    def doesnt_match(self, words: list[str]) -> str:
+        """The word furthest away from the mean of all words."""
+        unit_vectors = np.array([self.unit_vector(word) for word in words])
+        mean = unit_vectors.mean(axis=0)
+        norm = np.linalg.norm(mean)
+        if not norm:
+            raise ValueError("Cannot compute similarity with a zero mean vector.")
+        mean /= norm
+        return words[int(np.argmin(unit_vectors @ mean))]
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
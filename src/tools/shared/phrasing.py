@@ -0,0 +1,128 @@
+"""
+
+phrasing.py
+
+Optional phrase (collocation) detection stage of the HunCor2Vec project.
+Learns bigram/trigram phrases over the corpus, freezes and saves them
+next to the model, and applies them to the tokenized sentences.
+
+"""
+
+# Imports:
+import logging
+from collections import deque
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+from os.path import basename
+from pathlib import Path
+from typing import Iterable, Iterator
+from gensim.models.phrases import FrozenPhrases, Phrases
+from gensim.test.utils import datapath
+from gensim.utils import prune_vocab
+from .path_constants import MODELS_DIR_PATH
+
+
+def phrases_paths(model_path: Path, layers: int) -> list[Path]:
+    """Return the file paths of the frozen phrase models belonging to
+    a Word2Vec model. Layer 1 detects bigrams, layer 2 trigrams, etc."""
+    return [
+        MODELS_DIR_PATH.joinpath(f"{Path(model_path).stem}_phrases_{layer + 2}gram.phr")
+        for layer in range(layers)
+    ]
+
+
+def get_phrasers(
+    corpus: Iterable[list[str]], model_path: Path, phrase_config: dict
+) -> list[FrozenPhrases]:
+    """Load the frozen phrase models of a Word2Vec model from models/.
+    If they do not exist yet, learn them over the corpus and save them,
+    so later runs and epochs reuse the same phrases."""
+
+    paths = phrases_paths(model_path, phrase_config["layers"])
+
+    # Cached phrase models found: load them.
+    if all(path.is_file() for path in paths):
+        logging.info("Loading phrase models of %s.", basename(model_path))
+        return [FrozenPhrases.load(datapath(path)) for path in paths]
+
+    # Learn phrase layers one after the other, each over the output of
+    # the previous layers.
+    phrasers: list[FrozenPhrases] = []
+    for layer, path in enumerate(paths):
+        logging.info("Learning phrase layer %d (%d-grams)...", layer + 1, layer + 2)
+        layer_corpus = (apply_phrasers(phrasers, sentence) for sentence in corpus)
+        phraser = learn_phrases(layer_corpus, phrase_config)
+        phraser.save(datapath(path))
+        logging.info("Phrase model saved to %s", path)
+        phrasers.append(phraser)
+    return phrasers
+
+
+def learn_phrases(sentences: Iterable[list[str]], phrase_config: dict) -> FrozenPhrases:
+    """Count unigrams and bigrams in parallel worker processes, merge the
+    partial counts and freeze the result into a compact FrozenPhrases model."""
+
+    # Phrase model settings.
+    phrase_settings = {
+        "min_count": phrase_config["min-count"],
+        "threshold": phrase_config["threshold"],
+        "max_vocab_size": phrase_config["max-vocab-size"],
+        "scoring": phrase_config["scoring"],
+        "connector_words": frozenset(phrase_config["connector-words"]),
+    }
+    workers = phrase_config["workers"] or cpu_count()
+
+    # Empty model, the merged counts are collected into it.
+    phrases = Phrases(**phrase_settings)
+
+    # Parallel counting. Only a limited number of chunks is kept in flight,
+    # so the corpus is never loaded into memory as a whole.
+    with Pool(workers) as pool:
+        pending: deque = deque()
+        for chunk in chunked(sentences, phrase_config["chunk-size"]):
+            pending.append(pool.apply_async(count_chunk, (chunk, phrase_settings)))
+            if len(pending) >= 2 * workers:
+                merge_counts(phrases, *pending.popleft().get())
+        while pending:
+            merge_counts(phrases, *pending.popleft().get())
+
+    logging.info("Phrase counting done: %s", phrases)
+    return phrases.freeze()
+
+
+def count_chunk(chunk: list[list[str]], phrase_settings: dict) -> tuple[dict, int, int]:
+    """Worker function: count the unigrams and bigrams of a chunk of sentences.
+    Returns the vocabulary, the number of words and the pruning threshold."""
+    partial = Phrases(chunk, **phrase_settings)
+    return partial.vocab, partial.corpus_word_count, partial.min_reduce
+
+
+def merge_counts(phrases: Phrases, vocab: dict, word_count: int, min_reduce: int) -> None:
+    """Merge partial counts into a Phrases model (same logic as
+    Phrases.add_vocab)."""
+    phrases.corpus_word_count += word_count
+    phrases.min_reduce = max(phrases.min_reduce, min_reduce)
+    for word, count in vocab.items():
+        phrases.vocab[word] = phrases.vocab.get(word, 0) + count
+    if len(phrases.vocab) > phrases.max_vocab_size:
+        prune_vocab(phrases.vocab, phrases.min_reduce)
+        phrases.min_reduce += 1
+
+
+def apply_phrasers(phrasers: list[FrozenPhrases], sentence: list[str]) -> list[str]:
+    """Apply frozen phrase layers to a tokenized sentence."""
+    for phraser in phrasers:
+        sentence = phraser[sentence]
+    return sentence
+
+
+def chunked(sentences: Iterable[list[str]], size: int) -> Iterator[list[list[str]]]:
+    """Split a sentence stream into lists of given size."""
+    iterator = iter(sentences)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
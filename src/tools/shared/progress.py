@@ -0,0 +1,209 @@
+"""
+
+progress.py
+
+Progress reporting of the HunCor2Vec project: throughput and ETA of
+download and training runs, logged periodically and written to a JSON
+status file in tmp/status/ that other processes can poll.
+
+"""
+
+# Imports:
+import json
+import logging
+import os
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import Event, Thread
+from time import monotonic
+from typing import Literal, Optional
+from .path_constants import STATUS_DIR_PATH
+
+# Throughput is measured over this many of the latest status updates.
+RATE_WINDOW = 12
+
+
+def status_path(task: str, name: str) -> Path:
+    """Path of the status file of a run (e.g. tmp/status/training_<model>.json)."""
+    return STATUS_DIR_PATH.joinpath(f"{task}_{name}.json")
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    """Remaining time as h:mm:ss, "?" if unknown."""
+    return "?" if seconds is None else str(timedelta(seconds=round(seconds)))
+
+
+class ProgressTracker:
+    """Counts the work done by a run (bytes, files, sentences, words) and
+    derives throughput and ETA from the known totals. The hot path only
+    adds to counters (from a single producer thread); a background thread
+    computes the rates, writes the status file and logs a progress line.
+    Does nothing unless enabled in the "Progress" section of the config
+    file."""
+
+    def __init__(self, task: str, name: str, progress_config: dict) -> None:
+        """Initialize object base attributes."""
+        self.enabled = progress_config["enabled"]
+        self.interval = progress_config["interval"]
+        self.log_interval = progress_config["log-interval"]
+        self.task = task
+        self.name = name
+        self.path = status_path(task, name)
+        self.started = datetime.now()
+
+        # Current stage: counters, totals and the counter the ETA is based on.
+        self.stage_name = ""
+        self.eta_key = ""
+        self.counts: dict[str, int] = {}
+        self.totals: dict[str, int] = {}
+
+        # Current items of nested units (e.g. epoch and shard): name,
+        # counter, counter value at the start and total.
+        self.items: dict[str, tuple[str, str, int, Optional[int]]] = {}
+
+        # (time, counters) samples of the rate window.
+        self.samples: deque[tuple[float, dict[str, int]]] = deque(maxlen=RATE_WINDOW)
+        self.last_log = monotonic()
+        self.stop_event = Event()
+        self.writer: Optional[Thread] = None
+
+    def stage(self, name: str, eta_key: str = "", **totals: int) -> None:
+        """Start a stage: counters restart from zero. The ETA is computed
+        for the eta_key counter against its total."""
+        if not self.enabled:
+            return
+        self.stage_name = name
+        self.eta_key = eta_key
+        self.counts = {}
+        self.totals = dict(totals)
+        self.items = {}
+        self.samples.clear()
+        if not self.writer:
+            self.writer = Thread(target=self._write_loop, name="progress-writer", daemon=True)
+            self.writer.start()
+
+    def set_total(self, key: str, total: int) -> None:
+        """Set (or correct the estimate of) the total of a counter."""
+        if self.enabled:
+            self.totals[key] = total
+
+    def add(self, **amounts: int) -> None:
+        """Add to counters. Called from the hot path, keep it cheap."""
+        if not self.enabled:
+            return
+        counts = self.counts
+        for key, amount in amounts.items():
+            counts[key] = counts.get(key, 0) + amount
+
+    def begin_item(self, unit: str, name: str, key: str, total: Optional[int] = None) -> None:
+        """Start the next item of a unit (e.g. the shard being read): its
+        progress is the growth of the key counter from now on."""
+        if self.enabled:
+            self.items[unit] = (name, key, self.counts.get(key, 0), total)
+
+    def _rates(self, now: float, counts: dict[str, int]) -> dict[str, float]:
+        """Per second growth of the counters over the rate window."""
+        self.samples.append((now, counts))
+        first_time, first_counts = self.samples[0]
+        elapsed = now - first_time
+        if elapsed <= 0:
+            return {}
+        return {key: (value - first_counts.get(key, 0)) / elapsed for key, value in counts.items()}
+
+    def snapshot(self) -> dict:
+        """Current status: counters, totals, rates and ETAs in seconds."""
+        now = monotonic()
+        counts = dict(self.counts)
+        rates = self._rates(now, counts)
+
+        def eta(key: str, remaining: Optional[int]) -> Optional[float]:
+            rate = rates.get(key)
+            if remaining is None or not rate:
+                return None
+            return max(remaining, 0) / rate
+
+        items = {}
+        for unit, (name, key, start, total) in dict(self.items).items():
+            done = counts.get(key, 0) - start
+            items[unit] = {
+                "name": name,
+                key: done,
+                "total": total,
+                "eta_seconds": eta(key, total - done if total else None),
+            }
+        total = self.totals.get(self.eta_key)
+        eta_seconds = eta(self.eta_key, total - counts.get(self.eta_key, 0) if total else None)
+        finishes_at = None
+        if eta_seconds is not None:
+            finishes_at = (datetime.now() + timedelta(seconds=eta_seconds)).isoformat(
+                timespec="seconds"
+            )
+        return {
+            "task": self.task,
+            "name": self.name,
+            "pid": os.getpid(),
+            "state": "running",
+            "started": self.started.isoformat(timespec="seconds"),
+            "updated": datetime.now().isoformat(timespec="seconds"),
+            "stage": self.stage_name,
+            "done": counts,
+            "total": dict(self.totals),
+            "per_second": {key: round(rate, 1) for key, rate in rates.items()},
+            "items": items,
+            "eta_seconds": eta_seconds,
+            "finishes_at": finishes_at,
+        }
+
+    def _write(self, status: dict) -> None:
+        """Replace the status file atomically (readers never see a partial file)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(partial_path, mode="w", encoding="utf-8") as status_file:
+            json.dump(status, status_file, indent=2)
+        os.replace(partial_path, self.path)
+
+    def _log(self, status: dict) -> None:
+        """Log a progress line of the status."""
+        rates = ", ".join(f"{rate:,.0f} {key}/s" for key, rate in status["per_second"].items())
+        items = "".join(
+            f" | {item['name']} ETA {format_eta(item['eta_seconds'])}"
+            for item in status["items"].values()
+            if item["total"]
+        )
+        logging.info(
+            "Progress (%s): %s%s | ETA %s",
+            status["stage"], rates or "starting", items, format_eta(status["eta_seconds"]),
+        )
+
+    def _write_loop(self) -> None:
+        """Background thread: write the status file every interval seconds
+        and log a progress line every log-interval seconds."""
+        while not self.stop_event.wait(self.interval):
+            status = self.snapshot()
+            try:
+                self._write(status)
+            except OSError as err_status:
+                logging.warning("Status file %s not written: %s", self.path, err_status)
+            if self.log_interval and monotonic() - self.last_log >= self.log_interval:
+                self.last_log = monotonic()
+                self._log(status)
+
+    def finish(self, state: Literal["finished", "stopped", "failed"] = "finished") -> None:
+        """Stop the writer thread and write the final state of the run:
+        finished, stopped before its end (e.g. by a disk budget) or failed."""
+        if not self.writer:
+            return
+        self.stop_event.set()
+        self.writer.join()
+        self.writer = None
+        status = self.snapshot()
+        status["state"] = state
+        status["eta_seconds"], status["finishes_at"] = 0 if state == "finished" else None, None
+        self._write(status)
+        self.stop_event.clear()
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
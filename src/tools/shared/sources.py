@@ -0,0 +1,435 @@
+"""
+
+sources.py
+
+Corpus source backends of the HunCor2Vec project. Every backend yields
+shards (named byte streams): files of a local directory, links of a
+list (streamed over HTTP or through the local shard cache), members of
+tar/zip archives, or the standard input. The format of a shard (gzip,
+bzip2 or xz compression; plain text or "ana" .tsv with a lemma column)
+is detected from its content and its text is streamed line by line,
+without temp-file staging.
+
+"""
+
+# Imports:
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import os
+import sys
+import tarfile
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import partial
+from os.path import basename
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator, Literal, Optional
+from shutil import copyfileobj
+from urllib.request import urlopen
+from .path_constants import SHARD_CACHE_DIR_PATH
+from .tempspace import PARTIAL_SUFFIX, PROTECTED_FILES, DiskBudget, mark_used
+
+# Source types accepted by open_source.
+SourceType = Literal["list", "dir", "archive", "stdin"]
+
+# Lemmas ending a sentence in .tsv ("ana") files.
+SENTENCE_END_LEMMAS = (".", ";", "?", "!")
+
+# Form/lemma pairs passed to the lemma collector at once.
+TSV_PAIR_BATCH = 10000
+
+# Bytes inspected for the format detection.
+SNIFF_BYTES = 4096
+
+# Corpus file names: text or .tsv files (optionally compressed) and
+# archives of those. Anything else in a directory or archive is skipped.
+TEXT_SUFFIXES = (".txt", ".tsv")
+COMPRESSION_SUFFIXES = (".gz", ".bz2", ".xz")
+ARCHIVE_SUFFIXES = (".tar", ".tgz", ".tar.gz", ".tar.bz2", ".tar.xz", ".zip")
+
+# Downloads of a cached shard before giving up (other runs may evict it
+# between its download and its opening).
+CACHE_OPEN_ATTEMPTS = 3
+
+# Starts of HTML documents (e.g. error pages saved instead of a shard).
+HTML_STARTS = (b"<!doctype html", b"<html")
+
+
+class Shard:
+    """A named unit of a corpus source, opened as a binary stream."""
+
+    def __init__(self, name: str, opener: Callable[[], BinaryIO]) -> None:
+        """Initialize object base attributes."""
+        self.name = name
+        self.opener = opener
+
+    def open(self) -> BinaryIO:
+        """Open the raw (possibly compressed) byte stream of the shard."""
+        return self.opener()
+
+
+def compression_suffix(name: str) -> Optional[str]:
+    """Compression suffix of a file name (.gz, .bz2, .xz), None if it has none."""
+    return next((suffix for suffix in COMPRESSION_SUFFIXES if name.lower().endswith(suffix)), None)
+
+
+def corpus_file_kind(name: str) -> Optional[Literal["text", "archive"]]:
+    """Kind of a corpus file judged by its name: "archive", "text" (text,
+    .tsv or compressed files, as the downloaded .gz shards) or None for
+    files that are not part of a corpus."""
+    lower_name = name.lower()
+    if lower_name.endswith(ARCHIVE_SUFFIXES):
+        return "archive"
+    if lower_name.endswith(TEXT_SUFFIXES) or compression_suffix(lower_name):
+        return "text"
+    return None
+
+
+def decompressed(stream: BinaryIO) -> BinaryIO:
+    """Wrap a stream in the decompressor its magic bytes call for
+    (gzip, bzip2, xz), or return it as is. The stream must support peek."""
+    magic = stream.peek(6)[:6]
+    if magic.startswith(b"\x1f\x8b"):
+        return io.BufferedReader(gzip.GzipFile(fileobj=stream))
+    if magic.startswith(b"BZh"):
+        return io.BufferedReader(bz2.BZ2File(stream))
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        return io.BufferedReader(lzma.LZMAFile(stream))
+    return stream
+
+
+def tsv_sentences(
+    lines: Iterator[str], header: list[str], lemma_collector=None
+) -> Iterator[str]:
+    """Continuous text from the lemma column of a .tsv ("ana") stream: one
+    sentence per line, lemmas shorter than 3 characters left out. Form/lemma
+    pairs are passed to the lemma collector, if given."""
+    lemma_column = header.index("lemma")
+    form_column = header.index("form") if lemma_collector and "form" in header else None
+    words: list[str] = []
+    forms: list[str] = []
+    lemmas: list[str] = []
+    for line in lines:
+        fields = line.rstrip("\r\n").split("\t")
+        if len(fields) <= lemma_column or not fields[lemma_column]:
+            continue
+        lemma = fields[lemma_column]
+        # Collect form -> lemma pairs for the query fallback.
+        if form_column is not None and len(fields) > form_column:
+            forms.append(fields[form_column])
+            lemmas.append(lemma)
+            if len(forms) >= TSV_PAIR_BATCH:
+                lemma_collector.add_pairs(forms, lemmas)
+                forms, lemmas = [], []
+        # Sentence text (min_length 3), split at sentence closing punctuation.
+        if len(lemma) > 2:
+            words.append(lemma)
+        elif lemma in SENTENCE_END_LEMMAS and words:
+            yield " ".join(words)
+            words = []
+    if words:
+        yield " ".join(words)
+    if forms:
+        lemma_collector.add_pairs(forms, lemmas)
+
+
+def shard_lines(shard: Shard, lemma_collector=None) -> Iterator[str]:
+    """Stream the text lines of a shard, whatever its compression and
+    format. Shards that are not text (binary data, HTML pages, files not
+    compressed as their name says) are skipped with a warning."""
+    with shard.open() as raw:
+        raw_stream = raw if hasattr(raw, "peek") else io.BufferedReader(raw)
+        stream = decompressed(raw_stream)
+        suffix = compression_suffix(shard.name)
+        if suffix and stream is raw_stream:
+            logging.warning("Skipping %s: not a %s file.", shard.name, suffix)
+            return
+        head = stream.peek(SNIFF_BYTES)[:SNIFF_BYTES]
+        if b"\x00" in head or head.lstrip()[:14].lower().startswith(HTML_STARTS):
+            logging.warning("Skipping %s: not a text file.", shard.name)
+            return
+        text = io.TextIOWrapper(stream, encoding="utf-8", errors="replace")
+        first_line = text.readline()
+        header = first_line.rstrip("\r\n").split("\t")
+        # "ana" .tsv: header row with a lemma column.
+        if len(header) > 1 and "lemma" in header:
+            yield from tsv_sentences(text, header, lemma_collector)
+        # Plain text.
+        else:
+            if first_line:
+                yield first_line
+            yield from text
+
+
+class SourceBackend(ABC):
+    """Base class of the corpus sources. Subclasses yield the shards of
+    the source in a stable order; every call starts a new pass."""
+
+    @abstractmethod
+    def shards(self) -> Iterator[Shard]:
+        """Yield the shards of the source."""
+
+
+class _StreamedMember(io.RawIOBase):
+    """Non-seekable view of a member of a streamed tar archive (the members
+    of "r|" archives fail on seekable, which text wrappers call)."""
+
+    def __init__(self, member_file: BinaryIO) -> None:
+        """Wrap the extracted member file."""
+        self.member_file = member_file
+
+    def readable(self) -> bool:
+        """Raw stream protocol."""
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Read the next bytes of the member."""
+        return self.member_file.readinto(buffer)
+
+
+def _open_member(archive: tarfile.TarFile, member: tarfile.TarInfo) -> BinaryIO:
+    """Open a member of a streamed tar archive."""
+    return io.BufferedReader(_StreamedMember(archive.extractfile(member)))
+
+
+def _is_corpus_member(name: str) -> bool:
+    """Check if an archive member is a text corpus file, log it if not."""
+    if corpus_file_kind(name) == "text":
+        return True
+    logging.info("Skipping %s: not a corpus file.", name)
+    return False
+
+
+class ArchiveSource(SourceBackend):
+    """Members of a tar (any compression) or zip archive, read sequentially."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialize object base attributes."""
+        self.path = Path(path)
+
+    def shards(self) -> Iterator[Shard]:
+        """Yield every file member of the archive. A member can only be read
+        until the next one is requested (tar archives are streamed)."""
+        mark_used(self.path)
+        if zipfile.is_zipfile(self.path):
+            with zipfile.ZipFile(self.path) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and _is_corpus_member(member.filename):
+                        yield Shard(
+                            f"{self.path.name}/{member.filename}", partial(archive.open, member)
+                        )
+        else:
+            with tarfile.open(self.path, mode="r|*") as archive:
+                for member in archive:
+                    if member.isfile() and _is_corpus_member(member.name):
+                        yield Shard(
+                            f"{self.path.name}/{member.name}",
+                            partial(_open_member, archive, member),
+                        )
+
+
+class DirectorySource(SourceBackend):
+    """Corpus files of a local directory in name order. Archives are
+    expanded, other files (notes, logs, unknown downloads) are skipped."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialize object base attributes."""
+        self.path = Path(path)
+
+    def shards(self) -> Iterator[Shard]:
+        """Yield every file (and every archive member) of the directory."""
+        for entry in sorted(os.scandir(self.path), key=lambda entry: entry.name):
+            if (
+                not entry.is_file()
+                or entry.name.startswith(".")
+                or entry.name.lower() in PROTECTED_FILES
+            ):
+                continue
+            kind = corpus_file_kind(entry.name)
+            if kind == "archive":
+                yield from ArchiveSource(Path(entry.path)).shards()
+            elif kind == "text":
+                mark_used(entry.path)
+                yield Shard(entry.name, partial(open, entry.path, "rb"))
+            else:
+                logging.info("Skipping %s: not a corpus file.", entry.name)
+
+
+class ShardCache:
+    """Local copies of downloaded shards in tmp/cache/, reused by later
+    epochs and runs. Evicted least recently used first by the tmp/ budget."""
+
+    def __init__(self, budget: DiskBudget) -> None:
+        """Initialize object base attributes."""
+        self.budget = budget
+
+    def open_shard(self, url: str) -> BinaryIO:
+        """Open the cached copy of a shard, downloading it first if needed.
+        The copy is opened under the budget lock, so no run evicts it in
+        between (an open file outlives its eviction on POSIX). If it is
+        evicted between its download and its opening, it is downloaded
+        again."""
+        cached = SHARD_CACHE_DIR_PATH.joinpath(basename(url))
+        downloaded = False
+        for _ in range(CACHE_OPEN_ATTEMPTS):
+            with self.budget.locked():
+                try:
+                    # Returned to the reader, which closes it.
+                    shard_file = open(cached, mode="rb")  # pylint: disable=consider-using-with
+                except FileNotFoundError:
+                    pass
+                else:
+                    if not downloaded:
+                        logging.info("Using cached %s", cached.name)
+                    mark_used(cached)
+                    return shard_file
+            if downloaded:
+                logging.info("%s was evicted by another run, downloading again.", cached.name)
+            self._download(url, cached)
+            downloaded = True
+        raise FileNotFoundError(f"{cached} is evicted before it could be read.")
+
+    def _download(self, url: str, cached: Path) -> None:
+        """Download a shard into the cache. The download is written under
+        a temporary name, so concurrent runs never read a partial file. Its
+        size (Content-Length) is reserved within the budget first: the
+        partial file is extended to full size right away, so the budget
+        of other runs counts it too."""
+        SHARD_CACHE_DIR_PATH.mkdir(parents=True, exist_ok=True)
+        partial_path = cached.with_name(f"{cached.name}.{os.getpid()}{PARTIAL_SUFFIX}")
+        logging.info("Downloading %s", cached.name)
+        try:
+            with urlopen(url) as response, open(partial_path, mode="wb") as partial_file:
+                size = int(response.headers.get("Content-Length") or 0)
+                with self.budget.locked():
+                    self.budget.make_room(size)
+                    partial_file.truncate(size)
+                copyfileobj(response, partial_file)
+                partial_file.truncate()
+        except Exception as err_download:
+            logging.exception("Error downloading %s: %s", url, err_download)
+            partial_path.unlink(missing_ok=True)
+            raise
+        os.replace(partial_path, cached)
+
+
+class LinkListSource(SourceBackend):
+    """Shards listed by URL in a link list file: streamed over HTTP, or
+    read from the shard cache if one is given."""
+
+    def __init__(self, path: Path, cache: Optional[ShardCache] = None) -> None:
+        """Initialize object base attributes."""
+        self.path = Path(path)
+        self.cache = cache
+
+    def _open_url(self, url: str) -> BinaryIO:
+        """Open a shard: from the cache, or as an HTTP stream."""
+        if self.cache:
+            return self.cache.open_shard(url)
+        logging.info("Streaming %s", basename(url))
+        return urlopen(url)
+
+    def shards(self) -> Iterator[Shard]:
+        """Yield a shard for every link of the list."""
+        with open(self.path, mode="r", encoding="utf-8") as link_list:
+            for link in link_list:
+                link = link.strip()
+                if link:
+                    yield Shard(basename(link), partial(self._open_url, link))
+
+
+class _StdinSpoolReader(io.RawIOBase):
+    """Replays the spooled part of the standard input, then continues
+    with the rest of it, appending that to the spool."""
+
+    def __init__(self, source: "StdinSource") -> None:
+        """Open the spool for replay."""
+        self.source = source
+        self.replay = None
+        if source.spool_path.is_file():
+            # Closed at its end or by close().
+            self.replay = open(source.spool_path, mode="rb")  # pylint: disable=consider-using-with
+
+    def readable(self) -> bool:
+        """Raw stream protocol."""
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Fill the buffer from the spool, then from stdin."""
+        if self.replay:
+            count = self.replay.readinto(buffer)
+            if count:
+                return count
+            self.replay.close()
+            self.replay = None
+        data = sys.stdin.buffer.read1(len(buffer))
+        if not data:
+            self.source.complete = True
+            return 0
+        buffer[: len(data)] = data
+        self.source.spool_file.write(data)
+        return len(data)
+
+    def close(self) -> None:
+        """Close the replay handle and flush the spool."""
+        if self.replay:
+            self.replay.close()
+        self.source.spool_file.flush()
+        super().close()
+
+
+class StdinSource(SourceBackend):
+    """The standard input as a single shard. Training reads the corpus
+    several times, so the input is spooled to the temp directory of the
+    run while it is read the first time."""
+
+    def __init__(self, spool_dir: Path) -> None:
+        """Initialize object base attributes. Piped input is new material
+        every run, its shard name (in the model ledger) is made unique."""
+        self.name = f"stdin_{datetime.now():%Y%m%d_%H%M%S}"
+        self.spool_path = Path(spool_dir).joinpath("stdin.spool")
+        self.spool_file: Optional[BinaryIO] = None
+        self.complete = False
+
+    def _open(self) -> BinaryIO:
+        """Open the input for a pass: the spool once stdin is exhausted."""
+        if self.complete:
+            return open(self.spool_path, mode="rb")
+        if self.spool_file is None:
+            # Kept open across passes until stdin is exhausted.
+            self.spool_file = open(self.spool_path, mode="ab")  # pylint: disable=consider-using-with
+        self.spool_file.flush()
+        return io.BufferedReader(_StdinSpoolReader(self))
+
+    def shards(self) -> Iterator[Shard]:
+        """Yield the single stdin shard."""
+        yield Shard(self.name, self._open)
+
+
+def open_source(
+    source_type: SourceType,
+    source_path: Optional[Path],
+    temp_dir: Path,
+    cache: Optional[ShardCache] = None,
+) -> SourceBackend:
+    """Create the backend of a source type."""
+    match source_type:
+        case "list":
+            return LinkListSource(source_path, cache)
+        case "dir":
+            return DirectorySource(source_path)
+        case "archive":
+            return ArchiveSource(source_path)
+        case "stdin":
+            return StdinSource(temp_dir)
+        case _:
+            raise ValueError(f"Unknown source type: {source_type}")
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -0,0 +1,209 @@
+"""
+
+tempspace.py
+
+Temporary disk space management of the HunCor2Vec project: isolated
+per-run temp directories and size budgets for tmp/ and downloads/ that
+evict the least recently used files first.
+
+"""
+
+# Imports:
+import logging
+import os
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from shutil import disk_usage
+from tempfile import mkdtemp
+from threading import RLock, Thread
+from time import time
+from typing import Iterable, Iterator, Optional
+from .misc import cleanup_in_background, remove_path
+from .path_constants import TEMP_DIR_PATH
+
+# File locks (POSIX only, elsewhere the budgets only lock within a process).
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
+
+# Prefix of the per-run temp directories in tmp/.
+RUN_DIR_PREFIX = "run_"
+
+# Files never evicted by a disk budget.
+PROTECTED_FILES = ("readme.nfo",)
+
+# Suffix of files still being written (e.g. shards downloaded into the cache).
+PARTIAL_SUFFIX = ".part"
+
+
+def mark_used(path: str | Path) -> None:
+    """Set the access time of a file to now (the LRU order of the disk
+    budgets), independently of the noatime/relatime mount options."""
+    try:
+        os.utime(path, (time(), os.stat(path).st_mtime))
+    except OSError:
+        pass
+
+
+def tree_size(path: Path) -> int:
+    """Summed size of the files under a directory in bytes."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:  # Removed in the meantime.
+                continue
+    return total
+
+
+class DiskBudget:
+    """Keeps a directory below a size limit (and the disk below its
+    capacity). Near the limit, files of the eviction directory are removed,
+    least recently used first. With a limit of 0 nothing is evicted, only
+    the free disk space is checked. Runs
+    sharing the directory serialize their evictions with a lock file in
+    tmp/."""
+
+    def __init__(
+        self, dir_path: Path, limit_mib: int, headroom: float, evict_dir: Optional[Path] = None
+    ) -> None:
+        """Initialize object base attributes."""
+        self.dir_path = dir_path
+        self.limit = limit_mib * 2**20
+        self.headroom = headroom
+        self.evict_dir = evict_dir or dir_path
+        self.lock = RLock()
+        self.lock_depth = 0
+        self.lock_path = TEMP_DIR_PATH.joinpath(f".{Path(dir_path).name}_budget.lock")
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the budget lock: a thread lock and an exclusive lock on
+        the lock file, shared by every process using the directory.
+        Reentrant within a thread."""
+        with self.lock:
+            self.lock_depth += 1
+            try:
+                if self.lock_depth > 1 or fcntl is None:
+                    yield
+                else:
+                    self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(self.lock_path, mode="a", encoding="utf-8") as lock_file:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released on close.
+                        yield
+            finally:
+                self.lock_depth -= 1
+
+    def _candidates(self, keep: set[Path]) -> list[tuple[float, int, Path]]:
+        """Evictable files as (last use, size, path), oldest first."""
+        candidates = []
+        if not self.evict_dir.is_dir():
+            return candidates
+        for entry in os.scandir(self.evict_dir):
+            path = Path(entry.path)
+            if (
+                not entry.is_file()
+                or entry.name.lower() in PROTECTED_FILES
+                or entry.name.endswith(PARTIAL_SUFFIX)
+                or path in keep
+            ):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            candidates.append((stat.st_atime, stat.st_size, path))
+        return sorted(candidates)
+
+    def make_room(self, needed: int = 0, keep: Iterable[Path] = ()) -> bool:
+        """Evict files until the directory has room for needed more bytes
+        within the budget. Returns False if that was not possible."""
+        if not self.limit:
+            return needed <= disk_usage(self.dir_path).free * self.headroom
+
+        with self.locked():
+            usage = tree_size(self.dir_path)
+            free = disk_usage(self.dir_path).free
+            excess = max(usage + needed - self.limit * self.headroom, needed - free * self.headroom)
+            if excess <= 0:
+                return True
+
+            for _, size, path in self._candidates({Path(path) for path in keep}):
+                if remove_path(path):
+                    logging.info(
+                        "Evicted %s (%.1f MiB) to stay within the disk budget.",
+                        path.name, size / 2**20,
+                    )
+                    excess -= size
+                if excess <= 0:
+                    return True
+
+        logging.warning(
+            "Disk budget of %s reached, nothing left to evict (%.1f MiB over).",
+            self.dir_path, excess / 2**20,
+        )
+        return False
+
+
+def _process_alive(pid: int) -> bool:
+    """Check if a process is running. Always True where it can not be
+    checked safely (signal 0 terminates the process on Windows)."""
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RunTempDir:
+    """Isolated temp directory of one run: tmp/run_<time>_<pid>_<random>/.
+    Runs on the same checkout no longer overwrite each other's files."""
+
+    def __init__(self, base_dir: Path = TEMP_DIR_PATH, cleanup_workers: int = 4) -> None:
+        """Create the run directory. Directories left behind by crashed
+        runs are removed in the background."""
+        self.cleanup_workers = cleanup_workers
+        self.path = Path(
+            mkdtemp(
+                prefix=f"{RUN_DIR_PREFIX}{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}_",
+                dir=base_dir,
+            )
+        )
+        logging.info("Temporary files of this run: %s", self.path)
+        stale = self.stale_runs(base_dir)
+        if stale:
+            logging.info("Removing %d temp directories of finished runs.", len(stale))
+            cleanup_in_background(stale, cleanup_workers)
+
+    def stale_runs(self, base_dir: Path) -> list[Path]:
+        """Run directories whose process is no longer running."""
+        stale = []
+        for entry in os.scandir(base_dir):
+            if (
+                not entry.is_dir()
+                or not entry.name.startswith(RUN_DIR_PREFIX)
+                or entry.path == str(self.path)
+            ):
+                continue
+            # run_<date>_<time>_<pid>_<random>
+            parts = entry.name.split("_")
+            if len(parts) > 3 and parts[3].isdigit() and not _process_alive(int(parts[3])):
+                stale.append(Path(entry.path))
+        return stale
+
+    def cleanup(self) -> Thread:
+        """Remove the run directory without blocking the caller."""
+        logging.info("Removing temporary files in the background.")
+        return cleanup_in_background([self.path], self.cleanup_workers)
+
+
+# Print on accidental run:
+if __name__ == "__main__":
+    print("Importable module. Not meant to be run!")
@@ -10,47 +10,79 @@ Part of the HunCor2Vec project.
 
 # Imports:
 import logging
-from multiprocessing import cpu_count
+from argparse import ArgumentParser, Namespace
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Iterable, Literal, Optional
 from gensim.test.utils import datapath
 from gensim.models import Word2Vec
+from gensim.utils import prune_vocab
 from pick import pick
 
 # Conditional imports (to be runnable as a stand-alone script):
 if __name__ == "__main__":
-    from shared.classes import MyCorpus, AutoSaver
+    from shared.autotune import MAX_BATCH_WORDS, available_cpus, calibrate
+    from shared.classes import MyCorpus, AutoSaver, memory_monitor
+    from shared.memory import current_rss
+    from shared.neighbours import remove_neighbour_index
+    from shared.oov import LemmaCollector, build_oov_indexes
+    from shared.phrasing import get_phrasers
+    from shared.progress import ProgressTracker
+    from shared.sources import SourceType
+    from shared.tempspace import RunTempDir
     from shared.misc import (
         default_logging,
         check_dirs,
         error_crash,
         file_select_menu,
+        get_training_source,
         load_config_file,
+        load_ledger,
+        update_ledger,
+        update_run_metrics,
     )
     from shared.path_constants import (
-        DOWNLOADS_DIR_PATH,
         LINKS_DIR_PATH,
         MODELS_DIR_PATH,
         TEMP_DIR_PATH,
         CONFIG_FILE_PATH,
     )
 else:
-    from tools.shared.classes import MyCorpus, AutoSaver
+    from tools.shared.autotune import MAX_BATCH_WORDS, available_cpus, calibrate
+    from tools.shared.classes import MyCorpus, AutoSaver, memory_monitor
+    from tools.shared.memory import current_rss
+    from tools.shared.neighbours import remove_neighbour_index
+    from tools.shared.oov import LemmaCollector, build_oov_indexes
+    from tools.shared.phrasing import get_phrasers
+    from tools.shared.progress import ProgressTracker
+    from tools.shared.sources import SourceType
+    from tools.shared.tempspace import RunTempDir
     from tools.shared.misc import (
         default_logging,
         check_dirs,
         error_crash,
         file_select_menu,
+        get_training_source,
         load_config_file,
+        load_ledger,
+        update_ledger,
+        update_run_metrics,
     )
     from tools.shared.path_constants import (
-        DOWNLOADS_DIR_PATH,
         LINKS_DIR_PATH,
         MODELS_DIR_PATH,
         TEMP_DIR_PATH,
         CONFIG_FILE_PATH,
     )
 
+# Approximate memory use of one word of a raw (counting) vocabulary. Gensim
+# estimates about 1 GB RAM per 10 million word types.
+RAW_VOCAB_ENTRY_BYTES = 100
+
+# Approximate memory use of one word of a queued training job (the word
+# string and its list slot), and the smallest batch the train budget sets.
+JOB_WORD_BYTES = 80
+MIN_BATCH_WORDS = 1000
+
 
 def new_or_load() -> tuple[Optional[Literal["new", "load"]], Optional[Path]]:
     """Ask user to train a completely new model file, or load an existing one
@@ -79,77 +111,228 @@ def new_or_load() -> tuple[Optional[Literal["new", "load"]], Optional[Path]]:
     return operation_type, model_path
 
 
-def get_training_source() -> tuple[Literal["list", "dir"], Optional[Path]]:
-    """Ask user for the type and location of the training sources. Returns the
-    type of the source (list of file urls or a directory of downloaded
-    files) and its path."""
-
-    # Menu variables.
-    title = "Select the type of training material: "
-    options = ["1. Link list file", "2. Downloaded packages"]
-    _, index = pick(options, title, indicator="=>", default_index=0)
-
-    # Menu switch.
-    match index:
-        case 0:  # Link list
-            source_type = "list"
-            source_path = file_select_menu("Select list file: ", LINKS_DIR_PATH, ".txt")
-        case 1:  # Downloaded files.
-            source_type = "dir"
-            source_path = DOWNLOADS_DIR_PATH
-        case _:  # Incorrect selection (should not happen).
-            error_crash("Selection error!")
-
-    return source_type, source_path
+def count_corpus(
+    corpus: Iterable[list[str]], max_vocab_size: Optional[int] = None
+) -> tuple[dict[str, int], int, int]:
+    """Single counting pass over a corpus. Returns the word frequencies,
+    the number of sentences and the number of words. Above max_vocab_size
+    the rarest words are pruned (the same way gensim's build_vocab does)."""
+    word_freq: dict[str, int] = {}
+    sentence_count, word_count, min_reduce = 0, 0, 1
+    for sentence in corpus:
+        sentence_count += 1
+        word_count += len(sentence)
+        for word in sentence:
+            word_freq[word] = word_freq.get(word, 0) + 1
+        if max_vocab_size and len(word_freq) > max_vocab_size:
+            prune_vocab(word_freq, min_reduce)
+            min_reduce += 1
+    return word_freq, sentence_count, word_count
+
+
+def vocab_size_limit() -> Optional[int]:
+    """Largest raw vocabulary that fits in the build_vocab memory budget
+    (on top of the memory already in use). None without a budget."""
+    budget = memory_monitor.budget("build_vocab")
+    if not budget:
+        return None
+    limit = max((budget - (current_rss() or 0)) // RAW_VOCAB_ENTRY_BYTES, 100000)
+    logging.info("Vocabulary counting limited to %d words by the memory budget.", limit)
+    return limit
+
+
+def fit_train_budget(resources: dict) -> dict:
+    """Shrink the job queue (queue_factor first, then batch_words) until the
+    queued jobs fit in the train memory budget on top of the memory already
+    in use (the model weights are allocated by then). Unchanged without a
+    budget."""
+    budget = memory_monitor.budget("train")
+    if not budget:
+        return resources
+    spare = budget - (current_rss() or 0)
+    fitted = dict(resources)
+
+    def queued_bytes() -> int:
+        # Gensim queues queue_factor jobs per worker, every worker holds one more.
+        jobs = (fitted["queue_factor"] + 1) * fitted["workers"]
+        return jobs * fitted["batch_words"] * JOB_WORD_BYTES
+
+    while queued_bytes() > spare and fitted["queue_factor"] > 1:
+        fitted["queue_factor"] -= 1
+    while queued_bytes() > spare and fitted["batch_words"] > MIN_BATCH_WORDS:
+        fitted["batch_words"] = max(fitted["batch_words"] // 2, MIN_BATCH_WORDS)
+    if fitted != resources:
+        logging.info(
+            "Training queue reduced by the memory budget: queue_factor=%d, batch_words=%d.",
+            fitted["queue_factor"], fitted["batch_words"],
+        )
+    return fitted
 
 
 def model_training(
     operation_type: Literal["new", "load"],
     model_path: Path,
-    source_type: Literal["list", "dir"],
+    source_type: SourceType,
     source_path: Path,
+    temp_dir: Optional[Path] = None,
+    progress: Optional[ProgressTracker] = None,
 ) -> Optional[Word2Vec]:
-    """Train model based on previous selections."""
+    """Train model based on previous selections. Temp files are written
+    to temp_dir (the temp directory of the run), throughput and ETA are
+    reported through progress, if given."""
 
     # Load settings from config.yml file
     config_file = load_config_file(CONFIG_FILE_PATH)
     word2vec_config = config_file["Word2Vec"]
-
-    # Get number of CPU cores to set number of workers.
-    cpu_core_num = cpu_count()
+    phrase_config = config_file["Phrases"]
+    autotune_config = config_file["Autotune"]
+    oov_config = config_file["OOV"]
+    incremental_config = config_file["Incremental"]
 
     # Initialize model autosave object.
-    auto_save = AutoSaver(model_path)
+    auto_save = AutoSaver(model_path, temp_dir)
+
+    # Set up the corpus (with phrase detection, if enabled). When continuing
+    # a model, the shards it was already trained on can be left out.
+    sentences = MyCorpus(source_type, source_path, temp_dir=temp_dir)
+    sentences.progress = progress
+    auto_save.progress = progress
+    if progress:
+        progress.stage("prepare")
+    if operation_type == "load" and incremental_config["new-shards-only"]:
+        sentences.skip_shards = set(load_ledger(model_path))
+    if phrase_config["enabled"]:
+        sentences.phrasers = get_phrasers(sentences, model_path, phrase_config)
+
+    # Resource settings: calibrated, or one worker per usable CPU core.
+    resources = {"workers": available_cpus(), "batch_words": MAX_BATCH_WORDS, "queue_factor": 2}
+    if autotune_config["enabled"]:
+        calibration = calibrate(sentences, word2vec_config, autotune_config)
+        update_run_metrics(model_path, "autotune", calibration)
+        resources = {key: calibration[key] for key in resources}
+
+    # Collect form -> lemma pairs of .tsv corpora for the query fallback
+    # (attached after the calibration, whose partial pass would count the
+    # pairs of the first shard twice).
+    if oov_config["lemma-index"]:
+        sentences.lemma_collector = LemmaCollector(
+            oov_config["batch-pairs"], Path(temp_dir or TEMP_DIR_PATH)
+        )
 
     # Initialize and train new model.
     if operation_type == "new":
-        sentences = MyCorpus(source_type, source_path)
-        new_model = Word2Vec(
-            sentences=sentences,
-            callbacks=[auto_save],
-            workers=cpu_core_num,
+        model = Word2Vec(
+            workers=resources["workers"],
+            batch_words=resources["batch_words"],
+            max_vocab_size=vocab_size_limit(),
             **word2vec_config,
         )
-        return new_model
-
-    # Load and continue training model.
-    if operation_type == "load":
-        more_sentences = MyCorpus(source_type, source_path)
-        loaded_model = Word2Vec.load(datapath(model_path))
-        loaded_model.build_vocab(more_sentences, update=True)
-        loaded_model.train(
-            more_sentences,
-            total_examples=loaded_model.corpus_count,
-            epochs=loaded_model.epochs,
+        if progress:
+            progress.stage("build_vocab")
+        with memory_monitor.stage("build_vocab"):
+            model.build_vocab(sentences)
+
+    # Load and continue training model. Only the new material is counted
+    # (once), its words are merged into the persisted vocabulary counts.
+    elif operation_type == "load":
+        model = Word2Vec.load(datapath(model_path))
+        model.workers = resources["workers"]
+        model.batch_words = resources["batch_words"]
+        if progress:
+            progress.stage("build_vocab")
+        with memory_monitor.stage("build_vocab"):
+            word_freq, sentence_count, word_count = count_corpus(sentences, vocab_size_limit())
+        if not sentence_count:
+            logging.info("No new training material for %s.", model_path.name)
+            return model
+        model.build_vocab_from_freq(word_freq, update=True, corpus_count=sentence_count)
+        model.corpus_total_words = word_count
+
+    # Incorrect argument passed (should not happen).
+    else:
+        error_crash("Invalid argument passed!")
+        return None
+
+    # Fit the job queue in the train memory budget.
+    resources = fit_train_budget(resources)
+    model.batch_words = resources["batch_words"]
+
+    # Progress of all epochs: every epoch reads the corpus totals once.
+    if progress:
+        progress.stage(
+            "train",
+            "words",
+            words=model.epochs * model.corpus_total_words,
+            sentences=model.epochs * model.corpus_count,
+        )
+
+    # Tokenization runs interleaved with training, it is measured here too.
+    with memory_monitor.stage("train"):
+        model.train(
+            sentences,
+            total_examples=model.corpus_count,
+            total_words=model.corpus_total_words,
+            epochs=model.epochs,
             callbacks=[auto_save],
-            # vector_size=word2vec_config["vector_size"],
-            # workers=cpu_core_num,
+            queue_factor=resources["queue_factor"],
         )
-        return loaded_model
 
-    # Incorrect argument passed (should not happen).
-    error_crash("Invalid argument passed!")
-    return None
+    # Record the trained shards in the model ledger.
+    update_ledger(model_path, sentences.shard_stats)
+
+    # Build the out-of-vocabulary fallback indexes of the query tool.
+    build_oov_indexes(model.wv, model_path.stem, sentences.lemma_collector, oov_config)
+
+    # The precomputed neighbour lists no longer match the vectors.
+    remove_neighbour_index(model_path.stem)
+
+    # Record the stage memory peaks with the run metrics.
+    if memory_monitor.enabled:
+        update_run_metrics(model_path, "memory_peak_mib", memory_monitor.report())
+        memory_monitor.stop()
+    return model
+
+
+def run_training(
+    operation_type: Literal["new", "load"],
+    model_path: Path,
+    source_type: SourceType,
+    source_path: Optional[Path],
+) -> None:
+    """Train in a temp directory of its own, removed in the background.
+    The progress of the run is written to tmp/status/training_<model>.json."""
+    config_file = load_config_file(CONFIG_FILE_PATH)
+    run_temp = RunTempDir(cleanup_workers=config_file["TempSpace"]["cleanup-workers"])
+    progress = ProgressTracker("training", model_path.stem, config_file["Progress"])
+    state = "failed"
+    try:
+        model = model_training(
+            operation_type, model_path, source_type, source_path, run_temp.path, progress
+        )
+        if model is not None:
+            state = "finished"
+    finally:
+        progress.finish(state)
+        run_temp.cleanup()
+
+
+def parse_arguments() -> Optional[Namespace]:
+    """Command line arguments of non-interactive runs (e.g. with the corpus
+    piped to the standard input). None if launched without arguments."""
+    parser = ArgumentParser(description="Train a word2vec model without the menus.")
+    model_group = parser.add_mutually_exclusive_group()
+    model_group.add_argument("--new", metavar="NAME", help="name of a new model")
+    model_group.add_argument("--load", metavar="NAME", help="name of a model to continue")
+    parser.add_argument(
+        "--source", choices=["list", "dir", "archive", "stdin"], help="type of the training source"
+    )
+    parser.add_argument("--path", type=Path, help="link list, directory or archive")
+    arguments = parser.parse_args()
+    if not (arguments.new or arguments.load):
+        return None
+    if not arguments.source or (arguments.source != "stdin" and not arguments.path):
+        parser.error("--source (and --path, except for stdin) is required.")
+    return arguments
 
 
 def main() -> None:
@@ -168,7 +351,7 @@ def main() -> None:
     # If legitimate values are returned from new_or_load and
     # get_training_source: call training function.
     if operation_type and model_path and source_type and source_path:
-        model_training(operation_type, model_path, source_type, source_path)
+        run_training(operation_type, model_path, source_type, source_path)
 
 
 # Run when launched as standalone script.
@@ -177,7 +360,16 @@ if __name__ == "__main__":
     default_logging()
     # Check if necessary dirs exist.
     check_dirs([LINKS_DIR_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH])
-    # Launch main function.
-    main()
+    # Train directly if launched with arguments, else launch main function.
+    args = parse_arguments()
+    if args:
+        run_training(
+            "new" if args.new else "load",
+            MODELS_DIR_PATH.joinpath(f"{args.new or args.load}.mdl"),
+            args.source,
+            args.path,
+        )
+    else:
+        main()
     # Ending message.
     logging.info("Exiting...")
@@ -0,0 +1,168 @@
+"""
+
+tuning.py
+
+Hyperparameter sweep script: trains several Word2Vec configurations
+in parallel on a deterministic sample of the corpus and ranks them
+with an evaluation set.
+
+Part of the HunCor2Vec project.
+
+"""
+
+# Imports:
+import logging
+from datetime import datetime
+from itertools import product
+from multiprocessing import Pool
+from pathlib import Path
+from gensim.models import Word2Vec
+from gensim.test.utils import datapath
+
+# Conditional imports (to be runnable as a stand-alone script):
+if __name__ == "__main__":
+    from shared.classes import MyCorpus
+    from shared.misc import (
+        check_dirs,
+        default_logging,
+        file_select_menu,
+        get_training_source,
+        load_config_file,
+    )
+    from shared.sources import SourceType
+    from shared.tempspace import RunTempDir
+    from shared.path_constants import (
+        CONFIG_FILE_PATH,
+        EVALUATION_DIR_PATH,
+        LINKS_DIR_PATH,
+        MODELS_DIR_PATH,
+        TEMP_DIR_PATH,
+    )
+else:
+    from tools.shared.classes import MyCorpus
+    from tools.shared.misc import (
+        check_dirs,
+        default_logging,
+        file_select_menu,
+        get_training_source,
+        load_config_file,
+    )
+    from tools.shared.sources import SourceType
+    from tools.shared.tempspace import RunTempDir
+    from tools.shared.path_constants import (
+        CONFIG_FILE_PATH,
+        EVALUATION_DIR_PATH,
+        LINKS_DIR_PATH,
+        MODELS_DIR_PATH,
+        TEMP_DIR_PATH,
+    )
+
+
+def sweep_configurations(word2vec_config: dict, grid: dict[str, list]) -> list[dict]:
+    """Create every combination of the grid values, each merged into the
+    base Word2Vec settings."""
+    keys = list(grid)
+    return [
+        {**word2vec_config, **dict(zip(keys, values))}
+        for values in product(*(grid[key] for key in keys))
+    ]
+
+
+def write_sample(
+    source_type: SourceType, source_path: Path, sample_config: dict, out_file: Path
+) -> int:
+    """Write the tokenized sample of the corpus to a plain text file
+    (one sentence per line), next to the temp files of the corpus.
+    Returns the number of sentences written."""
+    sample = MyCorpus(source_type, source_path, sample_config, temp_dir=out_file.parent)
+    sentence_count = 0
+    with open(out_file, mode="w", encoding="utf-8") as f:
+        for sentence in sample:
+            if sentence:
+                f.write(" ".join(sentence) + "\n")
+                sentence_count += 1
+    return sentence_count
+
+
+def train_and_evaluate(params: dict, corpus_file: str, eval_file: str, workers: int) -> float:
+    """Train one configuration on the sample file and return its
+    analogy accuracy on the evaluation set."""
+    model = Word2Vec(corpus_file=corpus_file, workers=workers, **params)
+    score, _ = model.wv.evaluate_word_analogies(eval_file)
+    logging.info("Configuration %s scored %.4f", params, score)
+    return score
+
+
+def run_sweep(source_type: SourceType, source_path: Path, eval_path: Path) -> None:
+    """Prepare the sample, train all grid configurations in parallel
+    processes, rank and save the results."""
+
+    # Load settings from config.yml file.
+    config_file = load_config_file(CONFIG_FILE_PATH)
+    sweep_config = config_file["Sweep"]
+    configurations = sweep_configurations(config_file["Word2Vec"], sweep_config["grid"])
+
+    # Materialize the sample once (in the temp directory of the sweep),
+    # all runs train on the same file.
+    run_temp = RunTempDir(cleanup_workers=config_file["TempSpace"]["cleanup-workers"])
+    sample_path = run_temp.path.joinpath("sweep_sample.txt")
+    try:
+        logging.info("Writing corpus sample...")
+        sentence_count = write_sample(
+            source_type, source_path, config_file["Sampling"], sample_path
+        )
+        logging.info("Sample ready: %d sentences.", sentence_count)
+
+        # Train configurations in parallel.
+        logging.info("Training %d configurations...", len(configurations))
+        tasks = [
+            (params, datapath(sample_path), datapath(eval_path), sweep_config["workers-per-run"])
+            for params in configurations
+        ]
+        with Pool(sweep_config["processes"]) as pool:
+            scores = pool.starmap(train_and_evaluate, tasks)
+    finally:
+        run_temp.cleanup()
+
+    # Rank by score, print and save results.
+    ranking = sorted(zip(scores, configurations), key=lambda result: result[0], reverse=True)
+    results_path = MODELS_DIR_PATH.joinpath(f"sweep_{datetime.now():%Y%m%d_%H%M%S}.tsv")
+    with open(results_path, mode="w", encoding="utf-8") as f:
+        f.write("rank\tscore\tconfiguration\n")
+        for rank, (score, params) in enumerate(ranking, start=1):
+            f.write(f"{rank}\t{score:.4f}\t{params}\n")
+            print(f"{rank}. {score:.4f} {params}")
+
+    # Operation end prompt.
+    logging.info("Sweep results saved to %s", results_path)
+    input("Press Enter to return...")
+
+
+def main() -> None:
+    """Main function."""
+
+    logging.info("Launching the Word2Vec hyperparameter sweep tool.")
+
+    # Set up training source.
+    source_type, source_path = get_training_source()
+
+    # Select the evaluation set (analogies in the questions-words format).
+    eval_path = file_select_menu(
+        "Hyperparameter Sweep\nSelect evaluation file: ", EVALUATION_DIR_PATH, ".txt"
+    )
+
+    # Only continue operations if legitimate values were selected.
+    if source_type and source_path and eval_path:
+        run_sweep(source_type, source_path, eval_path)
+
+
+# Run when launched as standalone script.
+if __name__ == "__main__":
+    # Set default logging settings.
+    default_logging()
+    # Check if necessary dirs exist.
+    check_dirs([EVALUATION_DIR_PATH, LINKS_DIR_PATH, MODELS_DIR_PATH, TEMP_DIR_PATH])
+    # Launch main function.
+    main()
+    # Ending message.
+    logging.info("Exiting...")
@@ -0,0 +1,48 @@
+"""
+
+conftest.py
+
+Shared pytest setup of the HunCor2Vec project: makes the tools package
+in src/ importable and provides the fixtures used by several test
+modules.
+
+"""
+
+# Imports:
+import sys
+from pathlib import Path
+from typing import Callable
+import numpy as np
+import pytest
+from gensim.models import KeyedVectors
+
+# The tools package lives in src/ (run as scripts from there otherwise).
+sys.path.insert(0, str(Path(__file__).parents[1].joinpath("src")))
+
+# pylint: disable=wrong-import-position
+from tools.shared import misc, neighbours, oov, phrasing
+
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch) -> Path:
+    """Temp directory used as models/ by the shared modules."""
+    models_path = tmp_path.joinpath("models")
+    models_path.mkdir()
+    for module in (misc, neighbours, oov, phrasing):
+        monkeypatch.setattr(module, "MODELS_DIR_PATH", models_path)
+    return models_path
+
+
+@pytest.fixture
+def random_vectors() -> Callable[..., KeyedVectors]:
+    """Factory of KeyedVectors of random words (word0, word1, ...)."""
+
+    def make(count: int, dim: int, seed: int = 0) -> KeyedVectors:
+        wv = KeyedVectors(dim)
+        wv.add_vectors(
+            [f"word{i}" for i in range(count)],
+            np.random.default_rng(seed).normal(size=(count, dim)),
+        )
+        return wv
+
+    return make
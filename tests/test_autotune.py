@@ -0,0 +1,90 @@
+"""Tests of the resource-aware autotuning."""
+
+# Imports:
+import os
+import random
+import time
+import pytest
+from tools.shared import autotune
+from tools.shared.autotune import available_cpus, calibrate, measure_producer, memory_limit
+
+
+@pytest.fixture(name="cgroup")
+def fixture_cgroup(tmp_path, monkeypatch):
+    """Point the cgroup limit files into a temp directory (all missing)."""
+    for name in (
+        "CGROUP_CPU_MAX",
+        "CGROUP_V1_CPU_QUOTA",
+        "CGROUP_V1_CPU_PERIOD",
+        "CGROUP_MEMORY_MAX",
+        "CGROUP_V1_MEMORY_LIMIT",
+    ):
+        monkeypatch.setattr(autotune, name, tmp_path.joinpath(name))
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    return tmp_path
+
+
+@pytest.mark.usefixtures("cgroup")
+def test_cpus_without_quota():
+    """Without a cgroup quota all CPUs of the affinity mask are available."""
+    assert available_cpus() == 8
+
+
+def test_cpus_limited_by_cgroup_v2_quota(cgroup):
+    """A cgroup v2 quota is rounded up to whole CPUs."""
+    cgroup.joinpath("CGROUP_CPU_MAX").write_text("250000 100000\n")
+    assert available_cpus() == 3
+
+
+def test_cpus_unlimited_cgroup_v2(cgroup):
+    """A cgroup v2 quota of max does not limit the CPUs."""
+    cgroup.joinpath("CGROUP_CPU_MAX").write_text("max 100000\n")
+    assert available_cpus() == 8
+
+
+def test_cpus_limited_by_cgroup_v1_quota(cgroup):
+    """The cgroup v1 quota and period limit the CPUs."""
+    cgroup.joinpath("CGROUP_V1_CPU_QUOTA").write_text("100000\n")
+    cgroup.joinpath("CGROUP_V1_CPU_PERIOD").write_text("100000\n")
+    assert available_cpus() == 1
+
+
+def test_memory_limit_from_cgroup(cgroup):
+    """The cgroup memory limit is used if set."""
+    cgroup.joinpath("CGROUP_MEMORY_MAX").write_text(f"{2**30}\n")
+    assert memory_limit() == 2**30
+
+
+def test_unlimited_cgroup_memory_falls_back_to_host(cgroup):
+    """An unlimited cgroup falls back to the host memory."""
+    cgroup.joinpath("CGROUP_MEMORY_MAX").write_text("max\n")
+    assert memory_limit() != 2**30
+
+
+def test_producer_rate_excludes_opening_the_first_shard():
+    """The rate is measured from the first sentence, not from the start."""
+    def corpus():
+        time.sleep(0.5)  # Download and format detection of the first shard.
+        for _ in range(1000):
+            yield ["alpha", "beta"]
+
+    sentences, rate = measure_producer(corpus(), 500)
+    assert len(sentences) == 500
+    assert rate > 2 * 499 / 0.5
+
+
+@pytest.mark.usefixtures("cgroup")
+def test_calibrate_chooses_within_limits():
+    """The calibrated settings stay within the CPU limit and the candidates."""
+    rng = random.Random(0)
+    words = [f"word{chr(97 + i % 26)}{i}" for i in range(300)]
+    corpus = [rng.choices(words, k=12) for _ in range(3000)]
+    autotune_config = {
+        "producer-cores": 1,
+        "sample-sentences": 2000,
+        "batch-candidates": [1000, 10000, 20000],
+    }
+    chosen = calibrate(corpus, {"vector_size": 20, "window": 3}, autotune_config)
+    assert 1 <= chosen["workers"] <= 7
+    assert chosen["batch_words"] in (1000, 10000)
+    assert chosen["queue_factor"] >= 1
@@ -0,0 +1,107 @@
+"""Tests of the checkpoint ordering and the model comparison metrics."""
+
+# Imports:
+import logging
+import random
+from pathlib import Path
+import numpy as np
+from gensim.models import Word2Vec
+from tools.comparing import (
+    model_order_key,
+    natural_key,
+    neighbour_ids,
+    neighbour_overlap,
+    stopped_improving,
+    vector_drift,
+)
+from tools.shared import classes
+from tools.shared.classes import AutoSaver
+
+COMPARE_CONFIG = {"stable-overlap": 0.95, "min-gain": 0.002}
+
+
+def random_units(count: int = 200, dim: int = 16, seed: int = 5) -> np.ndarray:
+    """Random unit vectors."""
+    units = np.random.default_rng(seed).normal(size=(count, dim))
+    return units / np.linalg.norm(units, axis=1, keepdims=True)
+
+
+def test_natural_key_orders_numbers_numerically():
+    """Numbers in names are compared as numbers."""
+    names = ["model10", "model2", "model1"]
+    assert sorted(names, key=natural_key) == ["model1", "model2", "model10"]
+
+
+def test_checkpoints_precede_their_final_model():
+    """Checkpoints come in epoch order before the final model of a run."""
+    expected = [
+        "model2_checkpoints/AUTOSAVE_epoch0_model2.mdl",
+        "model2_checkpoints/AUTOSAVE_epoch2_model2.mdl",
+        "model2_checkpoints/AUTOSAVE_epoch10_model2.mdl",
+        "model2.mdl",
+        "model10_checkpoints/AUTOSAVE_epoch1_model10.mdl",
+        "model10.mdl",
+    ]
+    shuffled = expected[:]
+    random.Random(0).shuffle(shuffled)
+    assert [str(path) for path in sorted(map(Path, shuffled), key=model_order_key)] == expected
+
+
+def test_autosaver_continues_checkpoint_numbering(models_dir, monkeypatch, caplog):
+    """Autosaves are numbered on from the kept checkpoints, in the file name and the log."""
+    monkeypatch.setitem(classes.config_file["Comparison"], "keep-checkpoints", True)
+    model_path = models_dir.joinpath("model.mdl")
+    assert AutoSaver(model_path).epoch_offset == 0
+
+    checkpoints = models_dir.joinpath("model_checkpoints")
+    for epoch in (0, 1, 4):
+        checkpoints.joinpath(f"AUTOSAVE_epoch{epoch}_model.mdl").touch()
+    checkpoints.joinpath("notes.mdl").touch()
+    auto_save = AutoSaver(model_path)
+    assert auto_save.temp_dir == checkpoints
+    assert auto_save.epoch_offset == 5
+
+    # The file and the log line carry the same epoch number.
+    caplog.set_level(logging.INFO)
+    Word2Vec([["alpha", "beta"]] * 20, min_count=1, workers=1, epochs=1, callbacks=[auto_save])
+    assert checkpoints.joinpath("AUTOSAVE_epoch5_model.mdl").is_file()
+    assert "Autosaved model at end of epoch 5." in caplog.text
+
+
+def test_drift_ignores_rotation():
+    """A rotated copy has no drift, changed rows drift."""
+    units = random_units()
+    rotation, _ = np.linalg.qr(np.random.default_rng(6).normal(size=(16, 16)))
+    drift = vector_drift(units, units @ rotation)
+    np.testing.assert_allclose(drift, 0, atol=1e-6)
+
+    changed = units.copy()
+    changed[:20] = random_units(20, seed=7)
+    drift = vector_drift(units, changed)
+    assert drift[:20].mean() > 10 * drift[20:].mean()
+
+
+def test_neighbour_overlap():
+    """The overlap is the shared fraction of the neighbour lists."""
+    units = random_units()
+    ids = neighbour_ids(units, 5, 64)
+    assert ids.shape == (200, 5)
+    np.testing.assert_array_equal(neighbour_overlap(ids, ids), 1)
+    shifted = np.array([[1, 2, 3, 4, 5]]), np.array([[3, 4, 5, 6, 7]])
+    np.testing.assert_allclose(neighbour_overlap(*shifted), [0.6])
+
+
+def test_stopped_improving_by_accuracy():
+    """Training stopped improving at the last accuracy gain of at least min-gain."""
+    rows = [{"accuracy": value} for value in (0.30, 0.40, 0.45, 0.451, 0.4505)]
+    assert stopped_improving(rows, COMPARE_CONFIG) == 2
+    rows.append({"accuracy": 0.47})
+    assert stopped_improving(rows, COMPARE_CONFIG) is None
+
+
+def test_stopped_improving_by_overlap():
+    """Training stopped improving before the first model with a stable neighbourhood."""
+    rows = [{}] + [{"overlap@10": value} for value in (0.5, 0.8, 0.96, 0.97)]
+    assert stopped_improving(rows, COMPARE_CONFIG) == 2
+    rows = [{}] + [{"overlap@10": value} for value in (0.5, 0.8, 0.9)]
+    assert stopped_improving(rows, COMPARE_CONFIG) is None
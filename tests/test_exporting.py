@@ -0,0 +1,60 @@
+"""Tests of the quantized vector export and the QuantizedVectors loader."""
+
+# Imports:
+import numpy as np
+import pytest
+from tools.exporting import export_vectors, quality_report, quantize_rows
+from tools.shared.classes import QuantizedVectors
+
+
+@pytest.mark.parametrize("export_format, tolerance", [("float16", 1e-3), ("int8", 2e-2)])
+def test_quantize_dequantize_round_trip(export_format, tolerance):
+    """Dequantized rows are unit length and close to the normalized input."""
+    rows = np.random.default_rng(2).normal(size=(100, 64)).astype(np.float32) * 5
+    quantized, scales = quantize_rows(rows, export_format)
+    assert quantized.dtype == np.dtype(export_format)
+    restored = scales[:, None] * quantized.astype(np.float32)
+    units = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    np.testing.assert_allclose(np.linalg.norm(restored, axis=1), 1, atol=1e-5)
+    assert np.abs(restored - units).max() < tolerance
+
+
+def test_zero_rows_stay_zero():
+    """Zero rows are quantized to zero with finite scales."""
+    rows = np.zeros((2, 8), dtype=np.float32)
+    for export_format in ("float16", "int8"):
+        quantized, scales = quantize_rows(rows, export_format)
+        assert not quantized.any()
+        assert np.isfinite(scales).all()
+
+
+@pytest.mark.parametrize("export_format", ["float16", "int8"])
+def test_exported_vectors_answer_like_the_model(tmp_path, random_vectors, export_format):
+    """The exported vectors give about the similarities and neighbours of the model."""
+    wv = random_vectors(500, 32, seed=1)
+    manifest_path = export_vectors(wv, "source", tmp_path.joinpath("model"), export_format, 400)
+    quantized = QuantizedVectors(manifest_path)
+    assert quantized.manifest["source"] == "source"
+    assert len(quantized.index_to_key) == 400
+    assert "word399" in quantized and "word400" not in quantized
+    assert quantized.similarity("word1", "word2") == pytest.approx(
+        wv.similarity("word1", "word2"), abs=0.02
+    )
+    report = quality_report(wv, quantized, sample_size=50)
+    assert report["mean_cosine_error"] < 0.02
+    assert report["neighbour_overlap@10"] > 0.8
+
+
+def test_zero_mean_query_raises(tmp_path, random_vectors):
+    """Queries without a direction raise ValueError."""
+    wv = random_vectors(500, 32, seed=1)
+    quantized = QuantizedVectors(
+        export_vectors(wv, "source", tmp_path.joinpath("model"), "float16", 100)
+    )
+    with pytest.raises(ValueError):
+        quantized.most_similar(["word1"], negative=["word1"])
+    with pytest.raises(ValueError):
+        quantized.most_similar([])
+    vector = quantized.get_vector("word1")
+    with pytest.raises(ValueError):
+        quantized.most_similar([vector, -vector])
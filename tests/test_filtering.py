@@ -0,0 +1,114 @@
+"""Tests of the deduplication and line filtering stage."""
+
+# Imports:
+import copy
+import numpy as np
+import pytest
+from tools.shared.filtering import BloomFilter, LineFilter, MinHashDeduplicator
+
+
+def random_lines(count: int, seed: int = 0) -> list[str]:
+    """Unrelated random lines of eight six-letter words."""
+    rng = np.random.default_rng(seed)
+    letters = list("abcdefghijklmnopqrstuvwxyz")
+    return [
+        " ".join("".join(rng.choice(letters, size=6)) for _ in range(8)) for _ in range(count)
+    ]
+
+
+def probe(bloom: BloomFilter, key: bytes) -> bool:
+    """Look up a key with add() on a copy, leaving the filter unchanged."""
+    probe_filter = copy.copy(bloom)
+    probe_filter.bits = bytearray(bloom.bits)
+    return probe_filter.add(key)
+
+
+def filter_config(**overrides) -> dict:
+    """Filtering section of the config file with test defaults."""
+    config = {
+        "min-chars": 20,
+        "max-chars": 5000,
+        "min-alpha-ratio": 0.6,
+        "dedup-exact": True,
+        "dedup-near": False,
+        "expected-lines": 10000,
+        "error-rate": 0.01,
+        "max-filter-mib": 64,
+        "minhash-permutations": 64,
+        "minhash-bands": 16,
+        "shingle-size": 5,
+    }
+    config.update(overrides)
+    return config
+
+
+def test_bloom_filter_finds_added_keys():
+    """Every added key is reported as present."""
+    bloom = BloomFilter(1000, 0.01)
+    keys = [f"key {i}".encode() for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(bloom.add(key) for key in keys)
+
+
+def test_bloom_filter_false_positive_rate():
+    """Unseen keys are reported present at about the configured rate."""
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add(f"seen {i}".encode())
+    false_positives = sum(probe(bloom, f"new {i}".encode()) for i in range(10000))
+    assert false_positives / 10000 < 0.02
+
+
+def test_minhash_detects_near_duplicates():
+    """Lines differing in a word are near-duplicates, unrelated lines are not."""
+    dedup = MinHashDeduplicator(64, 16, 5, 1000, 0.01)
+    line = "the quick brown fox jumps over the lazy dog near the river bank today"
+    assert not dedup.is_duplicate(line)
+    assert dedup.is_duplicate(line.replace("today", "tonight"))
+    assert not dedup.is_duplicate("a completely different sentence about something else")
+
+
+def test_minhash_false_positive_rate_per_line():
+    """Unrelated lines are dropped at about the configured rate, not bands times it."""
+    # Unrelated lines are dropped at about the configured error rate,
+    # not bands times the error rate.
+    lines = random_lines(20000)
+    dedup = MinHashDeduplicator(64, 16, 5, len(lines), 0.01)
+    dropped = sum(dedup.is_duplicate(line) for line in lines)
+    assert dropped / len(lines) < 0.015
+
+
+def test_minhash_rejects_uneven_bands():
+    """Permutations must split evenly into bands."""
+    with pytest.raises(ValueError):
+        MinHashDeduplicator(64, 10, 5, 1000, 0.01)
+
+
+def test_line_filter_statistics():
+    """Removed lines are counted by reason."""
+    line_filter = LineFilter(filter_config())
+    lines = [
+        "short",
+        "1234567890 1234567890 1234567890",
+        "a perfectly normal sentence of text",
+        "a perfectly normal sentence of text",
+    ]
+    kept = [line for line in lines if line_filter.keep(line)]
+    assert kept == ["a perfectly normal sentence of text"]
+    assert line_filter.stats == {"total": 4, "length": 1, "charset": 1, "exact": 1, "near": 0}
+
+
+def test_line_filter_reset_forgets_lines():
+    """A new pass starts with empty duplicate filters."""
+    line_filter = LineFilter(filter_config())
+    line = "a perfectly normal sentence of text"
+    assert line_filter.keep(line)
+    line_filter.reset()
+    assert line_filter.keep(line)
+
+
+def test_line_filter_checks_filter_memory():
+    """Filters larger than max-filter-mib are refused."""
+    with pytest.raises(ValueError):
+        LineFilter(filter_config(**{"dedup-near": True, "max-filter-mib": 0}))
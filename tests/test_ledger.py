@@ -0,0 +1,63 @@
+"""Tests of the shard ledger of incremental training."""
+
+# Imports:
+import gzip
+from tools.shared.classes import MyCorpus
+from tools.shared.misc import load_ledger, update_ledger
+
+
+def write_shard(path, name: str, lines: int) -> None:
+    """Gzipped text shard whose sentences start with the shard name."""
+    text = "".join(f"{name} alpha beta gamma\n" for _ in range(lines))
+    path.joinpath(f"{name}.txt.gz").write_bytes(gzip.compress(text.encode()))
+
+
+def test_ledger_round_trip(tmp_path):
+    """Ledger updates are merged into the file next to the model."""
+    model_path = tmp_path.joinpath("model.mdl")
+    assert load_ledger(model_path) == {}
+    update_ledger(model_path, {"first.txt.gz": {"sentences": 2, "words": 8}})
+    update_ledger(model_path, {"second.txt.gz": {"sentences": 1, "words": 4}})
+    assert tmp_path.joinpath("model_ledger.json").is_file()
+    assert load_ledger(model_path) == {
+        "first.txt.gz": {"sentences": 2, "words": 8},
+        "second.txt.gz": {"sentences": 1, "words": 4},
+    }
+
+
+def test_corpus_counts_shards(tmp_path):
+    """The corpus counts the sentences and words of every shard."""
+    corpus_dir = tmp_path.joinpath("corpus")
+    corpus_dir.mkdir()
+    write_shard(corpus_dir, "first", 3)
+    write_shard(corpus_dir, "second", 5)
+    corpus = MyCorpus("dir", corpus_dir, temp_dir=tmp_path)
+    assert len(list(corpus)) == 8
+    assert corpus.shard_stats == {
+        "first.txt.gz": {"sentences": 3, "words": 12},
+        "second.txt.gz": {"sentences": 5, "words": 20},
+    }
+
+
+def test_ledger_shards_are_skipped(tmp_path):
+    """A continued run reads only the shards missing from the ledger."""
+    model_path = tmp_path.joinpath("model.mdl")
+    corpus_dir = tmp_path.joinpath("corpus")
+    corpus_dir.mkdir()
+    write_shard(corpus_dir, "first", 3)
+    write_shard(corpus_dir, "second", 5)
+
+    # First run: all shards are read and recorded.
+    corpus = MyCorpus("dir", corpus_dir, temp_dir=tmp_path)
+    list(corpus)
+    update_ledger(model_path, corpus.shard_stats)
+
+    # Continued run: only the new shard is read.
+    write_shard(corpus_dir, "third", 2)
+    corpus = MyCorpus("dir", corpus_dir, temp_dir=tmp_path)
+    corpus.skip_shards = set(load_ledger(model_path))
+    sentences = list(corpus)
+    assert {sentence[0] for sentence in sentences} == {"third"}
+    assert list(corpus.shard_stats) == ["third.txt.gz"]
+    update_ledger(model_path, corpus.shard_stats)
+    assert set(load_ledger(model_path)) == {"first.txt.gz", "second.txt.gz", "third.txt.gz"}
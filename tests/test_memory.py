@@ -0,0 +1,124 @@
+"""Tests of the memory instrumentation and the memory budgets."""
+
+# Imports:
+import logging
+import re
+import tracemalloc
+import pytest
+from gensim.models import Word2Vec
+from tools import training
+from tools.shared import classes
+from tools.shared.classes import AutoSaver
+from tools.shared.memory import MIB, MemoryMonitor
+from tools.training import JOB_WORD_BYTES, MIN_BATCH_WORDS, fit_train_budget, vocab_size_limit
+
+
+def memory_config(**budgets: int) -> dict:
+    """Enabled memory config with tracemalloc and the given budgets (MiB)."""
+    return {"enabled": True, "tracemalloc": True, "sample-interval": 60, "budgets": budgets}
+
+
+def logged_peaks(caplog) -> dict[str, float]:
+    """Python allocation peaks (MiB) of the stages logged."""
+    peaks = {}
+    for record in caplog.records:
+        match = re.match(r"Stage '(\w+)' .* Python allocations: (\d+) MiB", record.getMessage())
+        if match:
+            peaks[match[1]] = float(match[2])
+    return peaks
+
+
+@pytest.fixture(name="monitor")
+def fixture_monitor():
+    """Memory monitor with tracemalloc, stopped after the test."""
+    was_tracing = tracemalloc.is_tracing()
+    memory_monitor = MemoryMonitor(memory_config())
+    yield memory_monitor
+    memory_monitor.stop()
+    if was_tracing:
+        tracemalloc.start()
+
+
+def test_nested_stages_keep_their_own_peaks(monitor, caplog):
+    """An inner stage reports its own peak, the outer one the larger peak."""
+    caplog.set_level(logging.INFO)
+    monitor.begin("train")
+    block = bytearray(50 * MIB)
+    del block
+    with monitor.stage("epoch"):
+        block = bytearray(10 * MIB)
+        del block
+    monitor.end("train")
+    peaks = logged_peaks(caplog)
+    assert 9 <= peaks["epoch"] < 20
+    assert peaks["train"] >= 49
+    assert set(monitor.peaks) == {"train", "epoch"}
+
+
+def test_later_stage_does_not_inherit_earlier_peak(monitor, caplog):
+    """The peak is reset between stages."""
+    caplog.set_level(logging.INFO)
+    with monitor.stage("build_vocab"):
+        block = bytearray(40 * MIB)
+        del block
+    with monitor.stage("checkpoint"):
+        pass
+    peaks = logged_peaks(caplog)
+    assert peaks["build_vocab"] >= 39
+    assert peaks["checkpoint"] < 10
+
+
+def test_disabled_monitor_does_nothing():
+    """A disabled monitor records nothing and has no budgets."""
+    disabled = MemoryMonitor(dict(memory_config(train=1), enabled=False))
+    with disabled.stage("train"):
+        pass
+    assert disabled.peaks == {} and disabled.budget("train") is None
+    assert not disabled.over_budget("train")
+
+
+def test_train_budget_shrinks_the_job_queue(monkeypatch):
+    """Over the training budget the queue, then the batch size shrinks."""
+    monkeypatch.setattr(training, "memory_monitor", MemoryMonitor(memory_config(train=100)))
+    monkeypatch.setattr(training, "current_rss", lambda: 92 * MIB)
+    resources = {"workers": 4, "batch_words": 10000, "queue_factor": 2}
+
+    # 8 MiB spare: (1 + 1) * 4 jobs of 10000 words fit, (2 + 1) * 4 do not.
+    assert 12 * 10000 * JOB_WORD_BYTES > 8 * MIB >= 8 * 10000 * JOB_WORD_BYTES
+    fitted = fit_train_budget(resources)
+    assert fitted == {"workers": 4, "batch_words": 10000, "queue_factor": 1}
+    assert resources["queue_factor"] == 2
+
+    # 1 MiB spare: the batch size is halved down to the minimum.
+    monkeypatch.setattr(training, "current_rss", lambda: 99 * MIB)
+    fitted = fit_train_budget(resources)
+    assert fitted["queue_factor"] == 1
+    assert fitted["batch_words"] == 1250
+    assert 8 * fitted["batch_words"] * JOB_WORD_BYTES <= MIB
+
+    # No room at all: stops at the minimum batch size.
+    monkeypatch.setattr(training, "current_rss", lambda: 100 * MIB)
+    assert fit_train_budget(resources)["batch_words"] == MIN_BATCH_WORDS
+
+
+def test_no_budget_keeps_resources(monkeypatch):
+    """Without budgets the resources and the vocabulary are not limited."""
+    monkeypatch.setattr(training, "memory_monitor", MemoryMonitor(memory_config()))
+    resources = {"workers": 4, "batch_words": 10000, "queue_factor": 2}
+    assert fit_train_budget(resources) == resources
+    assert vocab_size_limit() is None
+
+
+def test_checkpoint_over_budget_saves_arrays_separately(tmp_path, monkeypatch):
+    """Over the checkpoint budget the arrays are saved to separate files."""
+    sentences = [["alpha", "beta", "gamma", "delta"]] * 50
+    model = Word2Vec(sentences, vector_size=8, min_count=1, workers=1, epochs=1)
+    model.save(str(tmp_path.joinpath("plain.mdl")))
+    assert [path.name for path in tmp_path.iterdir()] == ["plain.mdl"]
+
+    monkeypatch.setattr(classes, "memory_monitor", MemoryMonitor(memory_config(checkpoint=1)))
+    AutoSaver(tmp_path.joinpath("split.mdl"), tmp_path).on_train_end(model)
+    assert tmp_path.joinpath("split.mdl.wv.vectors.npy").is_file()
+    assert Word2Vec.load(str(tmp_path.joinpath("split.mdl"))).wv.similarity("alpha", "beta") == (
+        pytest.approx(model.wv.similarity("alpha", "beta"))
+    )
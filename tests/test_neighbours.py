@@ -0,0 +1,87 @@
+"""Tests of the precomputed nearest neighbour index."""
+
+# Imports:
+import logging
+import numpy as np
+import pytest
+from gensim.models import KeyedVectors
+from tools.shared.neighbours import (
+    NeighbourVectors,
+    block_neighbours,
+    build_neighbour_index,
+    neighbour_index_paths,
+    remove_neighbour_index,
+)
+
+NEIGHBOUR_CONFIG = {"count": 150, "topn": 10, "candidates": 0, "block-rows": 32, "block-cols": 50}
+
+
+# The index is written to a temp models/ directory.
+pytestmark = pytest.mark.usefixtures("models_dir")
+
+
+def test_block_neighbours_match_brute_force():
+    """A block of queries gets the brute force neighbours, itself excluded."""
+    units = np.random.default_rng(4).normal(size=(120, 8)).astype(np.float32)
+    units /= np.linalg.norm(units, axis=1, keepdims=True)
+    start, ids, scores = block_neighbours(10, 40, 100, 5, 17, units)
+    assert start == 10 and ids.shape == scores.shape == (30, 5)
+
+    expected = units[10:40] @ units[:100].T
+    expected[np.arange(30), np.arange(10, 40)] = -np.inf
+    np.testing.assert_array_equal(ids, np.argsort(-expected, axis=1)[:, :5])
+    np.testing.assert_allclose(scores, -np.sort(-expected, axis=1)[:, :5], rtol=1e-5)
+
+
+def test_index_answers_like_the_model(tmp_path, random_vectors):
+    """Indexed words get the neighbours of the model, the rest falls back."""
+    wv = random_vectors(300, 16, seed=3)
+    build_neighbour_index(wv, "model", NEIGHBOUR_CONFIG, 2, tmp_path)
+    assert not tmp_path.joinpath("model_units.npy").exists()
+    indexed = NeighbourVectors(wv, "model")
+    assert (indexed.count, indexed.topn) == (150, 10)
+    for word in ("word0", "word77", "word149"):
+        result = indexed.most_similar(word, topn=5)
+        expected = wv.most_similar(word, topn=5)
+        assert [w for w, _ in result] == [w for w, _ in expected]
+        np.testing.assert_allclose([s for _, s in result], [s for _, s in expected], rtol=1e-5)
+
+    # Words outside the index and longer lists fall back to the vectors.
+    assert indexed.most_similar("word200", topn=3) == wv.most_similar("word200", topn=3)
+    assert len(indexed.most_similar("word0", topn=15)) == 15
+    assert indexed.similarity("word1", "word2") == wv.similarity("word1", "word2")
+
+
+def test_analogies_use_the_index_only_if_enabled(tmp_path, random_vectors, caplog):
+    """Analogies come from the index only if enabled, and are logged as approximate."""
+    caplog.set_level(logging.INFO)
+    wv = random_vectors(300, 16, seed=3)
+    build_neighbour_index(wv, "model", NEIGHBOUR_CONFIG, 1, tmp_path)
+    query = {"positive": ["word1", "word2"], "negative": ["word3"], "topn": 3}
+    assert NeighbourVectors(wv, "model").most_similar(**query) == wv.most_similar(**query)
+    assert "neighbour index (approximate" not in caplog.text
+
+    indexed = NeighbourVectors(wv, "model", index_analogies=True)
+    result = indexed.most_similar(**query)
+    expected = wv.most_similar(query["positive"], query["negative"], topn=50)
+    assert set(w for w, _ in result) <= set(w for w, _ in expected)
+    assert [s for _, s in result] == sorted((s for _, s in result), reverse=True)
+    assert "Analogy answered from the neighbour index (approximate" in caplog.text
+
+    # A zero mean vector is left to the wrapped vectors.
+    caplog.clear()
+    indexed.most_similar(["word1"], negative=["word1"], topn=3)
+    assert "neighbour index" not in caplog.text
+
+
+def test_index_of_another_vocabulary_is_ignored(tmp_path, random_vectors):
+    """An index of another vocabulary or a removed index is not used."""
+    wv = random_vectors(300, 16, seed=3)
+    build_neighbour_index(wv, "model", NEIGHBOUR_CONFIG, 1, tmp_path)
+    other = KeyedVectors(16)
+    other.add_vectors(list(reversed(wv.index_to_key)), wv.vectors[::-1])
+    assert NeighbourVectors(other, "model").count == 0
+
+    remove_neighbour_index("model")
+    assert not any(path.exists() for path in neighbour_index_paths("model"))
+    assert NeighbourVectors(wv, "model").count == 0
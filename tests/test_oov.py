@@ -0,0 +1,141 @@
+"""Tests of the out-of-vocabulary fallback (lemma index and n-gram table)."""
+
+# Imports:
+import numpy as np
+import pytest
+from gensim.models import KeyedVectors
+from tools.shared.oov import (
+    MIN_NGRAM_BUCKETS,
+    FallbackVectors,
+    LemmaCollector,
+    LemmaIndex,
+    build_ngram_table,
+    char_ngrams,
+    ngram_table_path,
+)
+
+OOV_CONFIG = {"ngram-min": 3, "ngram-max": 5, "ngram-buckets": 100000, "ngram-vocab": 200000}
+
+
+# The indexes are written to a temp models/ directory.
+pytestmark = pytest.mark.usefixtures("models_dir")
+
+
+def toy_vectors() -> KeyedVectors:
+    """KeyedVectors of a few Hungarian lemmas with random vectors."""
+    words = ["ház", "kert", "alma", "körte", "kutya", "macska", "város", "falu"]
+    wv = KeyedVectors(16)
+    wv.add_vectors(words, np.random.default_rng(0).normal(size=(len(words), 16)))
+    return wv
+
+
+def test_char_ngrams_have_boundary_markers():
+    """N-grams include the word boundary markers, short words give one n-gram."""
+    assert char_ngrams("ház", 3, 4) == ["<há", "ház", "áz>", "<ház", "ház>"]
+    assert char_ngrams("a", 3, 5) == ["<a>"]
+
+
+def test_lemma_index_round_trip(tmp_path):
+    """Collected forms are found case-insensitively, identical forms are skipped."""
+    collector = LemmaCollector(100, tmp_path)
+    collector.add_pairs(
+        ["Házak", "házban", "kertek", "kert", None], ["ház", "ház", "kert", "kert", "x"]
+    )
+    collector.add_pairs(["házban"], ["házba"])
+    collector.add_pairs(["házban"], ["ház"])
+    assert "kert\tkert" not in collector.pairs
+    collector.write_index("model")
+    index = LemmaIndex("model")
+    assert index.lookup("házak") == "ház"
+    assert index.lookup("HÁZBAN") == "ház"
+    assert index.lookup("kertek") == "kert"
+    assert index.lookup("almák") is None
+    assert dict(index.items()) == {"házak": "ház", "házban": "ház", "kertek": "kert"}
+    index.close()
+
+
+def test_lemma_index_keeps_forms_of_earlier_runs(tmp_path):
+    """A new index keeps the forms of the old one, new lemmas win."""
+    first = LemmaCollector(100, tmp_path)
+    first.add_pairs(["házak"], ["ház"])
+    first.write_index("model")
+    second = LemmaCollector(100, tmp_path)
+    second.add_pairs(["kertek", "házak"], ["kert", "házak"])
+    second.write_index("model")
+    index = LemmaIndex("model")
+    assert index.lookup("házak") == "ház" and index.lookup("kertek") == "kert"
+    index.close()
+    third = LemmaCollector(100, tmp_path)
+    third.add_pairs(["házak", "házak"], ["háza", "háza"])
+    third.write_index("model")
+    index = LemmaIndex("model")
+    assert dict(index.items()) == {"házak": "háza", "kertek": "kert"}
+    index.close()
+
+
+def test_collector_merges_sorted_batches(tmp_path):
+    """Spilled batches are merged into one index and removed."""
+    collector = LemmaCollector(3, tmp_path)
+    assert not collector.has_pairs()
+    collector.add_pairs(["c1", "a1", "b1"], ["c", "x", "b"])
+    collector.add_pairs(["a1", "a1", "d1"], ["a", "a", "d"])
+    collector.add_pairs(["a1", "e1"], ["x", "e"])
+    assert collector.has_pairs() and len(collector.batch_paths) == 2
+    assert len(collector.pairs) < 3
+    collector.write_index("model")
+    assert not any(path.exists() for path in collector.batch_paths)
+    index = LemmaIndex("model")
+    assert list(index.items()) == [
+        ("a1", "a"), ("b1", "b"), ("c1", "c"), ("d1", "d"), ("e1", "e")
+    ]
+    index.close()
+
+
+def test_ngram_table_scales_to_vocabulary():
+    """The bucket count follows the vocabulary between the configured limits."""
+    build_ngram_table(toy_vectors(), "small", OOV_CONFIG)
+    assert np.load(ngram_table_path("small")).shape == (MIN_NGRAM_BUCKETS, 16)
+
+    rng = np.random.default_rng(0)
+    wv = KeyedVectors(4)
+    wv.add_vectors([f"szo{i}" for i in range(3000)], rng.normal(size=(3000, 4)))
+    build_ngram_table(wv, "large", dict(OOV_CONFIG, **{"ngram-buckets": 5000}))
+    assert np.load(ngram_table_path("large")).shape == (5000, 4)
+    build_ngram_table(wv, "vocab", dict(OOV_CONFIG, **{"ngram-vocab": 1000}))
+    assert np.load(ngram_table_path("vocab")).shape == (2000, 4)
+
+
+def test_fallback_resolves_lemma_then_ngrams(tmp_path):
+    """Unknown words are looked up by lemma first, then composed from n-grams."""
+    wv = toy_vectors()
+    collector = LemmaCollector(100, tmp_path)
+    collector.add_pairs(["házak"], ["ház"])
+    collector.write_index("model")
+    build_ngram_table(wv, "model", OOV_CONFIG)
+    fallback = FallbackVectors(wv, "model", OOV_CONFIG)
+
+    assert fallback.resolve("kert") == "kert"
+    assert fallback.resolve("Kert") == "kert"
+    assert fallback.resolve("házak") == "ház"
+    composed = fallback.resolve("almák")
+    assert isinstance(composed, np.ndarray)
+    assert np.linalg.norm(composed) == pytest.approx(1, abs=1e-6)
+    assert fallback.most_similar("almák", topn=1)[0][0] == "alma"
+
+
+def test_fallback_without_indexes_raises_key_error():
+    """Without indexes unknown words raise KeyError."""
+    fallback = FallbackVectors(toy_vectors(), "missing", OOV_CONFIG)
+    assert fallback.lemma_index is None and fallback.ngram_table is None
+    with pytest.raises(KeyError):
+        fallback.resolve("házak")
+
+
+def test_doesnt_match_rejects_zero_mean():
+    """A word list with a zero mean raises ValueError."""
+    wv = KeyedVectors(2)
+    wv.add_vectors(["fel", "le", "jobbra"], np.array([[0, 1], [0, -1], [1, 0]], dtype=np.float32))
+    fallback = FallbackVectors(wv, "missing", OOV_CONFIG)
+    assert fallback.doesnt_match(["fel", "jobbra", "fel"]) == "jobbra"
+    with pytest.raises(ValueError):
+        fallback.doesnt_match(["fel", "le"])
@@ -0,0 +1,72 @@
+"""Tests of the phrase (collocation) detection stage."""
+
+# Imports:
+import random
+from gensim.models.phrases import Phrases
+from tools.shared.phrasing import apply_phrasers, chunked, get_phrasers, learn_phrases, merge_counts
+
+
+def phrase_config(**overrides) -> dict:
+    """Phrases section of the config file with test defaults."""
+    config = {
+        "layers": 1,
+        "min-count": 5,
+        "threshold": 10.0,
+        "scoring": "default",
+        "max-vocab-size": 40000000,
+        "connector-words": [],
+        "workers": 2,
+        "chunk-size": 50,
+    }
+    config.update(overrides)
+    return config
+
+
+def phrase_corpus(sentence_count: int = 400) -> list[list[str]]:
+    """Random sentences, every eighth with the collocation "new york"."""
+    rng = random.Random(0)
+    words = [f"word{i}" for i in range(200)]
+    corpus = []
+    for index in range(sentence_count):
+        sentence = rng.sample(words, 6)
+        if index % 8 == 0:
+            sentence[rng.randrange(5):0] = ["new", "york"]
+        corpus.append(sentence)
+    return corpus
+
+
+def test_chunked_splits_the_stream():
+    """The stream is cut into chunks of the given size, the last one shorter."""
+    chunks = list(chunked(([str(i)] for i in range(7)), 3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert chunks[-1] == [["6"]]
+
+
+def test_merged_counts_equal_single_pass_counts():
+    """Counts merged from chunks equal the counts of one pass."""
+    corpus = phrase_corpus(100)
+    single = Phrases(corpus, min_count=1)
+    merged = Phrases(min_count=1)
+    for chunk in chunked(corpus, 30):
+        partial = Phrases(chunk, min_count=1)
+        merge_counts(merged, partial.vocab, partial.corpus_word_count, partial.min_reduce)
+    assert merged.vocab == single.vocab
+    assert merged.corpus_word_count == single.corpus_word_count
+
+
+def test_learned_phrases_join_collocations():
+    """A frequent collocation is joined, other words are left alone."""
+    phraser = learn_phrases(phrase_corpus(), phrase_config())
+    assert apply_phrasers([phraser], ["i", "love", "new", "york"]) == ["i", "love", "new_york"]
+    assert apply_phrasers([phraser], ["word1", "word2"]) == ["word1", "word2"]
+
+
+def test_phrase_models_are_saved_and_reused(models_dir):
+    """Learned phrasers are saved next to the model and loaded on the next run."""
+    model_path = models_dir.joinpath("test.mdl")
+    learned = get_phrasers(phrase_corpus(), model_path, phrase_config())
+    assert models_dir.joinpath("test_phrases_2gram.phr").is_file()
+    # Second call: loaded from models/, the (empty) corpus is not read.
+    loaded = get_phrasers([], model_path, phrase_config())
+    sentence = ["new", "york", "word3"]
+    assert apply_phrasers(loaded, sentence) == apply_phrasers(learned, sentence)
@@ -0,0 +1,221 @@
+"""Tests of the progress reporting (throughput, ETA and status files)."""
+
+# Imports:
+import builtins
+import json
+import os
+from types import SimpleNamespace
+import pytest
+from tools import downloading
+from tools.shared import progress, tempspace
+from tools.shared.misc import load_config_file
+from tools.shared.path_constants import CONFIG_FILE_PATH
+from tools.shared.progress import ProgressTracker, format_eta
+
+PROGRESS_CONFIG = {"enabled": True, "interval": 3600, "log-interval": 0}
+
+
+class Clock:
+    """Manually advanced replacement of time.monotonic."""
+
+    def __init__(self) -> None:
+        """Start at zero."""
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        """Current time."""
+        return self.now
+
+
+@pytest.fixture(name="clock")
+def fixture_clock(tmp_path, monkeypatch):
+    """Manual clock, status files written to a temp directory."""
+    manual_clock = Clock()
+    monkeypatch.setattr(progress, "monotonic", manual_clock)
+    monkeypatch.setattr(progress, "STATUS_DIR_PATH", tmp_path.joinpath("status"))
+    return manual_clock
+
+
+def read_status(tracker: ProgressTracker) -> dict:
+    """Content of the status file of a tracker."""
+    with open(tracker.path, mode="r", encoding="utf-8") as status_file:
+        return json.load(status_file)
+
+
+def test_format_eta():
+    """ETAs are rounded to whole seconds, unknown ones shown as ?."""
+    assert format_eta(None) == "?"
+    assert format_eta(59.6) == "0:01:00"
+    assert format_eta(3 * 3600 + 125) == "3:02:05"
+
+
+def test_eta_from_the_rate_window(clock):
+    """The ETA follows the rate over the recent window."""
+    tracker = ProgressTracker("training", "model", PROGRESS_CONFIG)
+    tracker.stage("epoch 1", "words", words=10000)
+    assert tracker.snapshot()["eta_seconds"] is None
+
+    # 1000 words in 10 s: 9000 words left take 90 s.
+    clock.now = 10
+    tracker.add(words=1000, sentences=100)
+    status = tracker.snapshot()
+    assert status["per_second"] == {"words": 100.0, "sentences": 10.0}
+    assert status["eta_seconds"] == pytest.approx(90)
+
+    # Faster: 3000 more words in 10 s, rate over the window is 200/s.
+    clock.now = 20
+    tracker.add(words=3000)
+    status = tracker.snapshot()
+    assert status["per_second"]["words"] == 200.0
+    assert status["eta_seconds"] == pytest.approx(6000 / 200)
+    tracker.finish()
+
+
+def test_rate_window_forgets_old_samples(clock):
+    """Samples older than the window do not count in the rate."""
+    tracker = ProgressTracker("training", "model", PROGRESS_CONFIG)
+    tracker.stage("train", "words", words=10**6)
+    for second in range(10 + progress.RATE_WINDOW):
+        clock.now = second
+        tracker.add(words=10 if second < 10 else 100)
+        status = tracker.snapshot()
+    assert status["per_second"]["words"] == 100.0
+    tracker.finish()
+
+
+def test_item_eta_and_overrun(clock):
+    """Items get their own ETA, never negative."""
+    tracker = ProgressTracker("training", "model", PROGRESS_CONFIG)
+    tracker.stage("train", "words")
+    tracker.add(words=500)
+    tracker.snapshot()
+    tracker.begin_item("shard", "first.gz", "words", 1000)
+    clock.now = 5
+    tracker.add(words=250)
+    status = tracker.snapshot()
+    assert status["items"]["shard"] == {
+        "name": "first.gz", "words": 250, "total": 1000, "eta_seconds": pytest.approx(15)
+    }
+    assert status["eta_seconds"] is None  # No stage total.
+
+    # More than the total: done, not negative.
+    clock.now = 10
+    tracker.add(words=1000)
+    assert tracker.snapshot()["items"]["shard"]["eta_seconds"] == 0
+    tracker.finish()
+
+
+@pytest.mark.usefixtures("clock")
+@pytest.mark.parametrize("state", ["finished", "stopped", "failed"])
+def test_final_state_is_written(state):
+    """The final state is written to the status file and the writer stops."""
+    tracker = ProgressTracker("training", "model", PROGRESS_CONFIG)
+    tracker.stage("train", "words", words=100)
+    tracker.add(words=10)
+    tracker.finish(state)
+    status = read_status(tracker)
+    assert status["state"] == state
+    assert status["done"] == {"words": 10}
+    assert status["eta_seconds"] == (0 if state == "finished" else None)
+    assert tracker.writer is None
+
+
+@pytest.mark.usefixtures("clock")
+def test_disabled_tracker_writes_nothing():
+    """A disabled tracker counts and writes nothing."""
+    tracker = ProgressTracker("training", "model", dict(PROGRESS_CONFIG, enabled=False))
+    tracker.stage("train", "words", words=100)
+    tracker.add(words=10)
+    tracker.finish()
+    assert not tracker.counts and not tracker.path.exists()
+
+
+@pytest.mark.usefixtures("clock")
+def test_download_total_is_estimated_from_file_sizes():
+    """The download total is estimated from the mean size of the files so far."""
+    tracker = ProgressTracker("download", "links", PROGRESS_CONFIG)
+    tracker.stage("download", "bytes", files=4)
+
+    # First file of 1000 bytes, 3 left: 4000 bytes expected.
+    hook = downloading.progress_hook(tracker, "a.gz", 3)
+    hook(0, 400, 1000)
+    assert tracker.totals["bytes"] == 4000
+    for block in range(1, 4):
+        hook(block, 400, 1000)
+    assert tracker.counts["bytes"] == 1000
+    tracker.add(files=1)
+
+    # Second file of 3000 bytes, 2 left: mean size 2000.
+    hook = downloading.progress_hook(tracker, "b.gz", 2)
+    hook(0, 400, 3000)
+    assert tracker.totals["bytes"] == 1000 + 3000 + 2 * 2000
+
+    # Unknown size: the estimate is kept.
+    hook = downloading.progress_hook(tracker, "c.gz", 1)
+    hook(0, 400, -1)
+    hook(1, 400, -1)
+    assert tracker.totals["bytes"] == 8000
+    assert tracker.counts["bytes"] == 1400
+    tracker.finish()
+
+
+def download_run(
+    tmp_path, monkeypatch, limit_mib: int, sizes: tuple[int, int], reserved: int = 0
+) -> dict:
+    """Run the downloader on a list of two local files of the given sizes
+    (a protected file of reserved bytes in the downloads folder), return
+    its status."""
+    monkeypatch.setattr(tempspace, "TEMP_DIR_PATH", tmp_path)
+    monkeypatch.setattr(builtins, "input", lambda *args: "")
+    config = load_config_file(CONFIG_FILE_PATH)
+    config["TempSpace"].update({"downloads-limit": limit_mib, "headroom": 1.0})
+    config["Progress"] = PROGRESS_CONFIG
+    monkeypatch.setattr(downloading, "load_config_file", lambda path: config)
+
+    links = []
+    for name, size in zip(("one", "two"), sizes):
+        tmp_path.joinpath(f"{name}.gz").write_bytes(os.urandom(size))
+        links.append(tmp_path.joinpath(f"{name}.gz").as_uri())
+    list_file = tmp_path.joinpath("links.txt")
+    list_file.write_text("\n".join(links) + "\n")
+    out_folder = tmp_path.joinpath("downloads")
+    out_folder.mkdir()
+    # Protected file, never evicted.
+    with open(out_folder.joinpath("readme.nfo"), mode="wb") as readme:
+        readme.truncate(reserved)
+
+    downloading.download_all(list_file, out_folder)
+    return read_status(ProgressTracker("download", "links", PROGRESS_CONFIG))
+
+
+def downloads(tmp_path) -> set[str]:
+    """Names of the files in the downloads folder (the readme left out)."""
+    return {path.name for path in tmp_path.joinpath("downloads").iterdir()} - {"readme.nfo"}
+
+
+@pytest.mark.usefixtures("clock")
+def test_download_run_finishes(tmp_path, monkeypatch):
+    """All files are downloaded in full within the budget."""
+    status = download_run(tmp_path, monkeypatch, 0, (1000, 200000))
+    assert status["state"] == "finished"
+    assert status["done"] == {"files": 2, "bytes": 201000}
+    assert downloads(tmp_path) == {"one.gz", "two.gz"}
+    assert tmp_path.joinpath("downloads", "two.gz").stat().st_size == 200000
+
+
+@pytest.mark.usefixtures("clock")
+def test_download_stops_before_exceeding_the_budget(tmp_path, monkeypatch):
+    """The download stops before a file that does not fit the budget."""
+    status = download_run(tmp_path, monkeypatch, 1, (1000, 600000), reserved=2**19)
+    assert status["state"] == "stopped"
+    assert status["eta_seconds"] is None
+    assert downloads(tmp_path) == {"one.gz"}
+
+
+@pytest.mark.usefixtures("clock")
+def test_download_stops_before_the_disk_is_full(tmp_path, monkeypatch):
+    """Without a budget, the download stops before a file that does not fit the disk."""
+    monkeypatch.setattr(tempspace, "disk_usage", lambda path: SimpleNamespace(free=5000))
+    status = download_run(tmp_path, monkeypatch, 0, (1000, 600000))
+    assert status["state"] == "stopped"
+    assert downloads(tmp_path) == {"one.gz"}
@@ -0,0 +1,80 @@
+"""Tests of the deterministic corpus sampling and the sweep helpers."""
+
+# Imports:
+import gzip
+from tools.shared.classes import MyCorpus
+from tools.shared.misc import in_sample
+from tools.tuning import sweep_configurations, write_sample
+
+
+def letters(number: int) -> str:
+    """A number spelled with letters (the tokenizer drops digits)."""
+    return "".join(chr(ord("a") + int(digit)) for digit in f"{number:03}")
+
+
+def write_corpus_dir(path, shard_count: int = 20, lines: int = 50) -> None:
+    """Directory of gzipped text shards with distinct lines."""
+    path.mkdir()
+    for shard in range(shard_count):
+        text = "".join(
+            f"shard{letters(shard)} line{letters(line)} alpha beta\n" for line in range(lines)
+        )
+        path.joinpath(f"shard{shard:02}.txt.gz").write_bytes(gzip.compress(text.encode()))
+
+
+def test_in_sample_is_deterministic_and_seeded():
+    """The same key and seed always give the same answer, another seed another one."""
+    keys = [f"key{i}" for i in range(2000)]
+    first = [in_sample(key, 0.3, 1) for key in keys]
+    assert first == [in_sample(key, 0.3, 1) for key in keys]
+    assert first != [in_sample(key, 0.3, 2) for key in keys]
+
+
+def test_in_sample_fraction():
+    """About the given fraction of the keys is selected."""
+    selected = sum(in_sample(f"key{i}", 0.1, 42) for i in range(20000))
+    assert 0.09 < selected / 20000 < 0.11
+    assert not any(in_sample(f"key{i}", 0.0, 42) for i in range(100))
+
+
+def test_line_sample_is_stable_across_passes(tmp_path):
+    """Every pass over a line sampled corpus yields the same sentences."""
+    corpus_dir = tmp_path.joinpath("corpus")
+    write_corpus_dir(corpus_dir)
+    sample_config = {"unit": "line", "fraction": 0.2, "seed": 7}
+    corpus = MyCorpus("dir", corpus_dir, sample_config, temp_dir=tmp_path)
+    first_pass = list(corpus)
+    assert first_pass == list(corpus)
+    assert 0.15 < len(first_pass) / 1000 < 0.25
+
+
+def test_shard_sample_keeps_whole_shards(tmp_path):
+    """A shard sample keeps all lines of the selected shards."""
+    corpus_dir = tmp_path.joinpath("corpus")
+    write_corpus_dir(corpus_dir)
+    sample_config = {"unit": "shard", "fraction": 0.5, "seed": 3}
+    sentences = list(MyCorpus("dir", corpus_dir, sample_config, temp_dir=tmp_path))
+    shards = {sentence[0] for sentence in sentences}
+    assert 0 < len(shards) < 20
+    assert len(sentences) == 50 * len(shards)
+
+
+def test_sweep_configurations_cover_the_grid():
+    """One configuration per combination of the swept values."""
+    base = {"vector_size": 100, "window": 5, "epochs": 5}
+    configs = sweep_configurations(base, {"window": [3, 5], "negative": [5, 10, 15]})
+    assert len(configs) == 6
+    assert {(config["window"], config["negative"]) for config in configs} == {
+        (window, negative) for window in (3, 5) for negative in (5, 10, 15)
+    }
+    assert all(config["vector_size"] == 100 for config in configs)
+
+
+def test_write_sample(tmp_path):
+    """The sample file holds the sampled lines, one per line."""
+    corpus_dir = tmp_path.joinpath("corpus")
+    write_corpus_dir(corpus_dir, shard_count=2, lines=10)
+    out_file = tmp_path.joinpath("sample.txt")
+    count = write_sample("dir", corpus_dir, {"unit": "line", "fraction": 1.0, "seed": 1}, out_file)
+    assert count == 20
+    assert out_file.read_text(encoding="utf-8").splitlines()[0] == "shardaaa lineaaa alpha beta"
@@ -0,0 +1,218 @@
+"""Tests of the corpus source backends and the shard format detection."""
+
+# Imports:
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import sys
+import tarfile
+import zipfile
+from itertools import islice
+import pytest
+from tools.shared import sources, tempspace
+from tools.shared.oov import LemmaCollector
+from tools.shared.sources import (
+    ArchiveSource,
+    DirectorySource,
+    LinkListSource,
+    Shard,
+    ShardCache,
+    SourceBackend,
+    StdinSource,
+    corpus_file_kind,
+    open_source,
+    shard_lines,
+)
+from tools.shared.tempspace import DiskBudget
+
+TEXT = "első sor szöveg\nmásodik sor szöveg\n"
+
+TSV = (
+    "form\tlemma\txpostag\n"
+    "A\ta\tDET\n"
+    "Házakban\tház\tNOUN\n"
+    "laktak\tlakik\tVERB\n"
+    ".\t.\tPUNCT\n"
+    "Kertek\tkert\tNOUN\n"
+    "virágoznak\tvirágzik\tVERB\n"
+)
+
+
+def read(name: str, data: bytes, lemma_collector=None) -> list[str]:
+    """Lines of an in-memory shard."""
+    return list(shard_lines(Shard(name, lambda: io.BytesIO(data)), lemma_collector))
+
+
+@pytest.mark.parametrize(
+    "name, compress",
+    [
+        ("shard.txt", lambda data: data),
+        ("shard.gz", gzip.compress),
+        ("shard.txt.bz2", bz2.compress),
+        ("shard.xz", lzma.compress),
+        ("shard.txt", gzip.compress),
+    ],
+)
+def test_compression_is_sniffed(name, compress):
+    """The compression is detected from the content, not the file name."""
+    assert read(name, compress(TEXT.encode())) == TEXT.splitlines(keepends=True)
+
+
+def test_tsv_lemmas_and_pairs(tmp_path):
+    """TSV shards yield the content lemmas and collect the form-lemma pairs."""
+    collector = LemmaCollector(100, tmp_path)
+    assert read("shard.tsv", gzip.compress(TSV.encode()), collector) == [
+        "ház lakik",
+        "kert virágzik",
+    ]
+    assert collector.pairs == {
+        "házakban\tház": 1,
+        "laktak\tlakik": 1,
+        "kertek\tkert": 1,
+        "virágoznak\tvirágzik": 1,
+    }
+
+
+@pytest.mark.parametrize(
+    "name, data",
+    [
+        ("shard.gz", TEXT.encode()),
+        ("shard.txt", b"\x00\x01binary\x00"),
+        ("shard.gz", gzip.compress(b"<!DOCTYPE html><html>Not Found</html>")),
+        ("shard.txt", b"  <html><body>Error</body></html>"),
+    ],
+)
+def test_non_text_shards_are_skipped(name, data, caplog):
+    """Binary, HTML and misnamed compressed shards are skipped with a warning."""
+    assert not read(name, data)
+    assert "Skipping shard" in caplog.text
+
+
+def test_corpus_file_kind():
+    """File names are classified as text, archive or neither."""
+    assert corpus_file_kind("a.txt") == corpus_file_kind("B.TXT.GZ") == "text"
+    assert corpus_file_kind("a.tsv.xz") == corpus_file_kind("a.gz") == "text"
+    assert corpus_file_kind("a.tar.gz") == corpus_file_kind("a.zip") == "archive"
+    assert corpus_file_kind("a.tgz") == "archive"
+    assert corpus_file_kind("notes.md") is corpus_file_kind("a.html") is None
+
+
+def write_archives(path) -> None:
+    """A zip and a tar.gz archive with corpus and other members."""
+    with zipfile.ZipFile(path.joinpath("corpus.zip"), mode="w") as archive:
+        archive.writestr("a.txt", "zip a\n")
+        archive.writestr("sub/", "")
+        archive.writestr("sub/b.txt.gz", gzip.compress(b"zip b\n"))
+        archive.writestr("README.md", "notes\n")
+    with tarfile.open(path.joinpath("corpus.tar.gz"), mode="w:gz") as archive:
+        for name, data in (("c.txt", b"tar c\n"), ("d.tsv", TSV.encode()), ("e.jpg", b"\xff")):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def shard_texts(source: SourceBackend) -> dict[str, list[str]]:
+    """Lines of every shard of a source (read in order, as the trainer does)."""
+    return {shard.name: list(shard_lines(shard)) for shard in source.shards()}
+
+
+def test_archive_members(tmp_path, caplog):
+    """Corpus members of zip and tar archives are shards, other members are skipped."""
+    caplog.set_level(logging.INFO)
+    write_archives(tmp_path)
+    assert shard_texts(ArchiveSource(tmp_path.joinpath("corpus.zip"))) == {
+        "corpus.zip/a.txt": ["zip a\n"],
+        "corpus.zip/sub/b.txt.gz": ["zip b\n"],
+    }
+    assert shard_texts(ArchiveSource(tmp_path.joinpath("corpus.tar.gz"))) == {
+        "corpus.tar.gz/c.txt": ["tar c\n"],
+        "corpus.tar.gz/d.tsv": ["ház lakik", "kert virágzik"],
+    }
+    assert "Skipping README.md: not a corpus file." in caplog.text
+    assert "Skipping e.jpg: not a corpus file." in caplog.text
+
+
+def test_directory_whitelist(tmp_path, caplog):
+    """A directory yields its corpus files and archive members in name order."""
+    caplog.set_level(logging.INFO)
+    write_archives(tmp_path)
+    tmp_path.joinpath("z.txt").write_text("plain z\n")
+    tmp_path.joinpath("notes.md").write_text("notes\n")
+    tmp_path.joinpath(".hidden.txt").write_text("hidden\n")
+    tmp_path.joinpath("readme.nfo").write_text("readme\n")
+    tmp_path.joinpath("subdir").mkdir()
+    names = list(shard_texts(DirectorySource(tmp_path)))
+    assert names == [
+        "corpus.tar.gz/c.txt",
+        "corpus.tar.gz/d.tsv",
+        "corpus.zip/a.txt",
+        "corpus.zip/sub/b.txt.gz",
+        "z.txt",
+    ]
+    assert "Skipping notes.md: not a corpus file." in caplog.text
+
+
+def test_stdin_is_spooled_for_later_passes(tmp_path, monkeypatch):
+    """Later passes over the standard input replay its spool."""
+    lines = [f"sor {index}\n" for index in range(5000)]
+    stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO("".join(lines).encode())))
+    monkeypatch.setattr(sys, "stdin", stdin)
+    source = open_source("stdin", None, tmp_path)
+    assert isinstance(source, StdinSource) and source.name.startswith("stdin_")
+
+    # An interrupted pass (e.g. a calibration sample), then full passes.
+    (shard,) = source.shards()
+    assert list(islice(shard_lines(shard), 10)) == lines[:10]
+    assert not source.complete
+    for _ in range(2):
+        (shard,) = source.shards()
+        assert list(shard_lines(shard)) == lines
+    assert source.complete
+    assert tmp_path.joinpath("stdin.spool").read_text() == "".join(lines)
+
+
+def test_link_list_through_the_cache(tmp_path, monkeypatch):
+    """Linked shards are cached, evicted ones are downloaded again."""
+    monkeypatch.setattr(tempspace, "TEMP_DIR_PATH", tmp_path)
+    monkeypatch.setattr(sources, "SHARD_CACHE_DIR_PATH", tmp_path.joinpath("cache"))
+    remote = tmp_path.joinpath("remote")
+    remote.mkdir()
+    links = []
+    for name in ("one", "two"):
+        remote.joinpath(f"{name}.txt.gz").write_bytes(gzip.compress(f"{name} text\n".encode()))
+        links.append(remote.joinpath(f"{name}.txt.gz").as_uri())
+    link_list = tmp_path.joinpath("links.txt")
+    link_list.write_text("\n".join(links) + "\n\n")
+
+    cache = ShardCache(DiskBudget(tmp_path, 100, 1.0, evict_dir=tmp_path.joinpath("cache")))
+    source = LinkListSource(link_list, cache)
+    expected = {"one.txt.gz": ["one text\n"], "two.txt.gz": ["two text\n"]}
+    assert shard_texts(source) == expected
+    assert sorted(path.name for path in tmp_path.joinpath("cache").iterdir()) == list(expected)
+
+    # Later passes read the cache, evicted shards are downloaded again.
+    remote.joinpath("two.txt.gz").write_bytes(gzip.compress(b"changed\n"))
+    tmp_path.joinpath("cache", "one.txt.gz").unlink()
+    assert shard_texts(source) == {"one.txt.gz": ["one text\n"], "two.txt.gz": ["two text\n"]}
+    assert shard_texts(LinkListSource(link_list)) == {
+        "one.txt.gz": ["one text\n"],
+        "two.txt.gz": ["changed\n"],
+    }
+
+
+def test_failed_download_leaves_no_partial_file(tmp_path, monkeypatch):
+    """A failed download leaves nothing in the cache."""
+    monkeypatch.setattr(tempspace, "TEMP_DIR_PATH", tmp_path)
+    monkeypatch.setattr(sources, "SHARD_CACHE_DIR_PATH", tmp_path.joinpath("cache"))
+    cache = ShardCache(DiskBudget(tmp_path, 100, 1.0))
+    with pytest.raises(OSError):
+        cache.open_shard(tmp_path.joinpath("missing.txt.gz").as_uri())
+    assert not any(tmp_path.joinpath("cache").iterdir())
+
+
+def test_unknown_source_type():
+    """An unknown source type raises ValueError."""
+    with pytest.raises(ValueError):
+        open_source("ftp", None, None)
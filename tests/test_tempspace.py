@@ -0,0 +1,107 @@
+"""Tests of the disk budgets and the per-run temp directories."""
+
+# Imports:
+import os
+import subprocess
+import sys
+import pytest
+from tools.shared import tempspace
+from tools.shared.tempspace import DiskBudget, RunTempDir, mark_used
+
+MIB = 2**20
+
+
+@pytest.fixture(name="temp_dir", autouse=True)
+def fixture_temp_dir(tmp_path, monkeypatch):
+    """Keep the budget lock files in a temp directory."""
+    monkeypatch.setattr(tempspace, "TEMP_DIR_PATH", tmp_path)
+    return tmp_path
+
+
+def write_files(path, names: list[str], size: int = MIB) -> None:
+    """Sparse files of a size, used in the order of the names (LRU first)."""
+    path.mkdir(exist_ok=True)
+    for age, name in enumerate(names):
+        file_path = path.joinpath(name)
+        with open(file_path, mode="wb") as file:
+            file.truncate(size)
+        os.utime(file_path, (1_000_000 + age, 1_000_000))
+
+
+def remaining(path) -> set[str]:
+    """Names of the files in a directory."""
+    return {entry.name for entry in path.iterdir()}
+
+
+def test_eviction_is_least_recently_used_first(temp_dir):
+    """The least recently used files are evicted first."""
+    cache = temp_dir.joinpath("cache")
+    write_files(cache, ["a", "b", "c", "d"])
+    mark_used(cache.joinpath("a"))
+    budget = DiskBudget(cache, limit_mib=3, headroom=1.0)
+    assert budget.make_room()
+    assert remaining(cache) == {"a", "c", "d"}
+    assert budget.make_room(needed=2 * MIB)
+    assert remaining(cache) == {"a"}
+
+
+def test_kept_protected_and_partial_files_are_not_evicted(temp_dir):
+    """Kept, protected and partial files stay, even if the budget is not met."""
+    cache = temp_dir.joinpath("cache")
+    write_files(cache, ["readme.nfo", "shard.gz.part", "kept", "old", "new"])
+    budget = DiskBudget(cache, limit_mib=1, headroom=1.0)
+    assert not budget.make_room(keep=[cache.joinpath("kept")])
+    assert remaining(cache) == {"readme.nfo", "shard.gz.part", "kept"}
+
+
+def test_evicts_from_the_eviction_directory_only(temp_dir):
+    """Only the eviction directory is emptied, other files only count."""
+    write_files(temp_dir, ["other"])
+    write_files(temp_dir.joinpath("cache"), ["cached"])
+    budget = DiskBudget(temp_dir, limit_mib=1, headroom=1.0, evict_dir=temp_dir.joinpath("cache"))
+    assert budget.make_room()
+    assert "other" in remaining(temp_dir)
+    assert remaining(temp_dir.joinpath("cache")) == set()
+
+
+def test_zero_limit_disables_the_budget(temp_dir):
+    """A zero limit evicts nothing."""
+    write_files(temp_dir.joinpath("cache"), ["a", "b"])
+    assert DiskBudget(temp_dir.joinpath("cache"), limit_mib=0, headroom=1.0).make_room(10 * MIB)
+    assert remaining(temp_dir.joinpath("cache")) == {"a", "b"}
+
+
+def test_lock_is_reentrant_and_excludes_other_holders(temp_dir):
+    """The budget lock nests in one process and excludes other holders."""
+    fcntl = pytest.importorskip("fcntl")
+    budget = DiskBudget(temp_dir.joinpath("cache"), limit_mib=1, headroom=1.0)
+    with budget.locked():
+        with budget.locked():
+            assert budget.lock_depth == 2
+        with open(budget.lock_path, mode="a", encoding="utf-8") as other:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    assert budget.lock_depth == 0
+    with open(budget.lock_path, mode="a", encoding="utf-8") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+@pytest.mark.skipif(os.name != "posix", reason="Process liveness is only checked on POSIX.")
+def test_stale_run_directories_are_detected(temp_dir):
+    """Run directories of finished processes are stale, live ones are not."""
+    run_dir = RunTempDir(temp_dir)
+    assert run_dir.path.name.startswith("run_") and f"_{os.getpid()}_" in run_dir.path.name
+
+    finished = subprocess.run(
+        [sys.executable, "-c", "import os; print(os.getpid())"],
+        capture_output=True, text=True, check=True,
+    )
+    stale = temp_dir.joinpath(f"run_20240101_000000_{int(finished.stdout)}_x")
+    alive = temp_dir.joinpath(f"run_20240101_000000_{os.getpid()}_y")
+    for path in (stale, alive, temp_dir.joinpath("other_dir")):
+        path.mkdir()
+    assert run_dir.stale_runs(temp_dir) == [stale]
+
+    run_dir.cleanup().join()
+    assert not run_dir.path.exists()
+    assert alive.exists() and stale.exists()